@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TruckHOSMonitor.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up, as it uses the ORM.
+from eld_app.events import fleet_events_app  # noqa: E402
+
+FLEET_EVENTS_PATH = '/api/v1/fleet/events'
+
+
+async def application(scope, receive, send):
+    # The fleet event stream stays open indefinitely, which Django 3.2's ASGI handler cannot do, so it is
+    # served by its own ASGI app; everything else goes to Django.
+    if scope['type'] == 'http' and scope['path'].rstrip('/') == FLEET_EVENTS_PATH:
+        return await fleet_events_app(scope, receive, send)
+    return await django_application(scope, receive, send)
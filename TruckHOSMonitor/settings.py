@@ -28,6 +28,27 @@ DEBUG = os.getenv('DEBUG') == 'True'
 
 APPEND_SLASH = True
 
+# PROLOGS
+PROLOGS_API_BASE_URL = os.getenv('PROLOGS_API_BASE_URL', 'https://publicapi-stage.prologs.us/api/v1')
+PROLOGS_API_CONNECT_BASE_URL = os.getenv('PROLOGS_API_CONNECT_BASE_URL', 'https://identity-stage.prologs.us/connect/token')
+# Seconds before expiry at which a cached access token is refreshed in the background.
+PROLOGS_TOKEN_REFRESH_MARGIN = int(os.getenv('PROLOGS_TOKEN_REFRESH_MARGIN', 60))
+# Keep-alive connections kept per upstream host, and connect/read timeouts in seconds.
+PROLOGS_POOL_SIZE = int(os.getenv('PROLOGS_POOL_SIZE', 10))
+PROLOGS_CONNECT_TIMEOUT = float(os.getenv('PROLOGS_CONNECT_TIMEOUT', 3.05))
+PROLOGS_READ_TIMEOUT = float(os.getenv('PROLOGS_READ_TIMEOUT', 15))
+# Upper bound on concurrent upstream connections held by the async (ASGI) client.
+PROLOGS_ASYNC_MAX_CONNECTIONS = int(os.getenv('PROLOGS_ASYNC_MAX_CONNECTIONS', 100))
+# Retries on connection errors and 429/5xx responses, with jittered exponential backoff.
+PROLOGS_MAX_RETRIES = int(os.getenv('PROLOGS_MAX_RETRIES', 3))
+PROLOGS_BACKOFF_FACTOR = float(os.getenv('PROLOGS_BACKOFF_FACTOR', 0.5))
+PROLOGS_BACKOFF_JITTER = float(os.getenv('PROLOGS_BACKOFF_JITTER', 0.5))
+# Duty-status log endpoint (paginated with hasMore/lastTimestamp) and the query parameter carrying the cursor.
+PROLOGS_DUTY_STATUS_PATH = os.getenv('PROLOGS_DUTY_STATUS_PATH', '/drivers/{driver_id}/dutystatus')
+PROLOGS_DUTY_STATUS_CURSOR_PARAM = os.getenv('PROLOGS_DUTY_STATUS_CURSOR_PARAM', 'lastTimestamp')
+# Rows per INSERT when storing duty-status history.
+DUTY_STATUS_BATCH_SIZE = int(os.getenv('DUTY_STATUS_BATCH_SIZE', 500))
+
 ALLOWED_HOSTS = []
 
 # Application definition
@@ -40,9 +61,11 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'eld_app',
 ]
 
 MIDDLEWARE = [
+    'eld_app.metrics.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,6 +105,92 @@ DATABASES = {
     }
 }
 
+# SQLite databases run in write-ahead-log mode, so the poller's writes do not block readers.
+SQLITE_WAL = os.getenv('SQLITE_WAL', 'True') == 'True'
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# The "fleet" cache holds the /trucks/ and /drivers/ snapshots. Use the file backend to share them
+# between worker processes on one box.
+
+FLEET_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fleet': {
+        'BACKEND': FLEET_CACHE_BACKENDS[os.getenv('FLEET_CACHE_BACKEND', 'locmem')],
+        'LOCATION': os.getenv('FLEET_CACHE_LOCATION', str(BASE_DIR / 'var' / 'fleet_cache')),
+        'TIMEOUT': None,
+    },
+}
+
+# Seconds a snapshot is served as fresh, then how long past that it is still served while refreshing.
+FLEET_CACHE_TTL = float(os.getenv('FLEET_CACHE_TTL', 30))
+FLEET_CACHE_STALE_TTL = float(os.getenv('FLEET_CACHE_STALE_TTL', 120))
+
+# Snapshots are also saved to the database. When the cache has none, one saved less than FLEET_STORE_MAX_AGE
+# seconds ago is served instead of going upstream (and refreshed in the background once past the TTL).
+# 0 turns the store off.
+FLEET_STORE_MAX_AGE = float(os.getenv('FLEET_STORE_MAX_AGE', 900))
+# Whether web workers save the snapshots they fetch themselves. Turn off where poll_fleet runs, so the poller
+# is the only process writing the store.
+FLEET_STORE_SAVE_FETCHES = os.getenv('FLEET_STORE_SAVE_FETCHES', 'True') == 'True'
+
+# Planned schedules memoized per (HOS counters, limits, trip window); cleared when the roster refreshes.
+SCHEDULE_MEMO_SIZE = int(os.getenv('SCHEDULE_MEMO_SIZE', 1024))
+SCHEDULE_MEMO_TTL = float(os.getenv('SCHEDULE_MEMO_TTL', 300))
+
+# Batch schedule planning: worker processes (0 means one per CPU), the pool's start method, the smallest
+# batch worth sending to the pool and the largest batch accepted by the endpoint.
+SCHEDULE_BATCH_WORKERS = int(os.getenv('SCHEDULE_BATCH_WORKERS', 0))
+SCHEDULE_BATCH_START_METHOD = os.getenv('SCHEDULE_BATCH_START_METHOD', 'forkserver')
+SCHEDULE_BATCH_MIN_PARALLEL = int(os.getenv('SCHEDULE_BATCH_MIN_PARALLEL', 64))
+SCHEDULE_BATCH_MAX_ITEMS = int(os.getenv('SCHEDULE_BATCH_MAX_ITEMS', 10000))
+
+# Fleet poller (manage.py poll_fleet): seconds between polls and how long published events are kept. Event
+# streams check for new events every FLEET_EVENTS_POLL_INTERVAL seconds and send a keep-alive comment
+# after FLEET_EVENTS_HEARTBEAT seconds without one.
+FLEET_POLL_INTERVAL = float(os.getenv('FLEET_POLL_INTERVAL', 15))
+FLEET_EVENTS_RETENTION = float(os.getenv('FLEET_EVENTS_RETENTION', 3600))
+FLEET_EVENTS_POLL_INTERVAL = float(os.getenv('FLEET_EVENTS_POLL_INTERVAL', 0.5))
+FLEET_EVENTS_HEARTBEAT = float(os.getenv('FLEET_EVENTS_HEARTBEAT', 15))
+
+# Truck breadcrumbs recorded by the poller: where they are kept, how many days stay at full resolution, the
+# seconds between points kept after that, how many days are kept at all, and how often buffered points are
+# written out (seconds).
+TRACKS_DIR = os.getenv('TRACKS_DIR', str(BASE_DIR / 'var' / 'tracks'))
+TRACKS_RAW_DAYS = float(os.getenv('TRACKS_RAW_DAYS', 7))
+TRACKS_DOWNSAMPLE_STEP = int(os.getenv('TRACKS_DOWNSAMPLE_STEP', 300))
+TRACKS_RETENTION_DAYS = float(os.getenv('TRACKS_RETENTION_DAYS', 180))
+TRACKS_FLUSH_INTERVAL = float(os.getenv('TRACKS_FLUSH_INTERVAL', 60))
+
+# Minutes before an 11/14/70-hour limit at which the poller raises predicted violation alerts (0: at the limit).
+VIOLATION_WARNING_LEADS = [float(lead) for lead in os.getenv('VIOLATION_WARNING_LEADS', '60,30,0').split(',')]
+
+# The most trucks a nearest-trucks query may ask for.
+NEAREST_TRUCKS_MAX_K = int(os.getenv('NEAREST_TRUCKS_MAX_K', 1000))
+
+# Per-stage latency histograms and request counters, served at /metrics in the Prometheus format, and whether
+# responses carry a Server-Timing header with the request's stage timings. METRICS_BUCKETS are the histogram
+# bucket bounds in seconds.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'False') == 'True'
+METRICS_BUCKETS = [float(bound) for bound in os.getenv(
+    'METRICS_BUCKETS', '0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10').split(',')]
+
+# JSON responses are encoded with orjson when it is installed (same output as DRF's renderer otherwise).
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'eld_app.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,109 @@
+"""
+Simulates a day of roster polls against the violation alarm scheduler, with a fraction of drivers changing
+status on each poll, and compares it with rescanning every driver's projected limits on each clock tick.
+
+Both sides are given the same decoded roster; the rescan is timed over the first ticks only and scaled up.
+
+    python benchmarks/bench_alarms.py --drivers 50000 --hours 24 --changed 0.01
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_roster(size, seed=0):
+    rng = random.Random(seed)
+    return {
+        f"driver-{i}": {
+            "driverId": f"driver-{i}", "dutyStatus": rng.choice(["D", "ON", "OFF", "SB"]),
+            "dutyStatusStartTime": "2024-01-01T00:00:00Z",
+            "shiftWorkMinutes": rng.randint(0, 840), "shiftDriveMinutes": rng.randint(0, 660),
+            "cycleWorkMinutes": rng.randint(0, 4200), "maxShiftWorkMinutes": 840, "maxShiftDriveMinutes": 660,
+            "maxCycleWorkMinutes": 4200,
+        }
+        for i in range(size)
+    }
+
+
+def change(driver, minutes, rng):
+    """
+    The driver's next reading: counters advanced by the time spent in the old status, and a new status.
+    """
+    status = driver["dutyStatus"]
+    driver = dict(driver, dutyStatus=rng.choice(["D", "ON", "OFF", "SB"]))
+    if status in ("D", "ON"):
+        driver["shiftWorkMinutes"] += minutes
+        driver["cycleWorkMinutes"] += minutes
+    if status == "D":
+        driver["shiftDriveMinutes"] += minutes
+    return driver
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--drivers', type=int, default=50000)
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--poll', type=float, default=60, help='seconds between roster polls')
+    parser.add_argument('--changed', type=float, default=0.01, help='fraction of drivers changed per poll')
+    parser.add_argument('--tick', type=float, default=1, help='clock resolution of the rescan, in seconds')
+    parser.add_argument('--scan-ticks', type=int, default=20, help='ticks of the rescan actually timed')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TruckHOSMonitor.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import django
+    django.setup()
+
+    from eld_app.alarms import ViolationAlarmScheduler, project_limits
+    from eld_app.utils import decode_drivers
+
+    leads = (60, 30, 0)
+    rng = random.Random(1)
+    roster = make_roster(args.drivers)
+    scheduler = ViolationAlarmScheduler(leads)
+    polls = int(args.hours * 3600 / args.poll)
+    per_poll = max(1, int(args.drivers * args.changed))
+
+    fired = 0
+    cpu = time.process_time()
+    scheduler.update(roster, as_of=0)
+    first = time.process_time() - cpu
+    scheduled = 0.0
+    driver_ids = list(roster)
+    for index in range(1, polls + 1):
+        now = index * args.poll
+        for driver_id in rng.sample(driver_ids, per_poll):
+            roster[driver_id] = change(roster[driver_id], args.poll / 60, rng)
+        # Only the scheduler's own work is timed, not the simulated roster changes.
+        cpu = time.process_time()
+        scheduler.update(roster, as_of=now)
+        fired += len(scheduler.pop_due(now))
+        scheduled += time.process_time() - cpu
+
+    # The rescan: on every tick, project every driver's limits and look for warnings falling in that tick.
+    decoded = decode_drivers(list(roster.values()))
+    ticks = int(args.hours * 3600 / args.tick)
+    cpu = time.process_time()
+    for tick in range(args.scan_ticks):
+        start, end = tick * args.tick, (tick + 1) * args.tick
+        for driver in decoded:
+            for limit_at in project_limits(driver, 0).values():
+                for lead in leads:
+                    if start < limit_at - lead * 60 <= end:
+                        pass
+    scan = (time.process_time() - cpu) / args.scan_ticks
+
+    print(f"{args.drivers} drivers, {polls} polls of {per_poll} changes over {args.hours:g} h; CPU time")
+    print(f"scheduler: first update {first * 1000:.0f}ms, then {scheduled / polls * 1000:.2f}ms per poll, "
+          f"{first + scheduled:.1f}s over {args.hours:g} h, {fired} alarms fired")
+    print(f"rescan:    {scan * 1000:.0f}ms per {args.tick:g}s tick, {scan * ticks:.0f}s over {args.hours:g} h")
+    print(f"heap:      {scheduler.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Compares WSGI and ASGI throughput for the HOS endpoint against a local stub ProLogs server.
+
+The stub answers every call after a fixed delay, standing in for upstream latency. The WSGI side runs
+the sync view on a pool of worker threads (one in-flight upstream call each); the ASGI side runs the
+async view on a single event loop with many requests in flight at once.
+
+    python benchmarks/bench_asgi.py --requests 400 --latency 0.1 --workers 8 --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DRIVER = {
+    "driverId": None, "truckName": "T-1", "dutyStatus": "D", "dutyStatusStartTime": "2024-01-01T00:00:00Z",
+    "shiftWorkMinutes": 120, "shiftDriveMinutes": 90, "cycleWorkMinutes": 1200,
+    "maxShiftWorkMinutes": 840, "maxShiftDriveMinutes": 660, "maxCycleWorkMinutes": 4200,
+}
+
+
+class StubProLogsHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.1
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._send_json({"access_token": "stub-token", "expires_in": 3600})
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        driver_id = self.path.rstrip('/').rsplit('/', 1)[-1]
+        self._send_json({**DRIVER, "driverId": driver_id})
+
+
+def start_stub(latency):
+    StubProLogsHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubProLogsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+BODY = {"start": "2024-01-01T00:00:00Z", "end": "2024-01-02T00:00:00Z"}
+
+
+def run_wsgi(total, workers):
+    from django.test import Client
+
+    local = threading.local()
+
+    def call(i):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        response = local.client.post(f'/api/v1/drivers/hos/d{i}/', BODY, content_type='application/json')
+        assert response.status_code == 200, response.content
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(call, range(total)))
+    return time.perf_counter() - started
+
+
+def run_asgi(total, concurrency):
+    from django.test import AsyncClient
+
+    async def main():
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call(i):
+            async with semaphore:
+                response = await client.post(f'/api/v1/async/drivers/hos/d{i}/', BODY,
+                                             content_type='application/json')
+                assert response.status_code == 200, response.content
+
+        started = time.perf_counter()
+        await asyncio.gather(*(call(i) for i in range(total)))
+        return time.perf_counter() - started
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--latency', type=float, default=0.1, help='stub upstream delay in seconds')
+    parser.add_argument('--workers', type=int, default=8, help='WSGI worker threads')
+    parser.add_argument('--concurrency', type=int, default=200, help='in-flight ASGI requests')
+    args = parser.parse_args()
+
+    server = start_stub(args.latency)
+    base = f'http://127.0.0.1:{server.server_port}'
+    os.environ.update({
+        'DJANGO_SETTINGS_MODULE': 'TruckHOSMonitor.settings',
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'benchmark'),
+        'PROLOGS_API_BASE_URL': f'{base}/api/v1',
+        'PROLOGS_API_CONNECT_BASE_URL': f'{base}/connect/token',
+        'PROLOGS_POOL_SIZE': str(args.workers),
+        'PROLOGS_ASYNC_MAX_CONNECTIONS': str(args.concurrency),
+        'FLEET_CACHE_TTL': '0',
+    })
+
+    import django
+    from django.test.utils import setup_test_environment
+    django.setup()
+    setup_test_environment()
+
+    wsgi = run_wsgi(args.requests, args.workers)
+    asgi = run_asgi(args.requests, args.concurrency)
+
+    print(f"{args.requests} requests, {args.latency * 1000:.0f} ms upstream latency")
+    print(f"WSGI ({args.workers} workers):      {wsgi:7.2f} s  {args.requests / wsgi:8.1f} req/s")
+    print(f"ASGI ({args.concurrency} in flight): {asgi:7.2f} s  {args.requests / asgi:8.1f} req/s")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
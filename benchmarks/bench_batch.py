@@ -0,0 +1,75 @@
+"""
+Measures batch schedule planning across the process pool against planning the same batch serially.
+
+Every candidate driver is planned against every open load, as the load-assignment job does. The
+schedule memo is cleared before each run so every item is actually planned.
+
+    python benchmarks/bench_batch.py --drivers 200 --loads 20 --workers 2 4 8
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--drivers', type=int, default=200)
+    parser.add_argument('--loads', type=int, default=20)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, os.cpu_count() or 1])
+    parser.add_argument('--chunksize', type=int, default=None)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TruckHOSMonitor.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ['SCHEDULE_BATCH_MIN_PARALLEL'] = '1'
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from eld_app import batch
+    from eld_app.models import DriverHosInformation
+    from eld_app.utils import schedule_memo
+
+    rng = random.Random(0)
+    drivers = [
+        DriverHosInformation(driverId=f"driver-{i}", shiftDriveMinutes=rng.randint(0, 660),
+                             shiftWorkMinutes=rng.randint(0, 840), cycleWorkMinutes=rng.randint(0, 4200))
+        for i in range(args.drivers)
+    ]
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    loads = []
+    for _ in range(args.loads):
+        pickup = start + timedelta(minutes=rng.randint(0, 60 * 24 * 3))
+        loads.append((pickup, pickup + timedelta(hours=rng.randint(8, 24 * 14))))
+    requests = [(driver, pickup, dropoff) for driver in drivers for pickup, dropoff in loads]
+
+    def run(workers):
+        schedule_memo.clear()
+        started = time.perf_counter()
+        outcomes = batch.plan_driving_schedules(requests, workers=workers, chunksize=args.chunksize)
+        elapsed = time.perf_counter() - started
+        assert all(error is None for _, error in outcomes)
+        return elapsed
+
+    print(f"{len(requests)} items ({args.drivers} drivers x {args.loads} loads), {os.cpu_count()} CPUs")
+    serial = run(1)
+    print(f"{'serial':>10} {serial * 1000:>9.0f}ms")
+
+    for workers in args.workers:
+        settings.SCHEDULE_BATCH_WORKERS = workers
+        batch.shutdown_executor()
+        run(workers)  # start the pool and import the planner in every worker
+        elapsed = run(workers)
+        print(f"{workers:>2} workers {elapsed * 1000:>9.0f}ms  {serial / elapsed:>5.2f}x")
+
+    batch.shutdown_executor()
+
+
+if __name__ == '__main__':
+    main()
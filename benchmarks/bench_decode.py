@@ -0,0 +1,74 @@
+"""
+Compares ways of decoding a /drivers/ payload into DriverHosInformation models, and the cost of turning
+the result into the fleet engine's columnar arrays.
+
+    per-row:        DriverHosInformation(**driver) for every driver, as the views do
+    TypeAdapter:    one validate_python call over list[DriverHosInformation]
+    model_construct: no validation at all, as a payload already trusted could be built
+
+    python benchmarks/bench_decode.py --sizes 10000 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_roster(size, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "driverId": f"driver-{i}", "truckName": f"truck-{i}", "dutyStatus": rng.choice(["D", "ON", "OFF", "SB"]),
+            "dutyStatusStartTime": "2024-01-01T00:00:00Z",
+            "shiftWorkMinutes": rng.randint(0, 900), "shiftDriveMinutes": round(rng.uniform(0, 700), 2),
+            "cycleWorkMinutes": rng.randint(0, 4500), "maxShiftWorkMinutes": 840, "maxShiftDriveMinutes": 660,
+            "maxCycleWorkMinutes": 4200, "homeTerminalTimeZoneWindows": "Central Standard Time",
+            "homeTerminalTimeZoneIana": "America/Chicago",
+        }
+        for i in range(size)
+    ]
+
+
+def best_of(function, repeat=3):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TruckHOSMonitor.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import django
+    django.setup()
+
+    from eld_app.fleet_engine import FleetHosArrays
+    from eld_app.models import DriverHosInformation
+    from eld_app.utils import decode_drivers
+
+    print(f"{'drivers':>8} {'method':>16} {'decode':>9} {'rows/s':>11} {'to arrays':>10}")
+    for size in args.sizes:
+        roster = make_roster(size)
+        methods = (
+            ('per-row', lambda: [DriverHosInformation(**driver) for driver in roster]),
+            ('TypeAdapter', lambda: decode_drivers(roster)),
+            ('model_construct', lambda: [DriverHosInformation.model_construct(**driver) for driver in roster]),
+        )
+        for name, decode in methods:
+            elapsed, drivers = best_of(decode)
+            to_arrays, _ = best_of(lambda: FleetHosArrays.from_drivers(drivers))
+            print(f"{size:>8} {name:>16} {elapsed * 1000:>7.0f}ms {size / elapsed:>11,.0f} {to_arrays * 1000:>8.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
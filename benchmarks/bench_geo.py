@@ -0,0 +1,76 @@
+"""
+Measures the truck location index: build time, then radius and k-nearest query times against a vectorized
+haversine scan over the whole fleet.
+
+    python benchmarks/bench_geo.py --sizes 10000 100000 1000000 --queries 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_trucks(size, seed=0):
+    rng = random.Random(seed)
+    return [{"name": f"truck-{i}", "lat": rng.uniform(25, 49), "lng": rng.uniform(-124, -67)} for i in range(size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--radius', type=float, default=50)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TruckHOSMonitor.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import django
+    django.setup()
+
+    from eld_app.geo import EARTH_RADIUS_KM, TruckLocationIndex
+
+    rng = random.Random(1)
+    points = [(rng.uniform(25, 49), rng.uniform(-124, -67)) for _ in range(args.queries)]
+
+    print(f"radius {args.radius:.0f} km, k={args.k}; per-query times")
+    print(f"{'trucks':>9} {'build':>9} {'radius':>9} {'k-nearest':>10} {'scan':>9}")
+    for size in args.sizes:
+        trucks = make_trucks(size)
+        index = TruckLocationIndex()
+        started = time.perf_counter()
+        index.update(trucks)
+        build = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for lat, lng in points:
+            index.within(lat, lng, args.radius)
+        radius = (time.perf_counter() - started) / len(points)
+
+        started = time.perf_counter()
+        for lat, lng in points:
+            index.nearest(lat, lng, args.k)
+        nearest = (time.perf_counter() - started) / len(points)
+
+        lats = np.radians([truck["lat"] for truck in trucks])
+        lngs = np.radians([truck["lng"] for truck in trucks])
+        started = time.perf_counter()
+        for lat, lng in points[:20]:
+            lat, lng = np.radians(lat), np.radians(lng)
+            h = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2
+            distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(h))
+            np.argpartition(distances, args.k)[:args.k]
+        scan = (time.perf_counter() - started) / 20
+
+        print(f"{size:>9} {build * 1000:>7.0f}ms {radius * 1000:>7.3f}ms {nearest * 1000:>8.3f}ms "
+              f"{scan * 1000:>7.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Measures what the hot-path instrumentation costs: a bare call against the same call marked as a stage with
+metrics off and on, then whole HOS requests (served from the roster snapshot) with metrics off, on, and on
+with the Server-Timing header.
+
+    python benchmarks/bench_metrics.py --calls 1000000 --requests 2000
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def per_call(function, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - started) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=1000000)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TruckHOSMonitor.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import django
+    from django.test.utils import setup_test_environment
+    django.setup()
+    setup_test_environment()
+
+    from django.test import Client, override_settings
+
+    from eld_app.metrics import registry, stage, timed
+    from eld_app.utils import drivers_snapshot
+
+    def bare():
+        return None
+
+    marked = timed('bench')(bare)
+
+    def block():
+        with stage('bench'):
+            return None
+
+    print(f"{'':>22} {'off':>9} {'on':>9}")
+    base = per_call(bare, args.calls)
+    rows = []
+    for label, function in (('timed() call', marked), ('with stage() block', block)):
+        costs = []
+        for enabled in (False, True):
+            registry.enabled = enabled
+            costs.append(per_call(function, args.calls) - base)
+        rows.append((label, costs))
+    for label, (off, on) in rows:
+        print(f"{label:>22} {off * 1e9:7.0f}ns {on * 1e9:7.0f}ns")
+
+    drivers_snapshot._store({f"d{i}": {"driverId": f"d{i}", "dutyStatus": "D", "shiftDriveMinutes": 60 + i,
+                                       "shiftWorkMinutes": 90 + i, "cycleWorkMinutes": 600 + i}
+                             for i in range(100)})
+    body = {"start": "2024-01-01T00:00:00Z", "end": "2024-01-08T00:00:00Z"}
+
+    def serve(enabled, server_timing):
+        registry.enabled = enabled
+        with override_settings(METRICS_SERVER_TIMING=server_timing):
+            client = Client()
+            client.post('/api/v1/drivers/hos/d0/', body, content_type='application/json')
+            started = time.perf_counter()
+            for i in range(args.requests):
+                client.post(f'/api/v1/drivers/hos/d{i % 100}/', body, content_type='application/json')
+            return (time.perf_counter() - started) / args.requests
+
+    off = serve(False, False)
+    print(f"HOS request, metrics off:          {off * 1e6:7.0f}us")
+    for label, server_timing in (('on', False), ('on + Server-Timing', True)):
+        cost = serve(True, server_timing)
+        print(f"HOS request, metrics {label + ':':<19}{cost * 1e6:7.0f}us ({(cost - off) * 1e6:+.0f}us)")
+    drivers_snapshot.invalidate()
+
+
+if __name__ == '__main__':
+    main()
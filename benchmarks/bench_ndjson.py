@@ -0,0 +1,129 @@
+"""
+Compares serving the truck list as one JSON array (download, parse, re-render) against the NDJSON stream
+(parse and write one truck per line while the upstream body is still arriving).
+
+A local stub serves ``/trucks/`` as a single JSON array at a fixed bandwidth, standing in for the upstream
+download. Reports time to the first output byte, total time and peak traced memory at each fleet size.
+
+    python benchmarks/bench_ndjson.py --sizes 10000 100000 --mbps 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class StubTrucksHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    body = b'[]'
+    chunk_delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _send_body(self, body: bytes, chunk_size: int = 64 * 1024, delay: float = 0.0):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        for offset in range(0, len(body), chunk_size):
+            self.wfile.write(body[offset:offset + chunk_size])
+            if delay:
+                time.sleep(delay)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._send_body(json.dumps({"access_token": "stub-token", "expires_in": 3600}).encode())
+
+    def do_GET(self):
+        self._send_body(self.body, delay=self.chunk_delay)
+
+
+def make_trucks(size, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "name": f"truck-{i}", "location": "Springfield, IL", "lat": round(rng.uniform(25, 49), 6),
+            "lng": round(rng.uniform(-124, -67), 6), "speed": rng.randint(0, 70), "timeStamp": "2024-01-01T00:00:00Z",
+            "odometer": rng.randint(0, 900000), "driverId": f"driver-{i}",
+        }
+        for i in range(size)
+    ]
+
+
+def measure(function):
+    # Time and memory come from separate runs, as tracing allocations slows everything down.
+    started = time.perf_counter()
+    first_byte = function()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first_byte - started, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--mbps', type=float, default=200, help="upstream bandwidth in megabits per second")
+    parser.add_argument('--fields', default='name,lat,lng')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TruckHOSMonitor.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import django
+    django.setup()
+
+    from eld_app.models import TruckLocation
+    from eld_app.prologs import ProLogsClient
+    from eld_app.renderers import FastJSONRenderer
+    from eld_app.streaming import iter_ndjson
+
+    StubTrucksHandler.chunk_delay = 64 * 1024 * 8 / (args.mbps * 1_000_000)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubTrucksHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    client = ProLogsClient(base_url, f"{base_url}/token")
+    client.token_manager.get_token()
+    include = set(args.fields.split(',')) if args.fields else None
+
+    def json_array():
+        # The body can only be written once everything has been downloaded and rendered.
+        FastJSONRenderer().render(client.get('/trucks/'))
+        return time.perf_counter()
+
+    def ndjson():
+        first_byte = None
+        trucks = (TruckLocation(**item) for item in client.iter_items('/trucks/'))
+        for _ in iter_ndjson(trucks, dumps=lambda truck: truck.model_dump_json(include=include)):
+            if first_byte is None:
+                first_byte = time.perf_counter()
+        return first_byte
+
+    print(f"upstream at {args.mbps:.0f} Mbit/s, NDJSON fields: {args.fields or 'all'}")
+    print(f"{'trucks':>8} {'mode':>10} {'first byte':>11} {'total':>9} {'peak':>10}")
+    for size in args.sizes:
+        StubTrucksHandler.body = json.dumps(make_trucks(size)).encode()
+        for name, function in (('JSON', json_array), ('NDJSON', ndjson)):
+            first_byte, elapsed, peak = measure(function)
+            print(f"{size:>8} {name:>10} {first_byte * 1000:>9.1f}ms {elapsed * 1000:>7.0f}ms "
+                  f"{peak / 1024 / 1024:>6.1f} MiB")
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Measures response rendering: DRF's JSONRenderer against FastJSONRenderer on fleet-sized lists, and the full
+schedule JSON against the timeline-only mode for long trips.
+
+    python benchmarks/bench_render.py --sizes 10000 100000 --days 7 30 90
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_trucks(size, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": i, "name": f"truck-{i}", "lat": round(rng.uniform(25, 49), 6), "lng": round(rng.uniform(-124, -67), 6),
+            "speed": round(rng.uniform(0, 70), 1), "odometer": rng.randint(0, 900000), "engineHours": rng.randint(0, 30000),
+            "timeStamp": "2024-01-01T00:00:00Z", "driverId": f"driver-{i}", "driverName": f"Driver {i}",
+        }
+        for i in range(size)
+    ]
+
+
+def best_of(function, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--days', type=int, nargs='+', default=[7, 30, 90])
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TruckHOSMonitor.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import django
+    django.setup()
+
+    from rest_framework.renderers import JSONRenderer
+
+    from eld_app import renderers
+    from eld_app.models import DriverHosInformation
+    from eld_app.utils import plan_driving_schedule
+
+    print(f"fast encoder: {'orjson' if renderers.orjson is not None else 'none installed (stdlib fallback)'}")
+    print(f"{'trucks':>8} {'JSONRenderer':>13} {'Fast':>9} {'speedup':>8}")
+    for size in args.sizes:
+        trucks = make_trucks(size)
+        drf = best_of(lambda: JSONRenderer().render(trucks))
+        fast = best_of(lambda: renderers.FastJSONRenderer().render(trucks))
+        assert renderers.FastJSONRenderer().render(trucks) == JSONRenderer().render(trucks)
+        print(f"{size:>8} {drf * 1000:>11.1f}ms {fast * 1000:>7.1f}ms {drf / fast:>7.1f}x")
+
+    driver = DriverHosInformation(driverId="driver", shiftDriveMinutes=95, shiftWorkMinutes=120,
+                                  cycleWorkMinutes=1500)
+    pickup = datetime(2024, 1, 1, 6, 30, tzinfo=timezone.utc)
+
+    print(f"\n{'days':>5} {'full KB':>8} {'timeline KB':>12} {'full':>8} {'timeline':>9}")
+    for days in args.days:
+        timeline = plan_driving_schedule(pickup, pickup + timedelta(days=days), driver)
+        # Time rendering afresh, not the text the timeline keeps after its first render.
+        full = best_of(lambda: (setattr(timeline, '_json', None), timeline.to_json()))
+        only = best_of(lambda: (setattr(timeline, '_timeline_json', None), timeline.to_json(timeline_only=True)))
+        print(f"{days:>5} {len(timeline.to_json()) / 1024:>8.1f} {len(timeline.to_json(True)) / 1024:>12.1f} "
+              f"{full * 1000:>6.2f}ms {only * 1000:>7.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Measures the snapshot store: saving a roster (first insert, then an upsert of the same drivers) and loading
+it back, the work a restarted process does instead of fetching /drivers/ from ProLogs.
+
+Runs against a temporary SQLite file in WAL mode.
+
+    python benchmarks/bench_store.py --sizes 10000 50000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_roster(size, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "driverId": f"driver-{i}", "truckName": f"truck-{i}", "dutyStatus": rng.choice(["D", "ON", "OFF", "SB"]),
+            "dutyStatusStartTime": "2024-01-01T00:00:00Z",
+            "shiftWorkMinutes": rng.randint(0, 900), "shiftDriveMinutes": round(rng.uniform(0, 700), 2),
+            "cycleWorkMinutes": rng.randint(0, 4500), "maxShiftWorkMinutes": 840, "maxShiftDriveMinutes": 660,
+            "maxCycleWorkMinutes": 4200, "homeTerminalTimeZoneWindows": "Central Standard Time",
+            "homeTerminalTimeZoneIana": "America/Chicago",
+        }
+        for i in range(size)
+    ]
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000])
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TruckHOSMonitor.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import django
+    from django.conf import settings
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+
+    from eld_app.store import driver_store
+
+    with tempfile.TemporaryDirectory() as directory:
+        settings.DATABASES['default']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+        connection.close()
+        call_command('migrate', verbosity=0)
+
+        print(f"{'drivers':>9} {'insert':>9} {'upsert':>9} {'load':>9}")
+        for size in args.sizes:
+            roster = {item["driverId"]: item for item in make_roster(size)}
+            connection.cursor().execute('DELETE FROM eld_app_driversnapshot')
+            insert, _ = timed(driver_store.save, roster)
+            upsert, _ = timed(driver_store.save, roster)
+            load, _ = timed(driver_store.load, 60)
+            print(f"{size:>9} {insert * 1000:>7.0f}ms {upsert * 1000:>7.0f}ms {load * 1000:>7.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Measures memory per segment and serialization time for planned schedules.
+
+Compares the original representation (a dict per segment with ISO strings, as returned before the
+DrivingTimeline type) against DrivingTimeline's parallel arrays, and building those dicts plus
+json.dumps against DrivingTimeline.to_json().
+
+    python benchmarks/bench_timeline.py --days 7 30 90
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, value
+
+
+def best_of(function, repeat=20):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, nargs='+', default=[7, 30, 90])
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TruckHOSMonitor.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import django
+    django.setup()
+
+    from eld_app.models import DriverHosInformation
+    from eld_app.utils import plan_driving_schedule
+
+    driver = DriverHosInformation(driverId="driver", shiftDriveMinutes=95, shiftWorkMinutes=120,
+                                  cycleWorkMinutes=1500)
+    pickup = datetime(2024, 1, 1, 6, 30, tzinfo=timezone.utc)
+
+    print(f"{'days':>5} {'segments':>9} {'dict B/seg':>11} {'array B/seg':>12} "
+          f"{'dicts+dumps':>12} {'to_json':>9}")
+    for days in args.days:
+        dropoff = pickup + timedelta(days=days)
+        timeline = plan_driving_schedule(pickup, dropoff, driver)
+        segments = len(timeline)
+
+        dict_bytes, as_dict = measure_memory(timeline.to_dict)
+        array_bytes, _ = measure_memory(lambda: plan_driving_schedule(pickup, dropoff, driver))
+
+        dumps = best_of(lambda: json.dumps(timeline.to_dict(), separators=(',', ':')))
+        to_json = best_of(timeline.to_json)
+        assert timeline.to_json() == json.dumps(as_dict, separators=(',', ':'))
+
+        print(f"{days:>5} {segments:>9} {dict_bytes / segments:>11.0f} {array_bytes / segments:>12.0f} "
+              f"{dumps * 1000:>10.2f}ms {to_json * 1000:>7.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Records a simulated day of truck breadcrumbs into the track store and compares its size on disk, once the
+day is over and rewritten, with an SQLite table holding one indexed row per point. Then times indexing the
+store from a fresh reader and a day's track query for one truck.
+
+    python benchmarks/bench_tracks.py --trucks 1000 --interval 30 --hours 24
+"""
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+EPOCH = 1704067200
+
+
+def directory_size(path):
+    return sum(file.stat().st_size for file in Path(path).rglob('*') if file.is_file())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trucks', type=int, default=1000)
+    parser.add_argument('--interval', type=int, default=30, help='seconds between polls')
+    parser.add_argument('--hours', type=float, default=24)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TruckHOSMonitor.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import django
+    django.setup()
+
+    from eld_app.tracks import TrackStore
+
+    rng = random.Random(0)
+    positions = [[rng.uniform(25, 49), rng.uniform(-124, -67), rng.uniform(0, 360)] for _ in range(args.trucks)]
+    polls = int(args.hours * 3600 / args.interval)
+
+    with tempfile.TemporaryDirectory() as directory:
+        clock = [float(EPOCH)]
+        store = TrackStore(Path(directory) / 'tracks', clock=lambda: clock[0])
+        database = sqlite3.connect(Path(directory) / 'points.sqlite3')
+        database.execute('CREATE TABLE point (name TEXT, time INTEGER, lat REAL, lng REAL, speed INTEGER)')
+        database.execute('CREATE INDEX point_name_time ON point (name, time)')
+
+        recording = inserting = 0.0
+        for poll in range(polls):
+            clock[0] = EPOCH + poll * args.interval
+            stamp = datetime.fromtimestamp(clock[0], tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+            trucks = []
+            for index, position in enumerate(positions):
+                # Roughly highway speed, wandering heading.
+                position[2] += rng.uniform(-10, 10)
+                position[0] += 0.004 * args.interval / 30 * rng.uniform(0.5, 1)
+                position[1] += 0.004 * args.interval / 30 * rng.uniform(-1, 1)
+                trucks.append({"name": f"truck-{index}", "lat": position[0], "lng": position[1],
+                               "speed": rng.randint(0, 70), "timeStamp": stamp})
+
+            started = time.perf_counter()
+            store.record(trucks)
+            recording += time.perf_counter() - started
+
+            started = time.perf_counter()
+            database.executemany('INSERT INTO point VALUES (?, ?, ?, ?, ?)',
+                                 [(truck["name"], clock[0], truck["lat"], truck["lng"], truck["speed"])
+                                  for truck in trucks])
+            database.commit()
+            inserting += time.perf_counter() - started
+
+        store.flush()
+        # The next day's maintenance rewrites the finished day into full chunks.
+        store.maintain(EPOCH + math.ceil(args.hours / 24) * 86400)
+        points = polls * args.trucks
+        track_bytes = directory_size(Path(directory) / 'tracks')
+        database.execute('VACUUM')
+        database.close()
+        sqlite_bytes = (Path(directory) / 'points.sqlite3').stat().st_size
+
+        reader = TrackStore(Path(directory) / 'tracks')
+        started = time.perf_counter()
+        reader.refresh()
+        index = time.perf_counter() - started
+        started = time.perf_counter()
+        for truck in range(20):
+            reader.track(f"truck-{truck}", EPOCH, EPOCH + args.hours * 3600)
+        query = (time.perf_counter() - started) / 20
+
+    print(f"{args.trucks} trucks every {args.interval}s for {args.hours:g} h: {points} points")
+    print(f"track store: {track_bytes / points:6.1f} bytes/point, {track_bytes / 2 ** 20:7.1f} MiB, "
+          f"record {recording / polls * 1000:.1f}ms per poll")
+    print(f"sqlite rows: {sqlite_bytes / points:6.1f} bytes/point, {sqlite_bytes / 2 ** 20:7.1f} MiB, "
+          f"insert {inserting / polls * 1000:.1f}ms per poll")
+    print(f"reader: index {index * 1000:.0f}ms, one truck's {args.hours:g} h track {query * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
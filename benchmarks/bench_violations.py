@@ -0,0 +1,79 @@
+"""
+Compares the scalar detect_violation loop with the vectorized fleet engine from 1k to 1M drivers.
+
+The scalar path is timed on pre-built DriverHosInformation objects, so pydantic construction is not
+counted against it; the vectorized path is timed from raw /drivers/ dicts (building the arrays
+included) and on its own once the arrays exist.
+
+    python benchmarks/bench_violations.py --sizes 1000 10000 100000 1000000 --scalar-max 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_roster(size, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "driverId": f"driver-{i}",
+            "truckName": f"truck-{i}",
+            "dutyStatus": rng.choice(["D", "ON", "OFF", "SB"]),
+            "shiftDriveMinutes": float(rng.randint(0, 720)),
+            "shiftWorkMinutes": float(rng.randint(0, 900)),
+            "cycleWorkMinutes": float(rng.randint(0, 4500)),
+            "maxShiftDriveMinutes": 660,
+            "maxShiftWorkMinutes": 840,
+            "maxCycleWorkMinutes": 4200,
+        }
+        for i in range(size)
+    ]
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--scalar-max', type=int, default=100_000, help='largest roster timed on the scalar path')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TruckHOSMonitor.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import django
+    django.setup()
+
+    from eld_app.fleet_engine import FleetHosArrays, evaluate_fleet
+    from eld_app.models import DriverHosInformation
+    from eld_app.utils import detect_violation
+
+    print(f"{'drivers':>10} {'scalar':>10} {'arrays':>10} {'evaluate':>10} {'speedup':>9}")
+    for size in args.sizes:
+        roster = make_roster(size)
+
+        scalar = None
+        if size <= args.scalar_max:
+            drivers = [DriverHosInformation(**item) for item in roster]
+            scalar, _ = timed(lambda: [detect_violation(driver) for driver in drivers])
+
+        build, arrays = timed(FleetHosArrays.from_drivers, roster)
+        evaluate, evaluation = timed(evaluate_fleet, arrays)
+        violators = int((evaluation.violation_counts > 0).sum())
+
+        speedup = f"{scalar / (build + evaluate):8.1f}x" if scalar else f"{'-':>9}"
+        scalar_text = f"{scalar * 1000:8.1f}ms" if scalar else f"{'-':>10}"
+        print(f"{size:>10} {scalar_text} {build * 1000:8.1f}ms {evaluate * 1000:8.2f}ms {speedup}"
+              f"   ({violators} violators)")
+
+
+if __name__ == '__main__':
+    main()
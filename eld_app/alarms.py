@@ -0,0 +1,226 @@
+"""
+Alarms holds the predictive HOS violation scheduler: for every driver it works out when the 11-hour, 14-hour and
+70-hour limits will be reached if the current duty status carries on, and fires warnings at those times.
+
+Alarms sit in one min-heap ordered by firing time, so scheduling is O(log n), finding the next alarm is O(1),
+and nothing rescans the fleet between roster updates. Rescheduling a driver does not search the heap: the
+driver's old alarms are left in place and skipped when they come up, because they carry an older version.
+"""
+import heapq
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from eld_app.models import DriverHosInformation
+from eld_app.utils import decode_drivers_or_none, remaining_hos_minutes
+
+LIMITS = ('drive', 'shift', 'cycle')
+
+# Which limits run down in each duty status: driving uses up all three, other on-duty work (including yard
+# moves) the 14-hour and 70-hour ones. Off duty, sleeper berth and personal conveyance use up none.
+ACCRUING_LIMITS = {
+    'D': ('drive', 'shift', 'cycle'),
+    'ON': ('shift', 'cycle'),
+    'YM': ('shift', 'cycle'),
+}
+
+# The roster fields a driver's projection depends on.
+_TRACKED_FIELDS = (
+    'dutyStatus', 'dutyStatusStartTime', 'shiftDriveMinutes', 'shiftWorkMinutes', 'cycleWorkMinutes',
+    'maxShiftDriveMinutes', 'maxShiftWorkMinutes', 'maxCycleWorkMinutes',
+)
+
+
+class Alarm:
+    """
+    One warning: ``driver_id`` reaches ``limit`` at ``limit_at`` (epoch seconds) and is warned ``lead`` minutes
+    before, at ``fire_at``. A lead of 0 fires when the limit is reached.
+    """
+    __slots__ = ('driver_id', 'limit', 'lead', 'fire_at', 'limit_at', 'duty_status', 'duty_status_start_time')
+
+    def __init__(self, driver_id: str, limit: str, lead: float, fire_at: float, limit_at: float,
+                 duty_status: Optional[str], duty_status_start_time: Optional[str]):
+        self.driver_id = driver_id
+        self.limit = limit
+        self.lead = lead
+        self.fire_at = fire_at
+        self.limit_at = limit_at
+        self.duty_status = duty_status
+        self.duty_status_start_time = duty_status_start_time
+
+    def __repr__(self):
+        return f"Alarm({self.driver_id}, {self.limit}, lead={self.lead}, fire_at={self.fire_at})"
+
+    def to_dict(self) -> dict:
+        return {
+            "driver_id": self.driver_id,
+            "limit": self.limit,
+            "lead_minutes": self.lead,
+            "fire_at": datetime.fromtimestamp(self.fire_at, tz=timezone.utc).isoformat(),
+            "limit_at": datetime.fromtimestamp(self.limit_at, tz=timezone.utc).isoformat(),
+            "duty_status": self.duty_status,
+            "duty_status_start_time": self.duty_status_start_time,
+        }
+
+
+def project_limits(driver: DriverHosInformation, as_of: float) -> dict[str, float]:
+    """
+    When each limit the driver's current status runs down is reached (epoch seconds), if the status carries on
+    from ``as_of``, the time the roster's minute counters were read. Limits already passed are left out, as
+    ``detect_violation`` reports those.
+    """
+    remaining = remaining_hos_minutes(driver)
+    return {
+        limit: as_of + remaining[limit] * 60
+        for limit in ACCRUING_LIMITS.get(driver.duty_status, ())
+        if remaining[limit] >= 0
+    }
+
+
+class ViolationAlarmScheduler:
+    """
+    Pending alarms for a roster, ordered by firing time.
+
+    ``update`` takes the roster as the ``drivers`` snapshot stores it (raw ``/drivers/`` dicts by driver id)
+    and reschedules only drivers whose HOS fields changed. Each limit fires each lead once: a warning already
+    given is not repeated when the driver is rescheduled, until the driver is out of that window again (after a
+    break or reset).
+    """
+
+    def __init__(self, leads: Iterable[float] = (60, 30, 0)):
+        self.leads = sorted(set(leads), reverse=True)
+        self._heap: list[tuple[float, int, int, Alarm]] = []
+        self._sequence = 0
+        # The version of each driver's current alarms; heap entries with any other version are stale.
+        self._versions: dict[str, int] = {}
+        self._pending: dict[str, int] = {}
+        self._fingerprints: dict[str, tuple] = {}
+        # The last raw dict seen per driver; an equal one is skipped without building its fingerprint.
+        self._raw: dict[str, dict] = {}
+        self._fired: dict[str, set[tuple[str, float]]] = {}
+        self._live = 0
+        self._counts = {'scheduled': 0, 'fired': 0, 'rescheduled': 0, 'compactions': 0}
+
+    def __len__(self):
+        return self._live
+
+    def update(self, drivers: dict[str, dict], as_of: Optional[float] = None):
+        as_of = time.time() if as_of is None else as_of
+
+        changed_ids, changed_raw, fingerprints = [], [], []
+        for driver_id, raw in drivers.items():
+            if self._raw.get(driver_id) == raw:
+                continue
+            fingerprint = tuple(raw.get(field) for field in _TRACKED_FIELDS)
+            if self._fingerprints.get(driver_id) != fingerprint:
+                changed_ids.append(driver_id)
+                changed_raw.append(raw)
+                fingerprints.append(fingerprint)
+            else:
+                self._raw[driver_id] = raw
+
+        malformed = False
+        decoded = decode_drivers_or_none(changed_raw)
+        for driver_id, raw, fingerprint, driver in zip(changed_ids, changed_raw, fingerprints, decoded):
+            # A malformed row keeps the driver's last good state, so it is decoded again on the next update.
+            if driver is None:
+                malformed = True
+                continue
+            self.schedule(driver_id, driver, as_of)
+            self._raw[driver_id] = raw
+            self._fingerprints[driver_id] = fingerprint
+        # Unless a row was malformed, every driver in the roster is now in _raw, so equal sizes mean nobody left.
+        if malformed or len(self._raw) != len(drivers):
+            for driver_id in [driver_id for driver_id in self._raw if driver_id not in drivers]:
+                self.remove(driver_id)
+
+    def schedule(self, driver_id: str, driver: DriverHosInformation, as_of: float):
+        """
+        Replaces the driver's pending alarms with ones projected from ``as_of``.
+        """
+        self._drop_pending(driver_id)
+        self._counts['rescheduled'] += 1
+        self._sequence += 1
+        version = self._versions[driver_id] = self._sequence
+        fired = self._fired.setdefault(driver_id, set())
+        remaining = remaining_hos_minutes(driver)
+
+        for limit in LIMITS:
+            for lead in self.leads:
+                if remaining[limit] > lead:
+                    fired.discard((limit, lead))
+
+        for limit, limit_at in project_limits(driver, as_of).items():
+            for index, lead in enumerate(self.leads):
+                fire_at = limit_at - lead * 60
+                # A window already entered only gets its tightest warning, straight away.
+                tighter = self.leads[index + 1] if index + 1 < len(self.leads) else None
+                if tighter is not None and limit_at - tighter * 60 <= as_of:
+                    continue
+                if (limit, lead) in fired:
+                    continue
+                alarm = Alarm(driver_id, limit, lead, max(fire_at, as_of), limit_at, driver.duty_status,
+                              driver.duty_status_start_time)
+                self._push(version, alarm)
+
+        self._compact()
+
+    def remove(self, driver_id: str):
+        self._drop_pending(driver_id)
+        self._versions.pop(driver_id, None)
+        self._fingerprints.pop(driver_id, None)
+        self._raw.pop(driver_id, None)
+        self._fired.pop(driver_id, None)
+        self._compact()
+
+    def next_due(self) -> Optional[float]:
+        """
+        When the next alarm fires (epoch seconds), or None if none is pending.
+        """
+        self._discard_stale_head()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[float] = None) -> list[Alarm]:
+        """
+        Removes and returns every alarm due at ``now``, earliest first.
+        """
+        now = time.time() if now is None else now
+        due = []
+        while True:
+            self._discard_stale_head()
+            if not self._heap or self._heap[0][0] > now:
+                return due
+            _, _, _, alarm = heapq.heappop(self._heap)
+            self._live -= 1
+            self._pending[alarm.driver_id] -= 1
+            self._fired[alarm.driver_id].add((alarm.limit, alarm.lead))
+            self._counts['fired'] += 1
+            due.append(alarm)
+
+    def stats(self) -> dict:
+        return {**self._counts, 'pending': self._live, 'heap': len(self._heap), 'drivers': len(self._versions)}
+
+    def _push(self, version: int, alarm: Alarm):
+        self._sequence += 1
+        heapq.heappush(self._heap, (alarm.fire_at, self._sequence, version, alarm))
+        self._live += 1
+        self._pending[alarm.driver_id] = self._pending.get(alarm.driver_id, 0) + 1
+        self._counts['scheduled'] += 1
+
+    def _drop_pending(self, driver_id: str):
+        # The entries stay in the heap; a new version (or none, once removed) makes them stale.
+        self._live -= self._pending.pop(driver_id, 0)
+
+    def _is_stale(self, entry) -> bool:
+        return self._versions.get(entry[3].driver_id) != entry[2]
+
+    def _discard_stale_head(self):
+        while self._heap and self._is_stale(self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def _compact(self):
+        # Rebuild once stale entries outnumber live ones, so the heap stays within twice the pending alarms.
+        if len(self._heap) > 2 * self._live + 64:
+            self._heap = [entry for entry in self._heap if not self._is_stale(entry)]
+            heapq.heapify(self._heap)
+            self._counts['compactions'] += 1
@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class EldAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'eld_app'
+
+    def ready(self):
+        from eld_app.store import configure_sqlite
+        connection_created.connect(configure_sqlite)
@@ -0,0 +1,168 @@
+"""
+Availability holds the in-process index of how much time each driver has left before their HOS limits.
+
+Every driver's remaining minutes are kept in one sorted list per measure, so threshold queries are a binary
+search plus a slice. When a new roster arrives, only drivers whose HOS fields changed are recomputed.
+"""
+import threading
+from bisect import bisect_left, insort
+from typing import Optional
+
+from eld_app.models import DriverHosInformation
+from eld_app.planner import DRIVING, iter_segments
+from eld_app.signals import snapshot_refreshed
+from eld_app.utils import decode_drivers_or_none, remaining_hos_minutes
+
+# drive/shift/cycle: minutes left until the 11-hour, 14-hour and 70-hour limits (negative once exceeded).
+# available: driving the driver can still legally do now, the smallest of the three, never below zero.
+# break: minutes of driving before the planner's next required break or reset.
+MEASURES = ('drive', 'shift', 'cycle', 'available', 'break')
+
+# The roster fields a driver's entry depends on, and the truck it is looked up by (kept first).
+_TRACKED_FIELDS = (
+    'truckName', 'dutyStatus', 'shiftDriveMinutes', 'shiftWorkMinutes', 'cycleWorkMinutes',
+    'maxShiftDriveMinutes', 'maxShiftWorkMinutes', 'maxCycleWorkMinutes',
+)
+
+
+def driver_availability(driver: DriverHosInformation) -> dict[str, float]:
+    remaining = remaining_hos_minutes(driver)
+    segment_type, _, _, duration = next(iter_segments(driver.shift_drive_minutes, driver.cycle_work_minutes))
+    return {
+        **remaining,
+        'available': max(0, min(remaining.values())),
+        'break': duration if segment_type == DRIVING else 0,
+    }
+
+
+class DriveTimeIndex:
+    """
+    Remaining HOS minutes for a roster, indexed for "at least N minutes left" queries.
+
+    ``update`` takes the roster as the ``drivers`` snapshot stores it (raw ``/drivers/`` dicts by driver
+    id). Unchanged drivers keep their entries; if more than ``rebuild_ratio`` of the roster changed, the
+    sorted lists are rebuilt in one pass instead of patched entry by entry.
+    """
+
+    def __init__(self, rebuild_ratio: float = 0.25):
+        self.rebuild_ratio = rebuild_ratio
+        self._lock = threading.Lock()
+        self._source = None
+        self._fingerprints: dict[str, tuple] = {}
+        self._entries: dict[str, dict[str, float]] = {}
+        self._truck_drivers: dict[str, str] = {}
+        self._sorted: dict[str, list[tuple[float, str]]] = {measure: [] for measure in MEASURES}
+        self._counts = {'updates': 0, 'recomputed': 0, 'removed': 0, 'rebuilds': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def update(self, drivers: dict[str, dict]):
+        with self._lock:
+            if drivers is self._source:
+                return
+
+            changed_ids, changed_raw, fingerprints = [], [], []
+            for driver_id, raw in drivers.items():
+                fingerprint = tuple(raw.get(field) for field in _TRACKED_FIELDS)
+                if self._fingerprints.get(driver_id) != fingerprint:
+                    changed_ids.append(driver_id)
+                    changed_raw.append(raw)
+                    fingerprints.append(fingerprint)
+
+            # A malformed row keeps the driver's last good entry and fingerprint, so it is decoded again next time.
+            decoded = decode_drivers_or_none(changed_raw)
+            changed = {
+                driver_id: (fingerprint, driver_availability(driver))
+                for driver_id, fingerprint, driver in zip(changed_ids, fingerprints, decoded) if driver is not None
+            }
+            removed = [driver_id for driver_id in self._entries if driver_id not in drivers]
+
+            rebuild = len(changed) + len(removed) > self.rebuild_ratio * max(len(self._entries), 1)
+            for driver_id in removed:
+                if not rebuild:
+                    self._unindex(driver_id)
+                self._unassign_truck(driver_id)
+                del self._entries[driver_id], self._fingerprints[driver_id]
+
+            for driver_id, (fingerprint, entry) in changed.items():
+                if driver_id in self._entries:
+                    if not rebuild:
+                        self._unindex(driver_id)
+                    self._unassign_truck(driver_id)
+                self._entries[driver_id], self._fingerprints[driver_id] = entry, fingerprint
+                if fingerprint[0] is not None:
+                    self._truck_drivers[fingerprint[0]] = driver_id
+                if not rebuild:
+                    for measure in MEASURES:
+                        insort(self._sorted[measure], (entry[measure], driver_id))
+
+            if rebuild:
+                self._sorted = {
+                    measure: sorted((entry[measure], driver_id) for driver_id, entry in self._entries.items())
+                    for measure in MEASURES
+                }
+                self._counts['rebuilds'] += 1
+
+            self._source = drivers
+            self._counts['updates'] += 1
+            self._counts['recomputed'] += len(changed)
+            self._counts['removed'] += len(removed)
+
+    def _unindex(self, driver_id: str):
+        entry = self._entries[driver_id]
+        for measure in MEASURES:
+            items = self._sorted[measure]
+            del items[bisect_left(items, (entry[measure], driver_id))]
+
+    def _unassign_truck(self, driver_id: str):
+        truck_name = self._fingerprints[driver_id][0]
+        if self._truck_drivers.get(truck_name) == driver_id:
+            del self._truck_drivers[truck_name]
+
+    def at_least(self, minutes: float, measure: str = 'available',
+                 limit: Optional[int] = None) -> list[tuple[str, dict[str, float]]]:
+        """
+        Returns ``(driver_id, remaining minutes)`` for drivers with at least ``minutes`` left on ``measure``,
+        most time left first.
+        """
+        with self._lock:
+            items = self._sorted[measure]
+            start = bisect_left(items, (minutes,))
+            if limit is not None:
+                start = max(start, len(items) - limit)
+            return [(driver_id, self._entries[driver_id]) for _, driver_id in reversed(items[start:])]
+
+    def get(self, driver_id: str) -> Optional[dict[str, float]]:
+        with self._lock:
+            return self._entries.get(driver_id)
+
+    def for_truck(self, truck_name: str) -> Optional[tuple[str, dict[str, float]]]:
+        """
+        Returns ``(driver_id, remaining minutes)`` for the driver the roster assigns to ``truck_name``.
+        """
+        with self._lock:
+            driver_id = self._truck_drivers.get(truck_name)
+            return None if driver_id is None else (driver_id, self._entries[driver_id])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counts, 'drivers': len(self._entries)}
+
+
+drive_time_index = DriveTimeIndex()
+
+
+def _update_drive_time_index(sender, name, data, **kwargs):
+    if name == 'drivers':
+        drive_time_index.update(data)
+
+
+snapshot_refreshed.connect(_update_drive_time_index)
+
+
+def available_drivers(drivers: dict[str, dict], minutes: float, measure: str = 'available',
+                      limit: Optional[int] = None) -> list[tuple[str, dict[str, float]]]:
+    # A roster another process refreshed never fires the signal here, so catch up with it first.
+    drive_time_index.update(drivers)
+    return drive_time_index.at_least(minutes, measure, limit)
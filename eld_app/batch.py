@@ -0,0 +1,109 @@
+"""
+Batch holds the multi-driver, multi-trip schedule planner.
+
+Jobs already in the schedule memo (or repeated within the batch) are answered in this process; the rest
+are planned across a shared process pool, in chunks, and come back in input order.
+"""
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Optional, Sequence
+
+import django
+from django.conf import settings
+
+from eld_app.models import DriverHosInformation
+from eld_app.planner import PlanJob, plan_job
+from eld_app.responses import DrivingTimeline
+from eld_app.utils import schedule_memo, schedule_memo_key
+
+# One batch item: the driver, the pickup time and the dropoff time.
+PlanRequest = tuple[DriverHosInformation, datetime, datetime]
+
+# The outcome of one item: the planned timeline, or the error that prevented planning it.
+PlanOutcome = tuple[Optional[DrivingTimeline], Optional[str]]
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def batch_workers() -> int:
+    return settings.SCHEDULE_BATCH_WORKERS or os.cpu_count() or 1
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # forkserver by default: forking a threaded server process directly can copy held locks.
+            # Workers set Django up first, as unpickling a job imports eld_app.models.
+            context = multiprocessing.get_context(settings.SCHEDULE_BATCH_START_METHOD)
+            _executor = ProcessPoolExecutor(max_workers=batch_workers(), mp_context=context, initializer=django.setup)
+        return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _run_jobs(jobs: list[PlanJob], workers: int, chunksize: Optional[int]) -> list[PlanOutcome]:
+    if workers <= 1 or len(jobs) < settings.SCHEDULE_BATCH_MIN_PARALLEL:
+        return [plan_job(job) for job in jobs]
+
+    # A few chunks per worker keeps them all busy when some trips are much longer than others.
+    chunksize = chunksize or math.ceil(len(jobs) / (workers * 4))
+    try:
+        return list(get_executor().map(plan_job, jobs, chunksize=chunksize))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool next time and plan this batch here.
+        print("Schedule batch pool broke, planning in process")
+        shutdown_executor()
+        return [plan_job(job) for job in jobs]
+
+
+def plan_driving_schedules(requests: Sequence[PlanRequest], workers: Optional[int] = None,
+                           chunksize: Optional[int] = None) -> list[PlanOutcome]:
+    """
+    Plans every ``(driver, pickup, dropoff)`` request and returns one ``(timeline, error)`` per request, in
+    input order. A failing request only sets its own error.
+    """
+    outcomes: list[Optional[PlanOutcome]] = [None] * len(requests)
+    pending: dict[tuple, list[int]] = {}
+    jobs: list[PlanJob] = []
+
+    for index, (driver, pickup, dropoff) in enumerate(requests):
+        try:
+            key = schedule_memo_key(pickup, dropoff, driver)
+        except Exception as e:
+            outcomes[index] = (None, f"{type(e).__name__}: {e}")
+            continue
+
+        if key in pending:
+            pending[key].append(index)
+            continue
+
+        timeline = schedule_memo.get(key)
+        if timeline is not None:
+            outcomes[index] = (timeline, None)
+            continue
+
+        pending[key] = [index]
+        jobs.append((driver.shift_drive_minutes, driver.cycle_work_minutes, pickup, dropoff))
+
+    results = _run_jobs(jobs, workers or batch_workers(), chunksize)
+
+    for (key, indexes), outcome in zip(pending.items(), results):
+        if outcome[0] is not None:
+            schedule_memo.put(key, outcome[0])
+        for index in indexes:
+            outcomes[index] = outcome
+
+    return outcomes
@@ -0,0 +1,365 @@
+"""
+Cache holds the shared, stale-while-revalidate snapshot cache used for the fleet-wide ProLogs payloads,
+and a small in-process LRU/TTL cache for memoizing computed results.
+"""
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.db import connections
+
+from eld_app.signals import snapshot_refreshed
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.fetched_at = None
+        self.error = None
+
+
+class SnapshotCache:
+    """
+    Caches one upstream payload in a Django cache backend.
+
+    A snapshot younger than ``ttl`` seconds is served as is. Up to ``stale_ttl`` seconds past that it
+    is still served, but the first caller to see it starts a background refresh. Anything older is a
+    miss, and concurrent misses in this process share a single upstream fetch.
+
+    The backend holds a small metadata entry next to the payload, so a process only deserializes the
+    payload when another process has replaced it since the last read.
+
+    ``aget`` follows the same rules for async callers, coalescing misses on one ``fetch_async`` task.
+
+    With a ``store`` (see ``eld_app.store``), every snapshot fetched is also saved there, and a miss first
+    loads the stored one if it was fetched less than ``store_max_age`` seconds ago. A stored snapshot past
+    the TTL is served as stale while a refresh runs. Saves run off the caller's thread; with ``save_fetches``
+    off only snapshots handed to ``put`` are saved, leaving a poller as the store's single writer.
+    """
+
+    def __init__(self, name: str, fetch: Callable[[], Any], ttl: float, stale_ttl: float = 0,
+                 cache_alias: str = 'default', fetch_async: Optional[Callable[[], Awaitable[Any]]] = None,
+                 store=None, store_max_age: float = 0, save_fetches: bool = True):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._fetch = fetch
+        self._fetch_async = fetch_async
+        self._cache_alias = cache_alias
+        self._persistent = store if store_max_age > 0 else None
+        self.store_max_age = store_max_age
+        self.save_fetches = save_fetches
+        self._meta_key = f"eld_app:snapshot:{name}:meta"
+        self._data_key = f"eld_app:snapshot:{name}:data"
+
+        self._lock = threading.Lock()
+        self._flight: Optional[_Flight] = None
+        # Event loop: its in-flight async refresh. A future cannot be awaited from another loop.
+        self._async_flights: dict[asyncio.AbstractEventLoop, asyncio.Future] = {}
+        self._async_save: Optional[asyncio.Future] = None
+        self._save_thread: Optional[threading.Thread] = None
+        self._local_version = None
+        self._local_data = None
+        self._counts = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0, 'refreshes': 0, 'refresh_errors': 0,
+                        'restores': 0}
+
+    @property
+    def cache(self):
+        return caches[self._cache_alias]
+
+    def get(self) -> Any:
+        fetched_at, data = self._read()
+        if fetched_at is not None:
+            age = time.time() - fetched_at
+            if age < self.ttl:
+                self._count('hits')
+                return data
+            if age < self.ttl + self.stale_ttl:
+                self._count('stale_hits')
+                self._refresh_in_background()
+                return data
+
+        self._count('misses')
+        fetched_at, data = self._restore()
+        if data is not None:
+            if time.time() - fetched_at >= self.ttl:
+                self._refresh_in_background()
+            return data
+        return self._refresh()
+
+    async def aget(self) -> Any:
+        # The cache backend may block (the file backend reads from disk), so it is read off the event loop.
+        fetched_at, data = await sync_to_async(self._read, thread_sensitive=False)()
+        if fetched_at is not None:
+            age = time.time() - fetched_at
+            if age < self.ttl:
+                self._count('hits')
+                return data
+            if age < self.ttl + self.stale_ttl:
+                self._count('stale_hits')
+                self._start_async_flight()
+                return data
+
+        self._count('misses')
+        loop = asyncio.get_running_loop()
+        if self._persistent is not None and loop not in self._async_flights:
+            fetched_at, data = await sync_to_async(self._restore)()
+            if data is not None:
+                if time.time() - fetched_at >= self.ttl:
+                    self._start_async_flight()
+                return data
+        if loop in self._async_flights:
+            self._count('coalesced')
+        return await asyncio.shield(self._start_async_flight())
+
+    def peek(self) -> Any:
+        """
+        Returns the cached payload if it is still fresh, without ever going upstream.
+        """
+        fetched_at, data = self._read()
+        if fetched_at is not None and time.time() - fetched_at < self.ttl:
+            return data
+        return None
+
+    def age(self) -> Optional[float]:
+        meta = self.cache.get(self._meta_key)
+        return None if meta is None else time.time() - meta[0]
+
+    def put(self, data):
+        """
+        Stores a payload fetched elsewhere (e.g. by the fleet poller) as a fresh snapshot.
+        """
+        self._count('refreshes')
+        self._persist(data, self._store(data))
+
+    def invalidate(self):
+        self.cache.delete_many([self._meta_key, self._data_key])
+        with self._lock:
+            self._local_version = self._local_data = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts['hits'] + counts['stale_hits'] + counts['misses']
+        return {
+            **counts,
+            'hit_ratio': (counts['hits'] + counts['stale_hits']) / lookups if lookups else None,
+            'age': self.age(),
+            'ttl': self.ttl,
+            'stale_ttl': self.stale_ttl,
+        }
+
+    def _read(self):
+        meta = self.cache.get(self._meta_key)
+        if meta is None:
+            return None, None
+
+        fetched_at, version = meta
+        with self._lock:
+            if version == self._local_version:
+                return fetched_at, self._local_data
+
+        data = self.cache.get(self._data_key)
+        if data is None:
+            return None, None
+
+        with self._lock:
+            self._local_version, self._local_data = version, data
+        return fetched_at, data
+
+    def _store(self, data, fetched_at: Optional[float] = None) -> float:
+        fetched_at, version = time.time() if fetched_at is None else fetched_at, uuid.uuid4().hex
+        timeout = max(1.0, fetched_at + self.ttl + self.stale_ttl - time.time())
+        self.cache.set_many({self._data_key: data, self._meta_key: (fetched_at, version)}, timeout=timeout)
+        with self._lock:
+            self._local_version, self._local_data = version, data
+        snapshot_refreshed.send(sender=self.__class__, name=self.name, data=data)
+        return fetched_at
+
+    def _restore(self):
+        if self._persistent is None:
+            return None, None
+        try:
+            fetched_at, data = self._persistent.load(self.store_max_age)
+        except Exception as e:
+            print(f"Error loading stored {self.name} snapshot: {e}")
+            return None, None
+        if data is None:
+            return None, None
+
+        self._count('restores')
+        # Cached as fetched at the start of the stale window at the latest, so it is served until refreshed.
+        self._store(data, fetched_at if self.stale_ttl <= 0 else max(fetched_at, time.time() - self.ttl))
+        return fetched_at, data
+
+    def _persist(self, data, fetched_at: float):
+        if self._persistent is None:
+            return
+        try:
+            self._persistent.save(data, fetched_at)
+        except Exception as e:
+            print(f"Error saving {self.name} snapshot: {e}")
+
+    def _refresh(self):
+        with self._lock:
+            flight = self._flight
+            leader = flight is None
+            if leader:
+                flight = self._flight = _Flight()
+            else:
+                self._counts['coalesced'] += 1
+
+        if leader:
+            self._run_flight(flight)
+            # Saved on another thread, so this caller is not kept waiting on the database.
+            if flight.error is None and self._saves_fetches():
+                self._save_thread = threading.Thread(target=self._run_background_save,
+                                                     args=(flight.result, flight.fetched_at),
+                                                     name=f'snapshot-save-{self.name}', daemon=True)
+                self._save_thread.start()
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._flight is not None:
+                return
+            flight = self._flight = _Flight()
+
+        threading.Thread(target=self._run_background_flight, args=(flight,), name=f'snapshot-refresh-{self.name}',
+                         daemon=True).start()
+
+    def _run_background_flight(self, flight: _Flight):
+        try:
+            self._run_flight(flight)
+            # Saved once waiting callers have the snapshot.
+            if flight.error is None and self._saves_fetches():
+                self._persist(flight.result, flight.fetched_at)
+        finally:
+            # Saving to the store opened a database connection for this thread.
+            connections.close_all()
+
+    def _run_background_save(self, data, fetched_at: float):
+        try:
+            self._persist(data, fetched_at)
+        finally:
+            connections.close_all()
+
+    def _saves_fetches(self) -> bool:
+        return self._persistent is not None and self.save_fetches
+
+    def _run_flight(self, flight: _Flight):
+        self._count('refreshes')
+        try:
+            flight.result = self._fetch()
+            flight.fetched_at = self._store(flight.result)
+        except Exception as e:
+            self._count('refresh_errors')
+            print(f"Error refreshing {self.name} snapshot: {e}")
+            flight.error = e
+        finally:
+            with self._lock:
+                self._flight = None
+            flight.done.set()
+
+    def _start_async_flight(self) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        flight = self._async_flights.get(loop)
+        if flight is None:
+            flight = self._async_flights[loop] = loop.create_task(self._run_async_flight(loop))
+            flight.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return flight
+
+    async def _run_async_flight(self, loop: asyncio.AbstractEventLoop):
+        self._count('refreshes')
+        try:
+            data = await self._fetch_async()
+            fetched_at = await sync_to_async(self._store, thread_sensitive=False)(data)
+            # Saved in the background rather than making the awaiting callers wait for it.
+            if self._saves_fetches():
+                self._async_save = asyncio.ensure_future(sync_to_async(self._persist)(data, fetched_at))
+            return data
+        except Exception as e:
+            self._count('refresh_errors')
+            print(f"Error refreshing {self.name} snapshot: {e}")
+            raise
+        finally:
+            self._async_flights.pop(loop, None)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+
+class LRUCache:
+    """
+    A thread-safe, bounded in-process cache. Entries expire ``ttl`` seconds after they are stored and the
+    least recently used entry is evicted once ``maxsize`` is reached.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data: OrderedDict = OrderedDict()
+        self._counts = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._counts['misses'] += 1
+                return default
+
+            stored_at, value = entry
+            if self.ttl is not None and self._clock() - stored_at >= self.ttl:
+                del self._data[key]
+                self._counts['expirations'] += 1
+                self._counts['misses'] += 1
+                return default
+
+            self._data.move_to_end(key)
+            self._counts['hits'] += 1
+            return value
+
+    def put(self, key: Hashable, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self._clock(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._counts['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._counts['invalidations'] += 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            size = len(self._data)
+        lookups = counts['hits'] + counts['misses']
+        return {
+            **counts,
+            'hit_ratio': counts['hits'] / lookups if lookups else None,
+            'size': size,
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+        }
@@ -0,0 +1,238 @@
+"""
+Cycle holds the rolling 60-hour/7-day and 70-hour/8-day on-duty totals computed from duty-status logs,
+so the cycle minutes ProLogs reports can be checked against the drivers' own history.
+
+A driver's log is kept as sorted segments with a running on-duty total at each segment start, so any
+window total is two lookups and a rolling scan over the whole log is a single two-pointer pass. New
+statuses are appended in time order without touching earlier segments.
+
+Windows are exact rolling periods ending at the time asked about, rather than calendar days starting at
+the home terminal's midnight.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, Optional
+
+from django.db.models import OuterRef, Subquery
+
+from eld_app.models import DutyStatusRecord
+
+ON_DUTY_STATUSES = frozenset({'D', 'ON', 'YM'})
+
+RESTART_SECONDS = 34 * 3600
+DAY_SECONDS = 24 * 3600
+
+# Rule name: (window in days, on-duty limit in minutes).
+CYCLE_RULES = {
+    '60/7': (7, 60 * 60),
+    '70/8': (8, 70 * 60),
+}
+
+
+def _seconds(value: datetime) -> float:
+    return value.timestamp()
+
+
+def _datetime(seconds: Optional[float]) -> Optional[datetime]:
+    return None if seconds is None else datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+class CycleEngine:
+    """
+    One driver's duty-status log, for rolling on-duty totals and 34-hour restarts.
+
+    Consecutive statuses on the same side of on/off duty are merged into one segment. An off-duty
+    stretch (OFF, SB or PC) of at least 34 hours is a restart: on-duty time before it no longer counts.
+    """
+
+    __slots__ = ('starts', 'on_duty', 'cumulative', 'restarts', '_off_start')
+
+    def __init__(self):
+        self.starts: list[float] = []
+        self.on_duty: list[bool] = []
+        # On-duty seconds logged before each segment start.
+        self.cumulative: list[float] = []
+        # When each completed restart took effect (34 hours into its off-duty stretch).
+        self.restarts: list[float] = []
+        self._off_start: Optional[float] = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_records(cls, records: Iterable[DutyStatusRecord]) -> 'CycleEngine':
+        engine = cls()
+        engine.extend((record.start_time, record.duty_status) for record in records)
+        return engine
+
+    def extend(self, statuses: Iterable[tuple[datetime, Optional[str]]]):
+        for start, status in statuses:
+            self.append(_seconds(start), status)
+
+    def append(self, start: float, status: Optional[str]):
+        """
+        Adds a status starting at ``start`` (epoch seconds); it lasts until the next one.
+        """
+        on_duty = status in ON_DUTY_STATUSES
+
+        if self.starts:
+            last = self.starts[-1]
+            if start < last:
+                raise ValueError("Duty statuses must be appended in time order")
+            if self.on_duty[-1] == on_duty:
+                return
+            cumulative = self.cumulative[-1] + (start - last if self.on_duty[-1] else 0)
+        else:
+            cumulative = 0
+
+        if on_duty:
+            if self._off_start is not None and start - self._off_start >= RESTART_SECONDS:
+                self.restarts.append(self._off_start + RESTART_SECONDS)
+            self._off_start = None
+        else:
+            self._off_start = start
+
+        self.starts.append(start)
+        self.on_duty.append(on_duty)
+        self.cumulative.append(cumulative)
+
+    def on_duty_until(self, at: float) -> float:
+        """
+        On-duty seconds logged from the first segment up to ``at``.
+        """
+        index = bisect_right(self.starts, at) - 1
+        if index < 0:
+            return 0
+        return self.cumulative[index] + (at - self.starts[index] if self.on_duty[index] else 0)
+
+    def last_restart(self, at: float) -> Optional[float]:
+        if self._off_start is not None and self._off_start + RESTART_SECONDS <= at:
+            return self._off_start + RESTART_SECONDS
+        index = bisect_right(self.restarts, at)
+        return self.restarts[index - 1] if index else None
+
+    def window_on_duty(self, at: float, days: int) -> float:
+        """
+        On-duty seconds in the ``days`` before ``at``, not counting anything before the last restart.
+        """
+        window_start = at - days * DAY_SECONDS
+        restart = self.last_restart(at)
+        if restart is not None and restart > window_start:
+            window_start = restart
+        return self.on_duty_until(at) - self.on_duty_until(window_start)
+
+    def iter_rolling_on_duty(self, days: int, until: float) -> Iterator[tuple[float, float]]:
+        """
+        Yields ``(time, on-duty seconds in the window ending then)`` at every segment start and at ``until``.
+
+        A window total only rises while the driver is on duty, so its peaks fall on these points. Both ends of
+        the window and the restarts are walked with forward-only pointers, making this linear in the log.
+        """
+        span = days * DAY_SECONDS
+        starts, on_duty, cumulative, restarts = self.starts, self.on_duty, self.cumulative, self.restarts
+        ongoing_restart = self._off_start + RESTART_SECONDS if self._off_start is not None else None
+        count = bisect_left(starts, until)
+        first = 0
+        restart_index = 0
+
+        for index in range(count + 1):
+            at = starts[index] if index < count else until
+            current = index if index < count else count - 1
+            if current < 0:
+                yield at, 0
+                continue
+
+            window_start = at - span
+            while restart_index < len(restarts) and restarts[restart_index] <= at:
+                restart_index += 1
+            if restart_index and restarts[restart_index - 1] > window_start:
+                window_start = restarts[restart_index - 1]
+            if ongoing_restart is not None and window_start < ongoing_restart <= at:
+                window_start = ongoing_restart
+
+            while first < current and starts[first + 1] <= window_start:
+                first += 1
+
+            total = cumulative[current] + (at - starts[current] if on_duty[current] else 0)
+            if starts[first] <= window_start:
+                total -= cumulative[first] + (window_start - starts[first] if on_duty[first] else 0)
+            yield at, total
+
+    def totals(self, at: datetime) -> dict:
+        """
+        The driver's cycle position at ``at``: on-duty minutes and minutes left under both rules, the last
+        restart, and the current off-duty stretch with when it would complete a restart.
+        """
+        now = _seconds(at)
+        result = {}
+        for rule, (days, limit) in CYCLE_RULES.items():
+            minutes = self.window_on_duty(now, days) / 60
+            result[rule] = {'on_duty_minutes': minutes, 'remaining_minutes': limit - minutes}
+
+        off_start = self._off_start if self._off_start is not None and self._off_start <= now else None
+        result['last_restart'] = _datetime(self.last_restart(now))
+        result['off_duty_minutes'] = (now - off_start) / 60 if off_start is not None else 0
+        # Going off duty now (or staying off) completes a restart 34 hours after the stretch began.
+        result['restart_complete_at'] = _datetime((off_start if off_start is not None else now) + RESTART_SECONDS)
+        return result
+
+
+def load_cycle_engines(driver_ids: Optional[Iterable[str]], at: datetime,
+                       days: int = max(days for days, _ in CYCLE_RULES.values())) -> dict[str, CycleEngine]:
+    """
+    Builds engines for many drivers from the local duty-status history in two queries: the status each
+    driver was in at the start of the window, then everything logged inside it.
+    """
+    window_start = at - timedelta(days=days)
+    records = DutyStatusRecord.objects.all()
+    if driver_ids is not None:
+        records = records.filter(driver_id__in=list(driver_ids))
+
+    in_effect = (DutyStatusRecord.objects.filter(driver_id=OuterRef('driver_id'), start_time__lte=window_start)
+                 .order_by('-start_time').values('start_time')[:1])
+    first_statuses = (records.filter(start_time=Subquery(in_effect))
+                      .values_list('driver_id', 'start_time', 'duty_status'))
+
+    engines: dict[str, CycleEngine] = {}
+    for driver_id, start_time, duty_status in first_statuses:
+        # Seeded at its real start, so an off-duty stretch already under way counts towards a restart.
+        engines[driver_id] = CycleEngine()
+        engines[driver_id].append(_seconds(start_time), duty_status)
+
+    rows = (records.filter(start_time__gt=window_start, start_time__lt=at)
+            .order_by('driver_id', 'start_time').values_list('driver_id', 'start_time', 'duty_status'))
+    for driver_id, start_time, duty_status in rows.iterator(chunk_size=5000):
+        engine = engines.get(driver_id)
+        if engine is None:
+            engine = engines[driver_id] = CycleEngine()
+        engine.append(_seconds(start_time), duty_status)
+
+    return engines
+
+
+def audit_cycle_minutes(drivers: dict[str, dict], at: datetime) -> Iterator[dict]:
+    """
+    Compares each driver's upstream ``cycleWorkMinutes`` with the 70/8 total computed from the local log
+    (or 60/7 for drivers whose cycle limit is 60 hours). Drivers with no local history are skipped.
+    """
+    # Load the whole fleet rather than filter on thousands of ids, which SQLite caps per query.
+    engines = load_cycle_engines(None, at)
+    for driver_id, engine in engines.items():
+        driver = drivers.get(driver_id)
+        if driver is None:
+            continue
+        rule = '60/7' if driver.get('maxCycleWorkMinutes') == CYCLE_RULES['60/7'][1] else '70/8'
+        totals = engine.totals(at)
+        upstream = driver.get('cycleWorkMinutes')
+        computed = totals[rule]['on_duty_minutes']
+        yield {
+            "driver_id": driver_id,
+            "rule": rule,
+            "upstream_cycle_minutes": upstream,
+            "computed_cycle_minutes": computed,
+            "difference_minutes": None if upstream is None else upstream - computed,
+            "remaining_minutes": totals[rule]['remaining_minutes'],
+            "last_restart": totals['last_restart'],
+            "off_duty_minutes": totals['off_duty_minutes'],
+            "restart_complete_at": totals['restart_complete_at'],
+        }
@@ -0,0 +1,184 @@
+"""
+Events holds the Server-Sent Events stream of fleet changes published by the poller.
+
+The stream is a raw ASGI app, mounted in ``TruckHOSMonitor/asgi.py`` beside Django, as Django 3.2 cannot hold
+an async response open. One broadcaster per process reads new ``FleetEvent`` rows and fans them out to every
+open stream, so the database is polled once however many clients are connected. A client that reconnects
+with ``Last-Event-ID`` is first sent what it missed.
+"""
+import asyncio
+from typing import Optional
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from eld_app.models import FleetEvent
+from eld_app.renderers import dumps
+
+# Most events sent per read: the backlog of a reconnecting client, or one broadcaster poll.
+BATCH_SIZE = 1000
+
+# Events a slow stream may fall behind by before it is closed; its client reconnects and catches up.
+QUEUE_SIZE = 100
+
+
+def events_after(last_id: int, limit: int = BATCH_SIZE) -> list[dict]:
+    return list(FleetEvent.objects.filter(id__gt=last_id).order_by('id')
+                .values('id', 'kind', 'key', 'action', 'data', 'created_at')[:limit])
+
+
+def latest_event_id() -> int:
+    latest = FleetEvent.objects.order_by('-id').values_list('id', flat=True).first()
+    return latest or 0
+
+
+def format_event(event: dict) -> bytes:
+    data = dumps({"key": event['key'], "action": event['action'], "data": event['data'],
+                  "created_at": event['created_at'].isoformat()})
+    return f"id: {event['id']}\nevent: {event['kind']}\ndata: {data}\n\n".encode()
+
+
+class EventBroadcaster:
+    """
+    Reads new events while at least one stream is subscribed and hands each batch to every subscriber.
+    """
+
+    def __init__(self, poll_interval: float):
+        self.poll_interval = poll_interval
+        self._subscribers: set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.last_id: Optional[int] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        subscriber = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers.add(subscriber)
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber: asyncio.Queue):
+        self._subscribers.discard(subscriber)
+
+    async def start(self):
+        if self.last_id is None:
+            self.last_id = await sync_to_async(latest_event_id)()
+
+    async def _run(self):
+        try:
+            await self.start()
+            while self._subscribers:
+                events = await sync_to_async(events_after)(self.last_id)
+                if events:
+                    self.last_id = events[-1]['id']
+                    for subscriber in list(self._subscribers):
+                        try:
+                            subscriber.put_nowait(events)
+                        except asyncio.QueueFull:
+                            # Too far behind: end that stream rather than buffer without bound.
+                            self._close(subscriber)
+                if len(events) < BATCH_SIZE:
+                    await asyncio.sleep(self.poll_interval)
+        except Exception as e:
+            print(f"Error reading fleet events: {e}")
+            for subscriber in list(self._subscribers):
+                self._close(subscriber)
+        finally:
+            self._task = None
+
+    def _close(self, subscriber: asyncio.Queue):
+        # None tells the stream to end. Pending batches are dropped with it, so the client's Last-Event-ID on
+        # reconnecting is the last event it actually got.
+        self._subscribers.discard(subscriber)
+        while not subscriber.empty():
+            subscriber.get_nowait()
+        subscriber.put_nowait(None)
+
+
+broadcaster = EventBroadcaster(settings.FLEET_EVENTS_POLL_INTERVAL)
+
+
+def _last_event_id(scope) -> Optional[int]:
+    # Browsers resend the last id they saw in a header; ?after= lets other clients pick a starting point.
+    values = [value.decode() for name, value in scope.get('headers', []) if name == b'last-event-id']
+    values += parse_qs(scope.get('query_string', b'').decode()).get('after', [])
+    for value in values:
+        try:
+            return int(value)
+        except ValueError:
+            continue
+    return None
+
+
+async def fleet_events_app(scope, receive, send):
+    """
+    ``GET /api/v1/fleet/events/``: a ``text/event-stream`` of ``driver``, ``truck`` and ``alert`` events. ``?kinds=truck``
+    keeps one kind.
+    """
+    if scope['method'] != 'GET':
+        await send({'type': 'http.response.start', 'status': 405, 'headers': [(b'allow', b'GET')]})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    kinds = parse_qs(scope.get('query_string', b'').decode()).get('kinds', [])
+    kinds = set(','.join(kinds).split(',')) if kinds else set(FleetEvent.KINDS)
+    last_id = _last_event_id(scope)
+
+    subscriber = broadcaster.subscribe()
+    await broadcaster.start()
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+
+        # Anything between the client's last event and what the broadcaster will send next.
+        if last_id is not None:
+            while last_id < broadcaster.last_id:
+                backlog = await sync_to_async(events_after)(last_id)
+                backlog = [event for event in backlog if event['id'] <= broadcaster.last_id]
+                if not backlog:
+                    break
+                await _send_events(send, backlog, kinds)
+                last_id = backlog[-1]['id']
+        last_id = last_id if last_id is not None else broadcaster.last_id
+
+        while not disconnected.done():
+            next_batch = asyncio.ensure_future(subscriber.get())
+            await asyncio.wait([next_batch, disconnected], timeout=settings.FLEET_EVENTS_HEARTBEAT,
+                               return_when=asyncio.FIRST_COMPLETED)
+            if not next_batch.done():
+                next_batch.cancel()
+                if not disconnected.done():
+                    await send({'type': 'http.response.body', 'body': b': keep-alive\n\n', 'more_body': True})
+                continue
+
+            events = next_batch.result()
+            if events is None:
+                break
+            events = [event for event in events if event['id'] > last_id]
+            if events:
+                await _send_events(send, events, kinds)
+                last_id = events[-1]['id']
+
+        if not disconnected.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        broadcaster.unsubscribe(subscriber)
+        disconnected.cancel()
+
+
+async def _send_events(send, events: list[dict], kinds: set[str]):
+    body = b''.join(format_event(event) for event in events if event['kind'] in kinds)
+    if body:
+        await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
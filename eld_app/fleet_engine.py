@@ -0,0 +1,191 @@
+"""
+Fleet engine holds the columnar, NumPy-backed HOS violation check used for whole-roster evaluation.
+
+It answers the same questions as ``detect_violation``/``remaining_hos_minutes`` in ``utils``, but for
+every driver at once: the roster's minute counters and limits are loaded into arrays and compared in
+a single vectorized pass.
+"""
+from typing import Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+from eld_app.models import DriverHosInformation
+from eld_app.responses import TruckHOSViolations
+from eld_app.utils import MAX_SHIFT_DRIVE_MINUTES, MAX_SHIFT_WORK_MINUTES, MAX_CYCLE_WORK_MINUTES, \
+    decode_drivers_or_none
+
+# Column order of the (n, 3) arrays below.
+DRIVE, SHIFT, CYCLE = 0, 1, 2
+LIMIT_NAMES = ('drive', 'shift', 'cycle')
+
+_USED_FIELDS = (
+    ('shift_drive_minutes', 'shiftDriveMinutes'),
+    ('shift_work_minutes', 'shiftWorkMinutes'),
+    ('cycle_work_minutes', 'cycleWorkMinutes'),
+)
+_LIMIT_FIELDS = (
+    ('max_shift_drive_minutes', 'maxShiftDriveMinutes', MAX_SHIFT_DRIVE_MINUTES),
+    ('max_shift_work_minutes', 'maxShiftWorkMinutes', MAX_SHIFT_WORK_MINUTES),
+    ('max_cycle_work_minutes', 'maxCycleWorkMinutes', MAX_CYCLE_WORK_MINUTES),
+)
+_INFO_FIELDS = (
+    ('driver_id', 'driverId'),
+    ('truck_name', 'truckName'),
+    ('duty_status', 'dutyStatus'),
+)
+
+
+class FleetHosArrays:
+    """
+    A roster in columnar form.
+
+    ``used`` holds the shift drive, shift work and cycle work minutes (NaN where ProLogs sent nothing)
+    and ``limits`` the matching maxima, already defaulted to the federal limits.
+    """
+
+    def __init__(self, driver_ids: list, truck_names: list, duty_statuses: list, used: np.ndarray,
+                 limits: np.ndarray):
+        self.driver_ids = driver_ids
+        self.truck_names = truck_names
+        self.duty_statuses = duty_statuses
+        self.used = used
+        self.limits = limits
+
+    def __len__(self):
+        return len(self.driver_ids)
+
+    @classmethod
+    def from_drivers(cls, drivers: Iterable[Union[DriverHosInformation, dict]]) -> 'FleetHosArrays':
+        """
+        Builds the arrays from ``DriverHosInformation`` objects or raw ``/drivers/`` dicts (by alias). Dicts
+        with a value that is not a number are reported and left out.
+        """
+        drivers = drivers if isinstance(drivers, list) else list(drivers)
+        if drivers and isinstance(drivers[0], DriverHosInformation):
+            def column(attribute, alias):
+                return [getattr(driver, attribute) for driver in drivers]
+        else:
+            def column(attribute, alias):
+                return [driver.get(alias) for driver in drivers]
+
+        try:
+            return cls.from_columns(
+                *(column(attribute, alias) for attribute, alias in _INFO_FIELDS),
+                used=[column(attribute, alias) for attribute, alias in _USED_FIELDS],
+                limits=[column(attribute, alias) for attribute, alias, _ in _LIMIT_FIELDS],
+            )
+        except (TypeError, ValueError):
+            if drivers and isinstance(drivers[0], DriverHosInformation):
+                raise
+        # Some row is malformed: decode them one by one, as the per-driver path would, and keep the valid ones.
+        return cls.from_drivers([driver for driver in decode_drivers_or_none(drivers) if driver is not None])
+
+    @classmethod
+    def from_columns(cls, driver_ids: list, truck_names: list, duty_statuses: list, used: list,
+                     limits: list) -> 'FleetHosArrays':
+        """
+        Builds the arrays from per-field columns; ``used`` and ``limits`` hold three columns each, with None
+        for missing values.
+        """
+        n = len(driver_ids)
+        used_array = np.empty((n, 3), dtype=np.float64)
+        limit_array = np.empty((n, 3), dtype=np.int64)
+
+        for index, values in enumerate(used):
+            used_array[:, index] = np.array(values, dtype=np.float64)
+
+        for index, (values, (_, _, default)) in enumerate(zip(limits, _LIMIT_FIELDS)):
+            values = np.array(values, dtype=np.float64)
+            limit_array[:, index] = np.where(np.isnan(values), default, values)
+
+        return cls(driver_ids, truck_names, duty_statuses, used_array, limit_array)
+
+
+class FleetEvaluation:
+    """
+    The result of ``evaluate_fleet``: per-driver violation flags and remaining minutes, one row per driver.
+    """
+
+    def __init__(self, arrays: FleetHosArrays, violated: np.ndarray, remaining: np.ndarray):
+        self.arrays = arrays
+        self.violated = violated
+        self.remaining = remaining
+        self.violation_counts = violated.sum(axis=1)
+        self.closest_limit = remaining.min(axis=1)
+
+    def select(self, only_violators: bool = False, within_minutes: Optional[float] = None) -> np.ndarray:
+        mask = np.ones(len(self.arrays), dtype=bool)
+        if only_violators:
+            mask &= self.violation_counts > 0
+        if within_minutes is not None:
+            mask &= self.closest_limit <= within_minutes
+        return np.flatnonzero(mask)
+
+    def violations_data(self, index: int) -> list[dict[str, str]]:
+        # Same entries, wording and number formatting as utils.detect_violation.
+        used, limits, violated = self.arrays.used[index], self.arrays.limits[index], self.violated[index]
+        violations = []
+
+        if violated[DRIVE]:
+            violations.append({
+                'violation': '11-Hour Driving Limit',
+                'details': f'Drove {float(used[DRIVE])} minutes, exceeding the {int(limits[DRIVE])} minutes limit.'
+            })
+
+        if violated[SHIFT]:
+            violations.append({
+                'violation': '14-Hour Limit',
+                'details': f'Worked {float(used[SHIFT])} minutes, exceeding the {int(limits[SHIFT])} minutes limit.'
+            })
+
+        if violated[CYCLE]:
+            violations.append({
+                'violation': '70-Hour Limit',
+                'details': f'Worked {float(used[CYCLE])} minutes in the cycle, exceeding the {int(limits[CYCLE])} minutes limit.'
+            })
+
+        return violations
+
+    def violations_for(self, index: int) -> TruckHOSViolations:
+        violations = self.violations_data(index)
+        return TruckHOSViolations(
+            truck_id=self.arrays.driver_ids[index],
+            violations=len(violations),
+            violations_data=violations
+        )
+
+    def to_violations(self) -> list[TruckHOSViolations]:
+        return [self.violations_for(index) for index in range(len(self.arrays))]
+
+    def remaining_for(self, index: int) -> dict[str, float]:
+        return dict(zip(LIMIT_NAMES, self.remaining[index].tolist()))
+
+
+def evaluate_fleet(arrays: FleetHosArrays) -> FleetEvaluation:
+    # NaN compares False, which matches the scalar path treating a missing counter as zero minutes.
+    violated = arrays.used > arrays.limits
+    remaining = arrays.limits - np.nan_to_num(arrays.used, nan=0.0)
+    return FleetEvaluation(arrays, violated, remaining)
+
+
+def scan_fleet_violations(drivers: Iterable[dict], only_violators: bool = False,
+                          within_minutes: Optional[float] = None) -> Iterator[dict]:
+    """
+    Evaluates a roster in one vectorized pass and yields a result per selected driver, lazily.
+
+    ``only_violators`` keeps drivers with at least one violation; ``within_minutes`` keeps drivers whose
+    closest limit is at most that many minutes away (violators included). Both filters must pass.
+    """
+    evaluation = evaluate_fleet(FleetHosArrays.from_drivers(drivers))
+    arrays = evaluation.arrays
+
+    for index in evaluation.select(only_violators, within_minutes).tolist():
+        violations = evaluation.violations_data(index)
+        yield {
+            "driver_id": arrays.driver_ids[index],
+            "truck_name": arrays.truck_names[index],
+            "duty_status": arrays.duty_statuses[index],
+            "violations": len(violations),
+            "violations_data": violations,
+            "remaining_minutes": evaluation.remaining_for(index),
+        }
@@ -0,0 +1,233 @@
+"""
+Geo holds the in-process spatial index over the latest truck locations, for radius and nearest-truck queries.
+
+Positions are mapped onto the unit sphere and kept in a k-d tree, so a query visits O(log n) nodes instead
+of measuring the distance to every truck. Straight-line (chord) distance between points on the sphere
+grows with great-circle distance, which makes the tree's Euclidean pruning exact for distances on Earth.
+"""
+import heapq
+import math
+import threading
+from typing import Optional
+
+import numpy as np
+
+from eld_app.signals import snapshot_refreshed
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def unit_vectors(lat, lng) -> np.ndarray:
+    """
+    Points on the unit sphere, shape (n, 3), for latitudes and longitudes in degrees.
+    """
+    lat, lng = np.radians(np.asarray(lat, dtype=float)), np.radians(np.asarray(lng, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)], axis=-1)
+
+
+def chord_to_km(chord_squared):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(chord_squared) / 2))
+
+
+def km_to_chord(km: float) -> float:
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+class KDTree:
+    """
+    A static k-d tree over 3-D points.
+
+    The tree is implicit: points are reordered so that every node is a contiguous range split at its median
+    along the axis of largest spread, ``[lo, mid)`` on one side and ``[mid, hi)`` on the other. Ranges of
+    ``leaf_size`` points or fewer are leaves and are scanned with one vectorized distance computation.
+    """
+
+    def __init__(self, points: np.ndarray, leaf_size: int = 32):
+        self.leaf_size = max(1, leaf_size)
+        self.points = np.array(points, dtype=float).reshape(-1, 3)
+        self.order = np.arange(len(self.points))
+
+        # Split axis and value of the internal node whose median is at each position; medians are unique.
+        split_axes = np.zeros(len(self.points), dtype=np.int64)
+        split_values = np.zeros(len(self.points))
+        stack = [(0, len(self.points))]
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo <= self.leaf_size:
+                continue
+            block = self.points[lo:hi]
+            axis = int(np.argmax(block.max(axis=0) - block.min(axis=0)))
+            mid = (lo + hi) // 2
+            partition = np.argpartition(block[:, axis], mid - lo)
+            self.points[lo:hi] = block[partition]
+            self.order[lo:hi] = self.order[lo:hi][partition]
+            split_axes[mid], split_values[mid] = axis, self.points[mid, axis]
+            stack.append((lo, mid))
+            stack.append((mid, hi))
+
+        # Plain lists: the query loops read one node at a time, where NumPy scalar access is slow.
+        self._split_axes = split_axes.tolist()
+        self._split_values = split_values.tolist()
+
+    def __len__(self):
+        return len(self.points)
+
+    def query_radius(self, point, radius: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Indexes (into the original points) and squared distances of every point within ``radius``, unsorted.
+        """
+        point = [float(value) for value in point]
+        radius_squared = radius * radius
+        indexes, distances = [], []
+        stack = [(0, len(self.points))] if len(self.points) else []
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo <= self.leaf_size:
+                squared = ((self.points[lo:hi] - point) ** 2).sum(axis=1)
+                hits = np.flatnonzero(squared <= radius_squared)
+                if len(hits):
+                    indexes.append(self.order[lo + hits])
+                    distances.append(squared[hits])
+                continue
+
+            mid = (lo + hi) // 2
+            offset = point[self._split_axes[mid]] - self._split_values[mid]
+            if offset <= radius:
+                stack.append((lo, mid))
+            if offset >= -radius:
+                stack.append((mid, hi))
+
+        if not indexes:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        return np.concatenate(indexes), np.concatenate(distances)
+
+    def query_nearest(self, point, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Indexes and squared distances of the ``k`` nearest points, nearest first.
+        """
+        point = [float(value) for value in point]
+        # Max-heap of the best candidates so far, as (-squared distance, index).
+        best: list[tuple[float, int]] = []
+        # Each entry carries a lower bound on the squared distance to anything in its range.
+        stack = [(0, len(self.points), 0.0)] if len(self.points) and k > 0 else []
+        while stack:
+            lo, hi, bound = stack.pop()
+            if len(best) == k and bound > -best[0][0]:
+                continue
+
+            if hi - lo <= self.leaf_size:
+                squared = ((self.points[lo:hi] - point) ** 2).sum(axis=1)
+                if len(best) == k:
+                    candidates = np.flatnonzero(squared < -best[0][0])
+                else:
+                    candidates = range(hi - lo)
+                for position in candidates:
+                    entry = (-float(squared[position]), int(self.order[lo + position]))
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+                continue
+
+            mid = (lo + hi) // 2
+            offset = point[self._split_axes[mid]] - self._split_values[mid]
+            near, far = ((mid, hi), (lo, mid)) if offset >= 0 else ((lo, mid), (mid, hi))
+            # The far side is pushed first, so the near side is searched first and tightens the bound.
+            stack.append((*far, max(bound, offset * offset)))
+            stack.append((*near, bound))
+
+        best.sort(reverse=True)
+        return (np.array([index for _, index in best], dtype=np.int64),
+                np.array([-squared for squared, _ in best]))
+
+
+class TruckLocationIndex:
+    """
+    The latest truck snapshot indexed by position.
+
+    ``update`` takes the ``trucks`` snapshot (raw ``/trucks/`` dicts) and builds a new tree, which replaces
+    the old one in a single swap, so queries never wait for a rebuild. Trucks without coordinates are left
+    out. Positions change on nearly every refresh, so the tree is rebuilt rather than patched; building is
+    O(n log n) in NumPy.
+    """
+
+    def __init__(self, leaf_size: int = 32):
+        self.leaf_size = leaf_size
+        self._lock = threading.Lock()
+        self._source = None
+        self._trucks: list[dict] = []
+        self._tree = KDTree(np.empty((0, 3)), leaf_size)
+        self._counts = {'updates': 0, 'skipped': 0, 'queries': 0}
+
+    def __len__(self):
+        return len(self._trucks)
+
+    def update(self, trucks: list[dict]):
+        if trucks is self._source:
+            return
+
+        located = [truck for truck in trucks if _has_position(truck)]
+        points = unit_vectors([truck['lat'] for truck in located], [truck['lng'] for truck in located])
+        tree = KDTree(points.reshape(-1, 3), self.leaf_size)
+
+        with self._lock:
+            self._source, self._trucks, self._tree = trucks, located, tree
+            self._counts['updates'] += 1
+            self._counts['skipped'] += len(trucks) - len(located)
+
+    def _snapshot(self) -> tuple[list[dict], KDTree]:
+        with self._lock:
+            self._counts['queries'] += 1
+            return self._trucks, self._tree
+
+    def within(self, lat: float, lng: float, radius_km: float,
+               limit: Optional[int] = None) -> list[tuple[dict, float]]:
+        """
+        Returns ``(truck, distance in km)`` for trucks within ``radius_km`` of the point, nearest first.
+        """
+        trucks, tree = self._snapshot()
+        indexes, squared = tree.query_radius(unit_vectors(lat, lng), km_to_chord(radius_km))
+        order = np.argsort(squared, kind='stable')[:limit]
+        distances = chord_to_km(squared[order])
+        return [(trucks[index], float(distance)) for index, distance in zip(indexes[order].tolist(), distances)]
+
+    def nearest(self, lat: float, lng: float, k: int) -> list[tuple[dict, float]]:
+        """
+        Returns ``(truck, distance in km)`` for the ``k`` trucks nearest the point, nearest first.
+        """
+        trucks, tree = self._snapshot()
+        indexes, squared = tree.query_nearest(unit_vectors(lat, lng), k)
+        return [(trucks[index], float(distance)) for index, distance in zip(indexes.tolist(), chord_to_km(squared))]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counts, 'trucks': len(self._trucks)}
+
+
+def _has_position(truck: dict) -> bool:
+    lat, lng = truck.get('lat'), truck.get('lng')
+    return lat is not None and lng is not None and -90 <= lat <= 90 and -180 <= lng <= 180
+
+
+truck_location_index = TruckLocationIndex()
+
+
+def _update_truck_location_index(sender, name, data, **kwargs):
+    if name == 'trucks':
+        truck_location_index.update(data)
+
+
+snapshot_refreshed.connect(_update_truck_location_index)
+
+
+def trucks_within(trucks: list[dict], lat: float, lng: float, radius_km: float,
+                  limit: Optional[int] = None) -> list[tuple[dict, float]]:
+    # A snapshot another process refreshed never fires the signal here, so catch up with it first.
+    truck_location_index.update(trucks)
+    return truck_location_index.within(lat, lng, radius_km, limit)
+
+
+def nearest_trucks(trucks: list[dict], lat: float, lng: float, k: int) -> list[tuple[dict, float]]:
+    truck_location_index.update(trucks)
+    return truck_location_index.nearest(lat, lng, k)
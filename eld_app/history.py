@@ -0,0 +1,96 @@
+"""
+History holds the local copy of drivers' duty-status logs: incremental ingestion from ProLogs and the
+time-range queries that HOS recomputation runs against it.
+"""
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional
+
+from dateutil import parser
+from django.conf import settings
+from django.db import transaction
+
+from eld_app.models import DriverDutyStatus, DutyStatusRecord, DutyStatusCursor
+from eld_app.prologs import PageStream
+from eld_app.utils import prologs_client
+
+# Opens a driver's log as a stream of DriverDutyStatus items: (driver_id, cursor) -> the stream.
+OpenStream = Callable[[str, Optional[str]], PageStream]
+
+CYCLE_DAYS = 8
+
+
+def stream_duty_status(driver_id: str, last_timestamp: Optional[str]) -> PageStream:
+    return prologs_client.iter_paginated(
+        settings.PROLOGS_DUTY_STATUS_PATH.format(driver_id=driver_id),
+        cursor=last_timestamp,
+        cursor_param=settings.PROLOGS_DUTY_STATUS_CURSOR_PARAM,
+        decode=lambda item: DriverDutyStatus(**item),
+    )
+
+
+def ingest_duty_status(driver_id: str, open_stream: OpenStream = stream_duty_status,
+                       max_pages: Optional[int] = None) -> int:
+    """
+    Pulls a driver's duty-status log from where the last run stopped and stores it.
+
+    Entries are inserted in batches as they stream in. Each batch is committed together with the cursor of
+    the last page it completes, so an interrupted run resumes at the first page it did not fully store.
+    Entries already stored are skipped. Returns the number of entries received.
+    """
+    cursor, _ = DutyStatusCursor.objects.get_or_create(driver_id=driver_id)
+    stream = open_stream(driver_id, cursor.last_timestamp)
+    records = []
+    received = 0
+
+    def flush():
+        with transaction.atomic():
+            DutyStatusRecord.objects.bulk_create(records, ignore_conflicts=True)
+            cursor.last_timestamp = stream.cursor
+            cursor.save()
+        records.clear()
+
+    try:
+        for entry in stream:
+            if max_pages is not None and stream.pages >= max_pages:
+                break
+            records.append(DutyStatusRecord(driver_id=driver_id, start_time=parser.isoparse(entry.startTime),
+                                            duty_status=entry.dutyStatus, location=entry.location))
+            received += 1
+            if len(records) >= settings.DUTY_STATUS_BATCH_SIZE:
+                flush()
+    finally:
+        # Keep what arrived before a failure; the cursor only covers pages that were read completely.
+        flush()
+
+    return received
+
+
+def ingest_fleet_duty_status(driver_ids: Iterable[str], open_stream: OpenStream = stream_duty_status) -> dict:
+    """
+    Ingests every driver's log, returning the entries received per driver. A driver whose pull fails is
+    reported and skipped; its cursor stays at the last stored page.
+    """
+    results = {}
+    for driver_id in driver_ids:
+        try:
+            results[driver_id] = ingest_duty_status(driver_id, open_stream)
+        except Exception as e:
+            print(f"Error ingesting duty status for driver {driver_id}: {e}")
+            results[driver_id] = None
+    return results
+
+
+def duty_status_history(driver_id: str, start: datetime, end: datetime) -> list[DutyStatusRecord]:
+    """
+    Returns the driver's entries in effect between ``start`` and ``end``, oldest first: every entry
+    starting in that window, preceded by the one already in effect at ``start``.
+    """
+    entries = DutyStatusRecord.objects.filter(driver_id=driver_id)
+    in_effect = entries.filter(start_time__lte=start).order_by('-start_time').first()
+    window = list(entries.filter(start_time__gt=start, start_time__lt=end).order_by('start_time'))
+    return [in_effect, *window] if in_effect is not None else window
+
+
+def cycle_history(driver_id: str, at: datetime, days: int = CYCLE_DAYS) -> list[DutyStatusRecord]:
+    # The entries the 70-hour/8-day cycle ending at ``at`` is computed from.
+    return duty_status_history(driver_id, at - timedelta(days=days), at)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from eld_app.history import ingest_fleet_duty_status
+from eld_app.utils import get_drivers_index
+
+
+class Command(BaseCommand):
+    help = "Pulls new duty-status log entries from ProLogs into the local database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('driver_ids', nargs='*', help="Drivers to ingest (default: the whole roster)")
+
+    def handle(self, *args, **options):
+        driver_ids = options['driver_ids'] or sorted(get_drivers_index())
+        results = ingest_fleet_duty_status(driver_ids)
+
+        failed = [driver_id for driver_id, received in results.items() if received is None]
+        received = sum(received for received in results.values() if received is not None)
+        self.stdout.write(f"Ingested {received} entries for {len(results) - len(failed)} drivers")
+        if failed:
+            self.stderr.write(f"Failed: {', '.join(failed)}")
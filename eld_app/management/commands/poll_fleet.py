@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from eld_app.poller import FleetPoller
+from eld_app.tracks import track_store
+
+
+class Command(BaseCommand):
+    help = ("Polls ProLogs for the roster and truck list, publishing what changed between polls as fleet events "
+            "and recording truck breadcrumbs.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=settings.FLEET_POLL_INTERVAL,
+                            help="Seconds between polls (default FLEET_POLL_INTERVAL)")
+        parser.add_argument('--iterations', type=int, default=None, help="Stop after this many polls")
+
+    def handle(self, *args, **options):
+        def report(published):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Published {published} events")
+
+        poller = FleetPoller(tracks=track_store)
+        try:
+            poller.run(options['interval'], options['iterations'], on_poll=report)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            track_store.flush()
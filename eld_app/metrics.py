@@ -0,0 +1,255 @@
+"""
+Metrics holds the hot-path instrumentation: latency histograms and counters for the stages of a request
+(the access token, upstream downloads, decoding, violation checks, planning and rendering), the middleware
+timing whole requests, and the ``/metrics`` view exposing all of it in the Prometheus text format.
+
+Stages are marked with ``timed(name)`` on a function or ``with stage(name):`` around a block. With
+``METRICS_ENABLED`` off both cost one attribute check, and the middleware removes itself.
+
+Every process keeps its own figures, so with several workers each one is scraped (or summed) separately.
+"""
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseNotAllowed
+from django.utils.decorators import sync_and_async_middleware
+
+# Upper bounds of the latency buckets, in seconds.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Name: (type, label names, help).
+FAMILIES = {
+    'eld_stage_seconds': ('histogram', ('stage',), 'Time spent in each hot-path stage.'),
+    'eld_stage_errors_total': ('counter', ('stage',), 'Stages that ended with an exception.'),
+    'eld_request_seconds': ('histogram', ('route',), 'Time to produce a response, by URL name.'),
+    'eld_requests_total': ('counter', ('route', 'method', 'status'), 'Responses, by URL name, method and status.'),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Stage durations of the current request, by stage, while it is collecting a Server-Timing header.
+_timings: ContextVar[Optional[dict]] = ContextVar('eld_stage_timings', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self) -> tuple[list[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.sum = 0.0
+
+
+class MetricsRegistry:
+    """
+    Histograms and counters for the ``FAMILIES``, one per combination of label values, created on first use.
+    Histograms are kept for good once created, so callers may hold on to them.
+    """
+
+    def __init__(self, enabled: bool = True, buckets: tuple[float, ...] = BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(sorted(buckets))
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, family: str, labels: tuple) -> Histogram:
+        histogram = self._histograms.get((family, labels))
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault((family, labels), Histogram(self.buckets))
+        return histogram
+
+    def observe(self, family: str, labels: tuple, seconds: float):
+        self.histogram(family, labels).observe(seconds)
+
+    def increment(self, family: str, labels: tuple, amount: int = 1):
+        key = (family, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def value(self, family: str, labels: tuple):
+        """
+        A counter's value, or a histogram's ``(count, sum)``; ``None`` if nothing was recorded.
+        """
+        if FAMILIES[family][0] == 'counter':
+            return self._counters.get((family, labels))
+        histogram = self._histograms.get((family, labels))
+        if histogram is None:
+            return None
+        counts, total = histogram.snapshot()
+        return (sum(counts), total) if any(counts) else None
+
+    def clear(self):
+        with self._lock:
+            for histogram in self._histograms.values():
+                histogram.reset()
+            self._counters.clear()
+
+    def render(self) -> str:
+        """
+        Everything recorded, in the Prometheus text exposition format.
+        """
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        lines = []
+        for family, (kind, names, help_text) in FAMILIES.items():
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+            if kind == 'counter':
+                for (name, labels), count in counters:
+                    if name == family:
+                        lines.append(f'{family}{{{_labels(names, labels)}}} {count}')
+                continue
+
+            for (name, labels), histogram in histograms:
+                if name != family:
+                    continue
+                counts, total = histogram.snapshot()
+                label_text = _labels(names, labels)
+                cumulative = 0
+                for bound, count in zip((*histogram.buckets, '+Inf'), counts):
+                    cumulative += count
+                    lines.append(f'{family}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f'{family}_sum{{{label_text}}} {total!r}')
+                lines.append(f'{family}_count{{{label_text}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    def escape(value) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+registry = MetricsRegistry(enabled=settings.METRICS_ENABLED, buckets=settings.METRICS_BUCKETS)
+
+
+class _Stage:
+    __slots__ = ('name', 'histogram', 'started')
+
+    def __init__(self, name: str, histogram: Histogram):
+        self.name = name
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        elapsed = time.perf_counter() - self.started
+        self.histogram.observe(elapsed)
+        if exc_type is not None:
+            registry.increment('eld_stage_errors_total', (self.name,))
+        timings = _timings.get()
+        if timings is not None:
+            timings[self.name] = timings.get(self.name, 0.0) + elapsed
+        return False
+
+
+_disabled = nullcontext()
+
+
+def stage(name: str):
+    """
+    Context manager timing the block it wraps as stage ``name``.
+    """
+    return _Stage(name, registry.histogram('eld_stage_seconds', (name,))) if registry.enabled else _disabled
+
+
+def timed(name: str):
+    """
+    Decorator timing every call of a function (or coroutine function) as stage ``name``.
+    """
+    histogram = registry.histogram('eld_stage_seconds', (name,))
+
+    def decorator(function):
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                if not registry.enabled:
+                    return await function(*args, **kwargs)
+                with _Stage(name, histogram):
+                    return await function(*args, **kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not registry.enabled:
+                    return function(*args, **kwargs)
+                with _Stage(name, histogram):
+                    return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing(timings: dict, total: float) -> str:
+    entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.items()]
+    entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Times every request by URL name and counts responses. With ``METRICS_SERVER_TIMING`` on, also adds a
+    ``Server-Timing`` header listing the stages the request went through. Streamed responses are timed up
+    to their first byte.
+    """
+    if not registry.enabled:
+        raise MiddlewareNotUsed
+    with_header = settings.METRICS_SERVER_TIMING
+
+    def begin():
+        return time.perf_counter(), _timings.set({}) if with_header else None
+
+    def finish(request, response, started, token):
+        elapsed = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        route = (match.url_name or match.view_name) if match is not None else 'unmatched'
+        registry.observe('eld_request_seconds', (route,), elapsed)
+        registry.increment('eld_requests_total', (route, request.method, response.status_code))
+        if token is not None:
+            response['Server-Timing'] = server_timing(_timings.get(), elapsed)
+            _timings.reset(token)
+        return response
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            started, token = begin()
+            return finish(request, await get_response(request), started, token)
+    else:
+        def middleware(request):
+            started, token = begin()
+            return finish(request, get_response(request), started, token)
+    return middleware
+
+
+def metrics_view(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.23 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DutyStatusCursor',
+            fields=[
+                ('driver_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('last_timestamp', models.CharField(blank=True, max_length=64, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DutyStatusRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('driver_id', models.CharField(max_length=64)),
+                ('start_time', models.DateTimeField()),
+                ('duty_status', models.CharField(blank=True, max_length=16, null=True)),
+                ('location', models.CharField(blank=True, max_length=255, null=True)),
+            ],
+            options={
+                'ordering': ['driver_id', 'start_time'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dutystatusrecord',
+            constraint=models.UniqueConstraint(fields=('driver_id', 'start_time'), name='duty_status_driver_start'),
+        ),
+    ]
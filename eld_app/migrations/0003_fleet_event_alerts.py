@@ -0,0 +1,23 @@
+# Generated by Django 3.2.23 on 2026-10-18 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eld_app', '0002_fleet_event'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fleetevent',
+            name='action',
+            field=models.CharField(choices=[('added', 'added'), ('changed', 'changed'), ('removed', 'removed'), ('warning', 'warning'), ('limit', 'limit')], max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='fleetevent',
+            name='kind',
+            field=models.CharField(choices=[('driver', 'driver'), ('truck', 'truck'), ('alert', 'alert')], max_length=16),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.23 on 2026-10-18 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eld_app', '0003_fleet_event_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriverSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('driver_id', models.CharField(max_length=64, unique=True)),
+                ('truck_name', models.CharField(blank=True, db_index=True, max_length=128, null=True)),
+                ('duty_status', models.CharField(blank=True, max_length=16, null=True)),
+                ('shift_drive_minutes', models.FloatField(blank=True, null=True)),
+                ('shift_work_minutes', models.FloatField(blank=True, null=True)),
+                ('cycle_work_minutes', models.FloatField(blank=True, null=True)),
+                ('data', models.JSONField()),
+                ('position', models.PositiveIntegerField()),
+                ('fetched_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TruckSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True)),
+                ('lat', models.FloatField(blank=True, null=True)),
+                ('lng', models.FloatField(blank=True, null=True)),
+                ('time_stamp', models.CharField(blank=True, db_index=True, max_length=64, null=True)),
+                ('data', models.JSONField()),
+                ('position', models.PositiveIntegerField()),
+                ('fetched_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+    ]
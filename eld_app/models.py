@@ -1,13 +1,15 @@
 from django.db import models
 
 # Create your models here.
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 
 from pydantic.fields import Field
 
 
 class DriverHosInformation(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
     driver_id: Optional[str] = Field(None, alias='driverId')
     truck_name: Optional[str] = Field(None, alias='truckName')
     duty_status: Optional[str] = Field(None, alias='dutyStatus')
@@ -21,9 +23,6 @@ class DriverHosInformation(BaseModel):
     home_terminal_time_zone_windows: Optional[str] = Field(None, alias='homeTerminalTimeZoneWindows')
     home_terminal_time_zone_iana: Optional[str] = Field(None, alias='homeTerminalTimeZoneIana')
 
-    class Config:
-        allow_population_by_field_name = True
-
 
 class DriverDutyStatus(BaseModel):
     startTime: str
@@ -38,9 +37,102 @@ class DriverDutyStatusDtoListResult(BaseModel):
 
 
 class TruckLocation(BaseModel):
-    name: Optional[str]
+    name: Optional[str] = Field(default=None)
     location: Optional[str] = Field(default=None)
-    lat: Optional[float]
-    lng: Optional[float]
+    lat: Optional[float] = Field(default=None)
+    lng: Optional[float] = Field(default=None)
     speed: Optional[int] = Field(default=None)
-    timeStamp: Optional[str]
+    timeStamp: Optional[str] = Field(default=None)
+
+
+class DutyStatusRecord(models.Model):
+    """
+    One entry of a driver's duty-status log, as ingested from ProLogs.
+    """
+    driver_id = models.CharField(max_length=64)
+    start_time = models.DateTimeField()
+    duty_status = models.CharField(max_length=16, null=True, blank=True)
+    location = models.CharField(max_length=255, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['driver_id', 'start_time'], name='duty_status_driver_start'),
+        ]
+        ordering = ['driver_id', 'start_time']
+
+    def __str__(self):
+        return f"{self.driver_id} {self.duty_status} @ {self.start_time.isoformat()}"
+
+
+class DutyStatusCursor(models.Model):
+    """
+    Where ingestion of a driver's duty-status log stopped: the last ``lastTimestamp`` ProLogs returned.
+    """
+    driver_id = models.CharField(max_length=64, primary_key=True)
+    last_timestamp = models.CharField(max_length=64, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class FleetEvent(models.Model):
+    """
+    One change the fleet poller saw between two snapshots (a driver or truck added, changed or removed), or a
+    predicted violation alert falling due (a warning ahead of a limit, or the limit being reached).
+
+    The table is the hand-off between the poller process and the servers pushing changes to clients, which
+    read events newer than the last id they sent.
+    """
+    KINDS = ('driver', 'truck', 'alert')
+    ACTIONS = ('added', 'changed', 'removed', 'warning', 'limit')
+
+    kind = models.CharField(max_length=16, choices=[(kind, kind) for kind in KINDS])
+    key = models.CharField(max_length=128)
+    action = models.CharField(max_length=16, choices=[(action, action) for action in ACTIONS])
+    data = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.id} {self.kind} {self.key} {self.action}"
+
+
+class DriverSnapshot(models.Model):
+    """
+    One driver of the last stored ``/drivers/`` roster. ``data`` is the upstream item as received; the columns
+    beside it copy the fields worth querying on.
+    """
+    driver_id = models.CharField(max_length=64, unique=True)
+    truck_name = models.CharField(max_length=128, null=True, blank=True, db_index=True)
+    duty_status = models.CharField(max_length=16, null=True, blank=True)
+    shift_drive_minutes = models.FloatField(null=True, blank=True)
+    shift_work_minutes = models.FloatField(null=True, blank=True)
+    cycle_work_minutes = models.FloatField(null=True, blank=True)
+    data = models.JSONField()
+    position = models.PositiveIntegerField()
+    fetched_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['position']
+
+    def __str__(self):
+        return f"{self.driver_id} {self.duty_status} @ {self.fetched_at.isoformat()}"
+
+
+class TruckSnapshot(models.Model):
+    """
+    One truck of the last stored ``/trucks/`` list, with its position copied out of ``data``.
+    """
+    name = models.CharField(max_length=128, unique=True)
+    lat = models.FloatField(null=True, blank=True)
+    lng = models.FloatField(null=True, blank=True)
+    time_stamp = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    data = models.JSONField()
+    position = models.PositiveIntegerField()
+    fetched_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['position']
+
+    def __str__(self):
+        return f"{self.name} ({self.lat}, {self.lng}) @ {self.fetched_at.isoformat()}"
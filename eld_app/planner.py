@@ -0,0 +1,239 @@
+"""
+Planner holds the event-driven engine behind plan_driving_schedule.
+
+Time is tracked as integer microseconds from pickup, so segment boundaries are exact integer sums and
+no datetime is created until the schedule is formatted for the response. Segments come out in
+chronological order and are stored directly in a DrivingTimeline, which renders them to JSON.
+"""
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional
+
+from eld_app.models import DriverHosInformation
+from eld_app.responses import DrivingTimeline, SegmentType
+
+MAX_SHIFT_WORK_MINUTES = 840  # 14 hours
+MAX_SHIFT_DRIVE_MINUTES = 660  # 11 hours
+MAX_CYCLE_WORK_MINUTES = 4200  # 70 hours in 8 days
+
+DRIVING = SegmentType.DRIVING
+BREAK_30_MINUTES = SegmentType.BREAK_30_MINUTES
+BREAK_2_HOURS = SegmentType.BREAK_2_HOURS
+BREAK_7_HOURS = SegmentType.BREAK_7_HOURS
+RESET_34_HOURS = SegmentType.RESET_34_HOURS
+
+MINUTE = 60_000_000  # microseconds
+
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+# A planned segment: (SegmentType, start and end in microseconds from pickup, duration in minutes).
+PlannedSegment = tuple[SegmentType, int, int, float]
+
+
+def _minutes_to_us(minutes) -> int:
+    if isinstance(minutes, int) or float(minutes).is_integer():
+        return int(minutes) * MINUTE
+    # Round exactly like timedelta does, so fractional counters land on the same microsecond.
+    return timedelta(minutes=minutes) // _ONE_MICROSECOND
+
+
+def _us_to_minutes(microseconds: int) -> float:
+    return microseconds / 1_000_000 / 60
+
+
+def iter_segments(shift_drive_minutes: float, cycle_work_minutes: float,
+                  horizon: Optional[int] = None) -> Iterator[PlannedSegment]:
+    """
+    Yields the planned driving and rest segments, in order, starting at offset 0.
+
+    ``horizon`` is the dropoff offset in microseconds. The segment that would run past it is cut short
+    at the horizon (for a rest, or when fewer than 4 hours of driving remain) and planning stops; with
+    no horizon the plan continues indefinitely.
+
+    Each iteration applies the first rule that matches the driver's counters:
+
+    * a cycle at 70 hours takes a 34-hour reset, which clears every counter;
+    * a shift at 11 hours of driving takes a 7-hour break;
+    * after a first 4-hour block, drive half the 11-hour limit and take a 2-hour break;
+    * within 4 hours of the 11-hour limit, drive up to it;
+    * otherwise drive 4 hours and take a 30-minute break.
+    """
+    shift_drive = shift_drive_minutes or 0
+    cycle_work = cycle_work_minutes or 0
+    driving = 0
+    now = 0
+
+    def reaches_horizon(minutes: int) -> bool:
+        return horizon is not None and now + minutes * MINUTE > horizon
+
+    def until_horizon(segment_type: SegmentType) -> PlannedSegment:
+        return segment_type, now, horizon, abs(_us_to_minutes(now - horizon))
+
+    while horizon is None or now < horizon:
+        if cycle_work >= MAX_CYCLE_WORK_MINUTES:
+            if reaches_horizon(34 * 60):
+                yield until_horizon(RESET_34_HOURS)
+                return
+
+            yield (RESET_34_HOURS, now, now + 34 * 60 * MINUTE, 34 * 60)
+            now += 34 * 60 * MINUTE
+            cycle_work = 0
+            shift_drive = 0
+            driving = 0
+            continue
+
+        if MAX_SHIFT_DRIVE_MINUTES <= shift_drive + driving:
+            if reaches_horizon(7 * 60):
+                yield until_horizon(BREAK_7_HOURS)
+                return
+
+            yield (BREAK_7_HOURS, now, now + 420 * MINUTE, 420)
+            now += 420 * MINUTE
+            shift_drive = 0
+            cycle_work = cycle_work + 420
+            driving = 0
+            continue
+
+        if MAX_SHIFT_DRIVE_MINUTES / 2 >= driving > 0:
+            if reaches_horizon(240):
+                yield until_horizon(DRIVING)
+                return
+
+            # Split the rest of the shift's driving around a 2-hour break.
+            half_shift = MAX_SHIFT_DRIVE_MINUTES / 2
+            drive_end = now + _minutes_to_us(half_shift)
+            yield (DRIVING, now, drive_end, half_shift)
+            yield (BREAK_2_HOURS, drive_end, drive_end + 120 * MINUTE, 120)
+            now = drive_end + 120 * MINUTE
+
+            driving = driving + half_shift
+            shift_drive = shift_drive + driving
+            cycle_work = cycle_work + driving + 120
+            continue
+
+        if reaches_horizon(240):
+            yield until_horizon(DRIVING)
+            return
+
+        if shift_drive + 240 >= MAX_SHIFT_DRIVE_MINUTES:
+            # Drive up to the 11-hour limit.
+            drive_end = now + (MAX_SHIFT_DRIVE_MINUTES * MINUTE - _minutes_to_us(shift_drive))
+            driving = _us_to_minutes(drive_end - now)
+            yield (DRIVING, now, drive_end, driving)
+            now = drive_end
+
+            shift_drive = shift_drive + driving
+            cycle_work = cycle_work + driving
+            continue
+
+        yield (DRIVING, now, now + 240 * MINUTE, 240)
+        yield (BREAK_30_MINUTES, now + 240 * MINUTE, now + 270 * MINUTE, 30)
+        now += 270 * MINUTE
+
+        driving = driving + 240
+        shift_drive = shift_drive + driving
+        cycle_work = cycle_work + driving + 30
+
+
+def plan_timeline(pickup: datetime, dropoff: datetime, driver: DriverHosInformation) -> DrivingTimeline:
+    horizon = (dropoff - pickup) // _ONE_MICROSECOND
+    return DrivingTimeline(pickup, iter_segments(driver.shift_drive_minutes, driver.cycle_work_minutes, horizon))
+
+
+@lru_cache(maxsize=None)
+def _reset_period() -> tuple[int, int]:
+    # A 34-hour reset clears every counter, so the plan repeats from there: one period is the plan from
+    # zero counters through the end of its first reset. Returns its length and driving time (microseconds).
+    driving = 0
+    for segment_type, start, end, _ in iter_segments(0, 0):
+        if segment_type == DRIVING:
+            driving += end - start
+        elif segment_type == RESET_34_HOURS:
+            return end, driving
+
+
+def earliest_arrival_offset(shift_drive_minutes: float, cycle_work_minutes: float, driving_minutes: float) -> int:
+    """
+    Returns how long after pickup (in microseconds) the planner's rules first accumulate ``driving_minutes``
+    of driving. Whole reset-to-reset periods are skipped arithmetically, so long trips cost the same as
+    short ones.
+    """
+    remaining = _minutes_to_us(driving_minutes)
+    if remaining <= 0:
+        return 0
+
+    offset = 0
+    segments = iter_segments(shift_drive_minutes, cycle_work_minutes)
+    for segment_type, start, end, _ in segments:
+        if segment_type == DRIVING:
+            if end - start >= remaining:
+                return offset + start + remaining
+            remaining -= end - start
+        elif segment_type == RESET_34_HOURS:
+            # Leave at least part of a period to walk, so the arrival lands inside a driving segment.
+            period, period_driving = _reset_period()
+            periods = (remaining - 1) // period_driving
+            offset += end + periods * period
+            remaining -= periods * period_driving
+            segments = iter_segments(0, 0)
+            break
+
+    for segment_type, start, end, _ in segments:
+        if segment_type == DRIVING:
+            if end - start >= remaining:
+                return offset + start + remaining
+            remaining -= end - start
+
+
+def earliest_arrival(pickup: datetime, driving_minutes: float,
+                     driver: DriverHosInformation) -> tuple[datetime, DrivingTimeline]:
+    """
+    Returns the earliest time the driver can finish ``driving_minutes`` of driving after ``pickup`` under
+    the planner's break and reset rules, with the schedule that gets there: the open-ended plan, with its
+    last driving segment cut short at the arrival.
+    """
+    arrival = earliest_arrival_offset(driver.shift_drive_minutes, driver.cycle_work_minutes, driving_minutes)
+    timeline = DrivingTimeline(pickup)
+
+    segments = iter_segments(driver.shift_drive_minutes, driver.cycle_work_minutes)
+    while arrival:
+        segment_type, start, end, duration = next(segments)
+        if end >= arrival:
+            if end > arrival:
+                end, duration = arrival, _us_to_minutes(arrival - start)
+            timeline.append(segment_type, start, end, duration)
+            break
+        timeline.append(segment_type, start, end, duration)
+
+    return pickup + timedelta(microseconds=arrival), timeline
+
+
+def rank_by_earliest_arrival(drivers: Iterable[DriverHosInformation], pickup: datetime,
+                             driving_minutes: float) -> list[tuple[DriverHosInformation, datetime]]:
+    """
+    Returns ``(driver, arrival)`` for every driver, soonest arrival first (ties keep their input order).
+    """
+    offsets = [
+        (earliest_arrival_offset(driver.shift_drive_minutes, driver.cycle_work_minutes, driving_minutes), driver)
+        for driver in drivers
+    ]
+    offsets.sort(key=lambda item: item[0])
+    return [(driver, pickup + timedelta(microseconds=offset)) for offset, driver in offsets]
+
+
+# A batch planning job: shift drive minutes, cycle work minutes, pickup and dropoff.
+PlanJob = tuple[Optional[float], Optional[float], datetime, datetime]
+
+
+def plan_job(job: PlanJob) -> tuple[Optional[DrivingTimeline], Optional[str]]:
+    """
+    Plans one batch job, returning ``(timeline, None)`` or ``(None, error)`` so one bad job cannot fail
+    the others. Runs in the batch worker processes.
+    """
+    shift_drive_minutes, cycle_work_minutes, pickup, dropoff = job
+    try:
+        horizon = (dropoff - pickup) // _ONE_MICROSECOND
+        return DrivingTimeline(pickup, iter_segments(shift_drive_minutes, cycle_work_minutes, horizon)), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
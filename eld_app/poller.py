@@ -0,0 +1,165 @@
+"""
+Poller holds the background fleet poller: it fetches ``/drivers/`` and ``/trucks/`` on an interval, diffs each
+snapshot against the previous one and publishes only what changed as ``FleetEvent`` rows.
+
+Violations are checked for changed drivers only. Every poll also refreshes the fleet snapshot cache, so
+views served from a shared cache backend stop fetching upstream on their own. Between polls the poller sleeps
+until the next poll or the next predicted violation alarm, and publishes alarms as ``alert`` events when due.
+Given a track store, it also records every new truck position there.
+"""
+import time
+from datetime import timedelta
+from typing import Callable, Iterable, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from eld_app.alarms import Alarm, ViolationAlarmScheduler
+from eld_app.models import FleetEvent
+from eld_app.tracks import TrackStore
+from eld_app.utils import decode_drivers_or_none, detect_violation, drivers_snapshot, get_drivers_index, \
+    get_truck_eld_data, trucks_snapshot
+
+
+def index_trucks(trucks: Iterable[dict]) -> dict[str, dict]:
+    return {truck['name']: truck for truck in trucks if truck.get('name') is not None}
+
+
+def diff_snapshots(previous: dict[str, dict], current: dict[str, dict]) -> tuple[list[str], list[str], list[str]]:
+    """
+    Keys added, changed and removed between two snapshots keyed by driver id or truck name.
+    """
+    added, changed = [], []
+    for key, item in current.items():
+        before = previous.get(key)
+        if before is None:
+            added.append(key)
+        elif before != item:
+            changed.append(key)
+    removed = [key for key in previous if key not in current]
+    return added, changed, removed
+
+
+def driver_events(previous: dict[str, dict], current: dict[str, dict]) -> list[FleetEvent]:
+    added, changed, removed = diff_snapshots(previous, current)
+    updated = added + changed
+    decoded = decode_drivers_or_none([current[key] for key in updated])
+
+    events = [
+        FleetEvent(kind='driver', key=key, action='added' if index < len(added) else 'changed',
+                   data={"driver": current[key], "violations": detect_violation(driver).violations_data})
+        for index, (key, driver) in enumerate(zip(updated, decoded)) if driver is not None
+    ]
+    events += [FleetEvent(kind='driver', key=key, action='removed') for key in removed]
+    return events
+
+
+def alert_events(alarms: Iterable[Alarm]) -> list[FleetEvent]:
+    return [FleetEvent(kind='alert', key=alarm.driver_id, action='warning' if alarm.lead else 'limit',
+                       data=alarm.to_dict()) for alarm in alarms]
+
+
+def truck_events(previous: dict[str, dict], current: dict[str, dict]) -> list[FleetEvent]:
+    added, changed, removed = diff_snapshots(previous, current)
+    events = [FleetEvent(kind='truck', key=key, action='added', data={"truck": current[key]}) for key in added]
+    events += [FleetEvent(kind='truck', key=key, action='changed', data={"truck": current[key]}) for key in changed]
+    events += [FleetEvent(kind='truck', key=key, action='removed') for key in removed]
+    return events
+
+
+class FleetPoller:
+    """
+    Polls the roster and the truck list and publishes their differences.
+
+    The first poll only records a baseline: clients load the full state from the REST endpoints and then
+    follow the events. A failed fetch is reported and retried on the next poll against the same baseline.
+    """
+
+    def __init__(self, fetch_drivers: Callable[[], dict[str, dict]] = get_drivers_index,
+                 fetch_trucks: Callable[[], list[dict]] = get_truck_eld_data, update_cache: bool = True,
+                 alarms: Optional[ViolationAlarmScheduler] = None, clock: Callable[[], float] = time.time,
+                 tracks: Optional[TrackStore] = None):
+        self._fetch_drivers = fetch_drivers
+        self._fetch_trucks = fetch_trucks
+        self._update_cache = update_cache
+        self._clock = clock
+        self.tracks = tracks
+        self.alarms = alarms if alarms is not None else ViolationAlarmScheduler(settings.VIOLATION_WARNING_LEADS)
+        self.drivers: Optional[dict[str, dict]] = None
+        self.trucks: Optional[dict[str, dict]] = None
+
+    def poll(self) -> int:
+        """
+        Runs one poll and returns the number of events published.
+        """
+        events = []
+
+        try:
+            drivers = self._fetch_drivers()
+        except Exception as e:
+            print(f"Error polling drivers: {e}")
+        else:
+            if self._update_cache:
+                drivers_snapshot.put(drivers)
+            if self.drivers is not None:
+                events += driver_events(self.drivers, drivers)
+            self.drivers = drivers
+            self.alarms.update(drivers, as_of=self._clock())
+            events += alert_events(self.alarms.pop_due(self._clock()))
+
+        try:
+            trucks = self._fetch_trucks()
+        except Exception as e:
+            print(f"Error polling trucks: {e}")
+        else:
+            if self._update_cache:
+                trucks_snapshot.put(trucks)
+            if self.tracks is not None:
+                self.tracks.record(trucks)
+            trucks = index_trucks(trucks)
+            if self.trucks is not None:
+                events += truck_events(self.trucks, trucks)
+            self.trucks = trucks
+
+        FleetEvent.objects.bulk_create(events, batch_size=500)
+        return len(events)
+
+    def publish_alarms(self) -> int:
+        """
+        Publishes the alarms due now and returns how many there were.
+        """
+        events = alert_events(self.alarms.pop_due(self._clock()))
+        FleetEvent.objects.bulk_create(events, batch_size=500)
+        return len(events)
+
+    def run(self, interval: float, iterations: Optional[int] = None, on_poll: Optional[Callable[[int], None]] = None,
+            sleep: Callable[[float], None] = time.sleep):
+        """
+        Polls every ``interval`` seconds (measured start to start) and prunes events past their retention. In
+        between it sleeps until whichever comes first, the next poll or the next alarm.
+        """
+        done = 0
+        next_poll = self._clock()
+        while True:
+            if self._clock() >= next_poll:
+                published = self.poll()
+                prune_events(settings.FLEET_EVENTS_RETENTION)
+                if on_poll is not None:
+                    on_poll(published)
+                done += 1
+                next_poll = max(next_poll + interval, self._clock())
+                if iterations is not None and done >= iterations:
+                    return
+            else:
+                self.publish_alarms()
+
+            wake_at = next_poll
+            next_alarm = self.alarms.next_due()
+            if next_alarm is not None:
+                wake_at = min(wake_at, next_alarm)
+            sleep(max(0.0, wake_at - self._clock()))
+
+
+def prune_events(retention: float) -> int:
+    deleted, _ = FleetEvent.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=retention)).delete()
+    return deleted
@@ -0,0 +1,521 @@
+"""
+ProLogs holds the client-side plumbing used to talk to the ProLogs public API.
+"""
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from eld_app.metrics import timed
+from eld_app.streaming import iter_json_items, iter_json_object
+
+# Seconds a token is kept when the token endpoint does not say how long it lives.
+DEFAULT_TOKEN_LIFETIME = 300
+
+
+class _TokenCache:
+
+    def __init__(self, refresh_margin: float, clock: Callable[[], float]):
+        self._refresh_margin = refresh_margin
+        self._clock = clock
+        self._token = None
+        self._refresh_at = 0.0
+        self._expires_at = 0.0
+
+    def invalidate(self):
+        self._token = None
+        self._refresh_at = self._expires_at = 0.0
+
+    def _valid_token(self) -> Optional[str]:
+        if self._token is not None and self._clock() < self._expires_at:
+            return self._token
+        return None
+
+    def _needs_refresh(self) -> bool:
+        return self._clock() >= self._refresh_at
+
+    def _store(self, payload: Optional[dict], requested_at: float):
+        if payload and payload.get('access_token'):
+            # Time the token from when we asked for it so the cached copy never outlives the real one.
+            lifetime = float(payload.get('expires_in') or 0)
+            if lifetime <= 0:
+                lifetime = DEFAULT_TOKEN_LIFETIME
+            self._token = payload['access_token']
+            self._expires_at = requested_at + lifetime
+            self._refresh_at = requested_at + max(lifetime - self._refresh_margin, lifetime / 2)
+
+
+class AccessTokenManager(_TokenCache):
+    """
+    Keeps a client-credentials access token in memory until shortly before it expires.
+
+    Callers that find no usable token wait on a single in-flight refresh instead of each
+    requesting their own. Once the token enters its refresh margin, the first caller to notice
+    starts a background refresh and everybody keeps using the current token until it lands.
+    """
+
+    def __init__(self, fetch_token: Callable[[], Optional[dict]], refresh_margin: float = 60,
+                 clock: Callable[[], float] = time.monotonic):
+        super().__init__(refresh_margin, clock)
+        self._fetch_token = fetch_token
+        self._condition = threading.Condition()
+        self._refreshing = False
+
+    def get_token(self) -> Optional[str]:
+        with self._condition:
+            token = self._valid_token()
+            if token is not None:
+                if self._needs_refresh() and not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh, name='prologs-token-refresh', daemon=True).start()
+                return token
+
+            if self._refreshing:
+                self._condition.wait_for(lambda: not self._refreshing)
+                return self._valid_token()
+
+            self._refreshing = True
+
+        self._refresh()
+
+        with self._condition:
+            return self._valid_token()
+
+    def invalidate(self):
+        with self._condition:
+            super().invalidate()
+
+    def _refresh(self):
+        requested_at = self._clock()
+        payload = None
+        try:
+            payload = self._fetch_token()
+        finally:
+            with self._condition:
+                self._store(payload, requested_at)
+                self._refreshing = False
+                self._condition.notify_all()
+
+
+class AsyncAccessTokenManager(_TokenCache):
+    """
+    The asyncio counterpart of ``AccessTokenManager``: coroutines waiting for a token share one refresh task.
+    Tasks cannot be awaited from another event loop, so each loop (e.g. one per ``async_to_sync`` call under
+    WSGI) runs its own.
+    """
+
+    def __init__(self, fetch_token: Callable[[], Awaitable[Optional[dict]]], refresh_margin: float = 60,
+                 clock: Callable[[], float] = time.monotonic):
+        super().__init__(refresh_margin, clock)
+        self._fetch_token = fetch_token
+        # Event loop: its in-flight refresh.
+        self._tasks: dict[asyncio.AbstractEventLoop, asyncio.Task] = {}
+
+    async def get_token(self) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        token = self._valid_token()
+        if token is not None:
+            if self._needs_refresh() and loop not in self._tasks:
+                self._tasks[loop] = loop.create_task(self._refresh(loop))
+            return token
+
+        task = self._tasks.get(loop)
+        if task is None:
+            task = self._tasks[loop] = loop.create_task(self._refresh(loop))
+        await asyncio.shield(task)
+        return self._valid_token()
+
+    async def _refresh(self, loop: asyncio.AbstractEventLoop):
+        requested_at = self._clock()
+        payload = None
+        try:
+            payload = await self._fetch_token()
+        finally:
+            self._store(payload, requested_at)
+            self._tasks.pop(loop, None)
+
+
+class ProLogsClient:
+    """
+    Talks to the ProLogs public API over a pooled, keep-alive ``requests.Session``.
+
+    Every call carries connect/read timeouts, and 429/5xx responses and connection errors are
+    retried a bounded number of times with jittered exponential backoff (``Retry-After`` is
+    honoured). Bearer tokens come from an ``AccessTokenManager`` fed by this same session.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, base_url: str, token_url: str, client_id: Optional[str] = None,
+                 client_secret: Optional[str] = None, pool_size: int = 10, connect_timeout: float = 3.05,
+                 read_timeout: float = 15, max_retries: int = 3, backoff_factor: float = 0.5,
+                 backoff_jitter: float = 0.5, token_refresh_margin: float = 60):
+        self.base_url = base_url.rstrip('/')
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=max_retries,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=None,  # the token POST is safe to repeat as well
+            backoff_factor=backoff_factor,
+            backoff_jitter=backoff_jitter,
+            raise_on_status=False,
+        )
+        self._adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+
+        self.token_manager = AccessTokenManager(self.fetch_access_token, refresh_margin=token_refresh_margin)
+
+        self._stats_lock = threading.Lock()
+        self._counts = {'requests': 0, 'retries': 0, 'errors': 0, 'token_requests': 0}
+
+    @timed('token')
+    def fetch_access_token(self, client_id: Optional[str] = None, client_secret: Optional[str] = None) -> Optional[dict]:
+        data = {
+            'grant_type': 'client_credentials',
+            'client_id': client_id or self.client_id or os.getenv('PROLOGS_CLIENT_ID'),
+            'client_secret': client_secret or self.client_secret or os.getenv('PROLOGS_API_KEY'),
+        }
+        self._count('token_requests')
+
+        try:
+            response = self._send('POST', self.token_url, data=data)
+            return response.json()
+
+        except requests.exceptions.RequestException as e:
+            print(f"Error making request: {e}")
+            return None
+
+    def get(self, path: str, **kwargs):
+        return self.get_response(path, **kwargs).json()
+
+    def get_response(self, path: str, **kwargs) -> requests.Response:
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        response = self._send('GET', url, headers=self._auth_headers(), **kwargs)
+
+        if response.status_code == 401:
+            # The token was revoked or expired early; fetch a new one and try once more.
+            self.token_manager.invalidate()
+            response.close()
+            response = self._send('GET', url, headers=self._auth_headers(), **kwargs)
+
+        return response
+
+    def iter_paginated(self, path: str, cursor: Optional[str] = None, params: Optional[dict] = None,
+                       items_key: str = 'list', cursor_param: str = 'lastTimestamp',
+                       decode: Optional[Callable[[dict], Any]] = None, prefetch: int = 10000,
+                       chunk_size: int = 64 * 1024) -> 'PageStream':
+        """
+        Streams every item of a ``hasMore``/``lastTimestamp`` paginated endpoint, starting at ``cursor``.
+        """
+        return PageStream(self, path, cursor, params, items_key, cursor_param, decode, prefetch, chunk_size)
+
+    def iter_items(self, path: str, params: Optional[dict] = None, decode: Optional[Callable[[Any], Any]] = None,
+                   chunk_size: int = 64 * 1024) -> Iterator[Any]:
+        """
+        Streams the elements of an endpoint that returns one JSON array, parsing them as the bytes arrive.
+        """
+        with self.get_response(path, params=params, stream=True) as response:
+            response.raise_for_status()
+            for item in iter_json_items(response.iter_content(chunk_size)):
+                yield decode(item) if decode else item
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            counts = dict(self._counts)
+
+        pools = {}
+        for key in list(self._adapter.poolmanager.pools.keys()):
+            pool = self._adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            pools[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                'maxsize': pool.pool.maxsize if pool.pool else 0,
+                'connections_opened': pool.num_connections,
+                'idle_connections': idle,
+                'requests': pool.num_requests,
+            }
+
+        return {**counts, 'pools': pools}
+
+    def close(self):
+        self.session.close()
+
+    def _auth_headers(self) -> dict:
+        return {'Authorization': f'Bearer {self.token_manager.get_token()}'}
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        self._count('requests')
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            self._count('errors')
+            raise
+
+        retries = getattr(response.raw, 'retries', None)
+        if retries is not None and retries.history:
+            self._count('retries', len(retries.history))
+        if response.status_code >= 400:
+            self._count('errors')
+
+        return response
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self._counts[name] += amount
+
+
+class _PageEnd:
+    def __init__(self, cursor: Optional[str]):
+        self.cursor = cursor
+
+
+class _Failure:
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+_DONE = object()
+
+
+class PageStream:
+    """
+    Iterates the items of a paginated ProLogs endpoint while a background thread fetches and parses ahead.
+
+    Pages are requested with ``stream=True`` and parsed as their bytes arrive, so neither a page nor the
+    whole history is ever held in memory: the reader stays at most ``prefetch`` items ahead of the
+    consumer, and requests the next page as soon as it has finished reading the current one.
+
+    ``cursor`` is the ``lastTimestamp`` of the last page whose items have all been consumed, i.e. where a
+    later pull should resume. Errors in the reader are raised from the iteration.
+    """
+
+    def __init__(self, client: ProLogsClient, path: str, cursor: Optional[str], params: Optional[dict],
+                 items_key: str, cursor_param: str, decode: Optional[Callable[[dict], Any]], prefetch: int,
+                 chunk_size: int):
+        self.cursor = cursor
+        self.pages = 0
+        self._client = client
+        self._path = path
+        self._params = params or {}
+        self._items_key = items_key
+        self._cursor_param = cursor_param
+        self._decode = decode
+        self._chunk_size = chunk_size
+        # Items cross to the consumer in small batches; a queue handoff per item costs more than parsing it.
+        self._batch_size = max(1, min(prefetch, 256))
+        self._queue = queue.Queue(maxsize=max(1, prefetch // self._batch_size))
+        self._stop = threading.Event()
+        self._reader: Optional[threading.Thread] = None
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._reader is not None:
+            raise RuntimeError("A PageStream can only be iterated once")
+        self._reader = threading.Thread(target=self._read, name=f'prologs-pages-{self._path}', daemon=True)
+        self._reader.start()
+
+        try:
+            while True:
+                item = self._queue.get()
+                if isinstance(item, _PageEnd):
+                    self.cursor = item.cursor if item.cursor else self.cursor
+                    self.pages += 1
+                elif item is _DONE:
+                    return
+                elif isinstance(item, _Failure):
+                    raise item.error
+                else:
+                    yield from item
+        finally:
+            self.close()
+
+    def close(self):
+        self._stop.set()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(self):
+        cursor = self.cursor
+        try:
+            while not self._stop.is_set():
+                params = dict(self._params)
+                if cursor:
+                    params[self._cursor_param] = cursor
+
+                has_more, next_cursor = False, None
+                batch = []
+                with self._client.get_response(self._path, params=params, stream=True) as response:
+                    response.raise_for_status()
+                    for key, value in iter_json_object(response.iter_content(self._chunk_size), self._items_key):
+                        if key == self._items_key:
+                            batch.append(self._decode(value) if self._decode else value)
+                            if len(batch) >= self._batch_size:
+                                if not self._put(batch):
+                                    return
+                                batch = []
+                        elif key == 'hasMore':
+                            has_more = value
+                        elif key == 'lastTimestamp':
+                            next_cursor = value
+
+                if batch and not self._put(batch) or not self._put(_PageEnd(next_cursor)):
+                    return
+                if not has_more or not next_cursor or next_cursor == cursor:
+                    break
+                cursor = next_cursor
+
+            self._put(_DONE)
+        except Exception as e:
+            self._put(_Failure(e))
+
+
+class AsyncProLogsClient:
+    """
+    The asyncio counterpart of ``ProLogsClient``, built on a shared ``httpx.AsyncClient`` pool.
+
+    Retries follow the same policy as the sync client: bounded attempts on connection errors and
+    429/5xx responses, exponential backoff with random jitter, and ``Retry-After`` when it is sent.
+    Each event loop gets its own ``httpx.AsyncClient``, closed on that loop when it shuts down.
+    """
+
+    RETRY_STATUSES = ProLogsClient.RETRY_STATUSES
+
+    def __init__(self, base_url: str, token_url: str, client_id: Optional[str] = None,
+                 client_secret: Optional[str] = None, max_connections: int = 100, max_keepalive: int = 20,
+                 connect_timeout: float = 3.05, read_timeout: float = 15, max_retries: int = 3,
+                 backoff_factor: float = 0.5, backoff_jitter: float = 0.5, backoff_max: float = 120,
+                 token_refresh_margin: float = 60):
+        self.base_url = base_url.rstrip('/')
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_jitter = backoff_jitter
+        self.backoff_max = backoff_max
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self._timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        # Event loop: (its client, the task that closes the client when the loop shuts down).
+        self._clients: dict[asyncio.AbstractEventLoop, tuple[httpx.AsyncClient, asyncio.Task]] = {}
+
+        self.token_manager = AsyncAccessTokenManager(self.fetch_access_token, refresh_margin=token_refresh_margin)
+
+        self._counts = {'requests': 0, 'retries': 0, 'errors': 0, 'token_requests': 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is None:
+            client = httpx.AsyncClient(limits=self._limits, timeout=self._timeout)
+            entry = self._clients[loop] = (client, loop.create_task(self._close_on_shutdown(loop, client)))
+        return entry[0]
+
+    async def _close_on_shutdown(self, loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient):
+        # Parked until cancelled. asyncio.run() and asgiref's async_to_sync (which runs async views under WSGI
+        # on a new loop per request) cancel the tasks left on a loop before closing it, so the client's
+        # connections are closed on the loop they belong to.
+        try:
+            await loop.create_future()
+        finally:
+            self._clients.pop(loop, None)
+            await client.aclose()
+
+    @timed('token')
+    async def fetch_access_token(self, client_id: Optional[str] = None,
+                                 client_secret: Optional[str] = None) -> Optional[dict]:
+        data = {
+            'grant_type': 'client_credentials',
+            'client_id': client_id or self.client_id or os.getenv('PROLOGS_CLIENT_ID'),
+            'client_secret': client_secret or self.client_secret or os.getenv('PROLOGS_API_KEY'),
+        }
+        self._counts['token_requests'] += 1
+
+        try:
+            response = await self._send('POST', self.token_url, data=data)
+            return response.json()
+
+        except httpx.HTTPError as e:
+            print(f"Error making request: {e}")
+            return None
+
+    async def get(self, path: str, **kwargs):
+        response = await self.get_response(path, **kwargs)
+        return response.json()
+
+    async def get_response(self, path: str, **kwargs) -> httpx.Response:
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        response = await self._send('GET', url, headers=await self._auth_headers(), **kwargs)
+
+        if response.status_code == 401:
+            self.token_manager.invalidate()
+            response = await self._send('GET', url, headers=await self._auth_headers(), **kwargs)
+
+        return response
+
+    def stats(self) -> dict:
+        return {
+            **self._counts,
+            'max_connections': self._limits.max_connections,
+            'max_keepalive_connections': self._limits.max_keepalive_connections,
+        }
+
+    async def aclose(self):
+        entry = self._clients.get(asyncio.get_running_loop())
+        if entry is not None:
+            entry[1].cancel()
+            await asyncio.wait([entry[1]])
+
+    async def _auth_headers(self) -> dict:
+        return {'Authorization': f'Bearer {await self.token_manager.get_token()}'}
+
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        attempt = 0
+        while True:
+            self._counts['requests'] += 1
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    self._counts['errors'] += 1
+                    raise
+                response = None
+            else:
+                if response.status_code not in self.RETRY_STATUSES or attempt >= self.max_retries:
+                    if response.status_code >= 400:
+                        self._counts['errors'] += 1
+                    return response
+                await response.aclose()
+
+            attempt += 1
+            self._counts['retries'] += 1
+            await asyncio.sleep(self._backoff(attempt, response))
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        delay = self.backoff_factor * (2 ** (attempt - 1)) + random.uniform(0, self.backoff_jitter)
+        return min(delay, self.backoff_max)
@@ -0,0 +1,71 @@
+"""
+Renderers holds the JSON encoding used for API responses: orjson when it is installed, the stdlib otherwise.
+
+orjson is optional (``pip install orjson``). Without it everything here behaves exactly like DRF's own
+``JSONRenderer`` and ``json.dumps``.
+"""
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from eld_app.metrics import timed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Types orjson cannot encode, and datetimes (which DRF writes with a "Z" suffix), go through DRF's encoder.
+_encoder = JSONEncoder()
+
+
+def dumps(value, default=_encoder.default) -> str:
+    """
+    Compact JSON text for ``value``, with non-JSON types handled by ``default`` as ``json.dumps`` would.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=default,
+                                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            # Integers beyond 64 bits and the like; let the stdlib decide.
+            pass
+    return json.dumps(value, default=default, separators=(',', ':'), ensure_ascii=False)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    A ``JSONRenderer`` that encodes with orjson when it is installed, producing the same bytes as DRF's
+    compact output. Indented (browsable or ``; indent=`` requested) output still goes through DRF.
+    """
+
+    @timed('render')
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default,
+                               option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Like DRF, escape the two line separators that are valid JSON but not valid JavaScript.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline-delimited JSON: one line per element of a list, or a single line for anything else. Selected with
+    ``?format=ndjson`` or ``Accept: application/x-ndjson``; views stream large lists themselves.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        return ''.join(f'{dumps(item)}\n' for item in items).encode()
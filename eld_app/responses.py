@@ -1,9 +1,11 @@
 """
 Responses holds the dataclasses for the responses that the API will return.
 """
+from array import array
 from dataclasses import field
 from datetime import timedelta, datetime
-from typing import List, Dict, Any, Optional
+from enum import IntEnum
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 
 from pydantic import BaseModel
 from pydantic.dataclasses import dataclass
@@ -37,3 +39,204 @@ class DrivingSchedules:
     dropoff_time: datetime
     driving_segments: List[DrivingSegment] = field(default_factory=list)
     rest_periods: List[DrivingSegment] = field(default_factory=list)
+
+
+class SegmentType(IntEnum):
+    DRIVING = 0
+    BREAK_30_MINUTES = 1
+    BREAK_2_HOURS = 2
+    BREAK_7_HOURS = 3
+    RESET_34_HOURS = 4
+
+    @property
+    def label(self) -> str:
+        return SEGMENT_LABELS[self]
+
+
+SEGMENT_LABELS = ("Driving", "30-Minute Break", "2-Hour Break", "7-Hour Break", "34-Hour Reset")
+
+_MICROSECOND = timedelta(microseconds=1)
+_DAY = 24 * 60 * 60 * 1_000_000
+
+
+class TimestampFormatter:
+    """
+    Formats microsecond offsets from an origin datetime exactly like ``(origin + offset).isoformat()``.
+
+    For naive or fixed-offset origins (the API only accepts UTC) the date part is computed once per day
+    and the time of day with integer arithmetic; other time zones fall back to datetime arithmetic.
+    """
+
+    def __init__(self, origin: datetime):
+        self._origin = origin
+        self._fixed_offset = origin.tzinfo is None or origin.tzinfo.utcoffset(None) is not None
+
+        naive = origin.replace(tzinfo=None)
+        midnight = naive.replace(hour=0, minute=0, second=0, microsecond=0)
+        self._suffix = origin.isoformat()[len(naive.isoformat()):]
+        self._midnight = midnight
+        self._origin_in_day = (naive - midnight) // _MICROSECOND
+        self._days = {}
+
+    def __call__(self, offset: int) -> str:
+        if not self._fixed_offset:
+            return (self._origin + timedelta(microseconds=offset)).isoformat()
+
+        day, time_of_day = divmod(self._origin_in_day + offset, _DAY)
+        prefix = self._days.get(day)
+        if prefix is None:
+            prefix = self._days[day] = (self._midnight + timedelta(days=day)).date().isoformat()
+
+        seconds, microseconds = divmod(time_of_day, 1_000_000)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        if microseconds:
+            return f"{prefix}T{hours:02d}:{minutes:02d}:{seconds:02d}.{microseconds:06d}{self._suffix}"
+        return f"{prefix}T{hours:02d}:{minutes:02d}:{seconds:02d}{self._suffix}"
+
+
+class Segment:
+    """
+    One planned segment, read out of a DrivingTimeline. ``start``/``end`` are microseconds from pickup.
+    """
+    __slots__ = ('segment_type', 'start', 'end', 'duration')
+
+    def __init__(self, segment_type: SegmentType, start: int, end: int, duration: float):
+        self.segment_type = segment_type
+        self.start = start
+        self.end = end
+        self.duration = duration
+
+    def __repr__(self):
+        return f"Segment({self.segment_type.name}, start={self.start}, end={self.end}, duration={self.duration})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Segment):
+            return NotImplemented
+        return (self.segment_type, self.start, self.end, self.duration) == \
+            (other.segment_type, other.start, other.end, other.duration)
+
+
+class DrivingTimeline:
+    """
+    A planned schedule stored as parallel arrays: segment type codes, start/end offsets in integer
+    microseconds from pickup, and durations in minutes.
+
+    It renders straight to the JSON the schedule endpoints have always returned (``timeline``,
+    ``driving_segments``, ``rest_periods``), or just the timeline, without building a dict per segment;
+    ``to_dict`` is kept for callers that want Python objects.
+    """
+    __slots__ = ('pickup', 'types', 'starts', 'ends', 'durations', '_json', '_timeline_json')
+
+    # Set on a type code when the response reports the duration as a float (330.0 rather than 240).
+    _FLOAT_DURATION = 0x80
+
+    def __init__(self, pickup: datetime, segments: Iterable[tuple] = ()):
+        self.pickup = pickup
+        self.types = array('B')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.durations = array('d')
+        self._json = None
+        self._timeline_json = None
+        self.extend(segments)
+
+    def append(self, segment_type: SegmentType, start: int, end: int, duration: float):
+        self._json = self._timeline_json = None
+        self.types.append(segment_type | self._FLOAT_DURATION if isinstance(duration, float) else segment_type)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.durations.append(duration)
+
+    def extend(self, segments: Iterable[tuple]):
+        for segment in segments:
+            self.append(*segment)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> Segment:
+        code = self.types[index]
+        duration = self.durations[index]
+        if not code & self._FLOAT_DURATION:
+            duration = int(duration)
+        return Segment(SegmentType(code & ~self._FLOAT_DURATION), self.starts[index], self.ends[index], duration)
+
+    def __iter__(self) -> Iterator[Segment]:
+        return (self[index] for index in range(len(self)))
+
+    @property
+    def end(self) -> Optional[datetime]:
+        return self.pickup + timedelta(microseconds=self.ends[-1]) if len(self) else None
+
+    def driving_minutes(self) -> float:
+        return sum(duration for code, duration in zip(self.types, self.durations)
+                   if code & ~self._FLOAT_DURATION == SegmentType.DRIVING)
+
+    def _entries(self) -> Iterator[tuple[bool, str, str, str, Any]]:
+        format_offset = TimestampFormatter(self.pickup)
+
+        # Consecutive segments share a boundary, so each end is reused as the next start.
+        last_end, last_text = None, None
+        for index in range(len(self)):
+            start, end, code = self.starts[index], self.ends[index], self.types[index]
+            start_text = last_text if start == last_end else format_offset(start)
+            last_end, last_text = end, format_offset(end)
+
+            duration = self.durations[index]
+            if not code & self._FLOAT_DURATION:
+                duration = int(duration)
+            segment_type = code & ~self._FLOAT_DURATION
+            yield segment_type == SegmentType.DRIVING, start_text, last_text, SEGMENT_LABELS[segment_type], duration
+
+    def _entry_json(self) -> Iterator[tuple[bool, str]]:
+        # Timestamps and labels need no escaping.
+        for is_driving, start, end, label, duration in self._entries():
+            yield is_driving, f'{{"start":"{start}","end":"{end}","segment_type":"{label}","duration":{duration!r}}}'
+
+    def to_dict(self, timeline_only: bool = False) -> dict:
+        if timeline_only:
+            return {"timeline": [
+                {"start": start, "end": end, "segment_type": label, "duration": duration}
+                for _, start, end, label, duration in self._entries()
+            ]}
+
+        timeline, driving_segments, rest_periods = [], [], []
+        for is_driving, start, end, label, duration in self._entries():
+            entry = {"start": start, "end": end, "segment_type": label, "duration": duration}
+            timeline.append(entry)
+            (driving_segments if is_driving else rest_periods).append(entry)
+
+        return {
+            "timeline": timeline,
+            "driving_segments": driving_segments,
+            "rest_periods": rest_periods,
+        }
+
+    def to_json(self, timeline_only: bool = False) -> str:
+        """
+        Renders the same text as DRF's compact JSONRenderer would for ``to_dict(timeline_only)``.
+
+        With ``timeline_only`` the segments are written once, under ``timeline``, instead of being repeated in
+        ``driving_segments``/``rest_periods``; each entry already carries its ``segment_type``. Memoized
+        timelines are rendered again and again, so both texts are kept.
+        """
+        if timeline_only:
+            if self._timeline_json is None:
+                self._timeline_json = f'{{"timeline":[{",".join(entry for _, entry in self._entry_json())}]}}'
+            return self._timeline_json
+
+        if self._json is not None:
+            return self._json
+
+        timeline, driving_segments, rest_periods = [], [], []
+        for is_driving, entry in self._entry_json():
+            timeline.append(entry)
+            (driving_segments if is_driving else rest_periods).append(entry)
+
+        self._json = (
+            f'{{"timeline":[{",".join(timeline)}],'
+            f'"driving_segments":[{",".join(driving_segments)}],'
+            f'"rest_periods":[{",".join(rest_periods)}]}}'
+        )
+        return self._json
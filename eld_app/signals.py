@@ -0,0 +1,8 @@
+"""
+Signals holds the application's custom Django signals.
+"""
+from django.dispatch import Signal
+
+# Sent by SnapshotCache whenever a new upstream snapshot is stored, with ``name`` ("trucks" or "drivers")
+# and the stored ``data``.
+snapshot_refreshed = Signal()
@@ -0,0 +1,186 @@
+"""
+Store holds the persistent copy of the fleet snapshots: the last ``/drivers/`` roster and ``/trucks/`` list,
+one row per driver or truck, so a restarted process can serve them without waiting on ProLogs.
+
+Each save upserts the snapshot in batches and then deletes the rows it no longer has. Django 3.2's
+``bulk_create`` cannot update on conflict, so on SQLite and PostgreSQL the upsert is issued as
+``INSERT ... ON CONFLICT DO UPDATE``; other backends delete and re-insert each batch in one transaction.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Max
+
+from eld_app.models import DriverSnapshot, TruckSnapshot
+from eld_app.renderers import dumps
+
+# Rows per INSERT statement, before the backend's own limit on query parameters.
+BATCH_SIZE = 1000
+
+
+def supports_upsert(connection) -> bool:
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 24, 0)
+    return connection.vendor == 'postgresql'
+
+
+def upsert(model, fields: list[str], rows: list[tuple], unique_field: str, batch_size: int = BATCH_SIZE,
+           newer_field: Optional[str] = None) -> int:
+    """
+    Inserts ``rows`` of ``model``'s ``fields``, updating the existing row wherever ``unique_field`` (one of
+    ``fields``) is already taken. Values must be ready for the database, as ``get_db_prep_save`` returns
+    them, and ``rows`` must not repeat a ``unique_field`` value. Returns the number of rows written.
+
+    With ``newer_field``, an existing row is only updated if its value there is not greater than the new
+    row's, so an older write never replaces a newer one. Backends without upsert replace rows regardless.
+
+    Rows are written as plain tuples rather than model instances: building and preparing an instance per
+    row costs more than the INSERT itself.
+    """
+    if not rows:
+        return 0
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in fields]
+    conflict = model._meta.get_field(unique_field).column
+    table = quote(model._meta.db_table)
+    columns = ', '.join(quote(field.column) for field in fields)
+    row = f"({', '.join(['%s'] * len(fields))})"
+    batch_size = max(1, min(batch_size, connection.ops.bulk_batch_size(fields, rows)))
+
+    if supports_upsert(connection):
+        updates = ', '.join(f'{quote(field.column)} = EXCLUDED.{quote(field.column)}'
+                            for field in fields if field.column != conflict)
+        on_conflict = f" ON CONFLICT ({quote(conflict)}) DO UPDATE SET {updates}"
+        if newer_field is not None:
+            newer = quote(model._meta.get_field(newer_field).column)
+            on_conflict += f" WHERE EXCLUDED.{newer} >= {table}.{newer}"
+    else:
+        on_conflict = ''
+
+    key = [field.column for field in fields].index(conflict)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            if not on_conflict:
+                # No upsert on this backend: replace the rows being written.
+                model.objects.filter(**{f'{unique_field}__in': [values[key] for values in batch]}).delete()
+            cursor.execute(f"INSERT INTO {table} ({columns}) VALUES {', '.join([row] * len(batch))}{on_conflict}",
+                           [value for values in batch for value in values])
+    return len(rows)
+
+
+class SnapshotStore:
+    """
+    Saves and loads one snapshot in ``model``'s table.
+
+    Subclasses say how the snapshot splits into items (``items``), the values of ``fields`` each item fills
+    (``columns``; the first field is the unique key) and how items are put back together (``assemble``).
+    """
+    model = None
+    fields = ()
+
+    def items(self, data) -> list[dict]:
+        raise NotImplementedError
+
+    def columns(self, item: dict) -> tuple:
+        raise NotImplementedError
+
+    def assemble(self, items: list[dict]) -> Any:
+        raise NotImplementedError
+
+    def save(self, data, fetched_at: Optional[float] = None) -> int:
+        """
+        Replaces the stored snapshot with ``data``, fetched at ``fetched_at`` (epoch seconds), unless a newer
+        one is already stored. Items without a key are not stored. Returns the number of rows written.
+        """
+        fetched_at = datetime.fromtimestamp(time.time() if fetched_at is None else fetched_at, tz=timezone.utc)
+        connection = connections[router.db_for_write(self.model)]
+        stamp = self.model._meta.get_field('fetched_at').get_db_prep_save(fetched_at, connection)
+
+        # Keyed first so a key repeated upstream is written once, where it first appeared, with its last value.
+        rows = {}
+        for item in self.items(data):
+            columns = self.columns(item)
+            if columns[0] is not None:
+                rows[columns[0]] = (*columns, dumps(item))
+        rows = [(*values, position, stamp) for position, values in enumerate(rows.values())]
+        fields = [*self.fields, 'data', 'position', 'fetched_at']
+
+        with transaction.atomic(using=connection.alias):
+            # Saves can land out of order (a slow fetch finishing after a newer one); the newer snapshot wins.
+            if self.model.objects.filter(fetched_at__gt=fetched_at).exists():
+                return 0
+            written = upsert(self.model, fields, rows, self.fields[0], newer_field='fetched_at')
+            # Whatever this snapshot no longer has. A newer snapshot saved meanwhile is left alone.
+            self.model.objects.filter(fetched_at__lt=fetched_at).delete()
+        return written
+
+    def load(self, max_age: float) -> tuple[Optional[float], Any]:
+        """
+        The stored snapshot and when it was fetched (epoch seconds), or ``(None, None)`` if there is none
+        younger than ``max_age`` seconds.
+        """
+        latest = self.model.objects.aggregate(latest=Max('fetched_at'))['latest']
+        if latest is None or time.time() - latest.timestamp() >= max_age:
+            return None, None
+        items = list(self.model.objects.filter(fetched_at=latest).values_list('data', flat=True))
+        return latest.timestamp(), self.assemble(items)
+
+    def age(self) -> Optional[float]:
+        latest = self.model.objects.aggregate(latest=Max('fetched_at'))['latest']
+        return None if latest is None else time.time() - latest.timestamp()
+
+
+class DriverStore(SnapshotStore):
+    """
+    The roster, stored as the ``drivers`` snapshot holds it: upstream items by driver id.
+    """
+    model = DriverSnapshot
+    fields = ('driver_id', 'truck_name', 'duty_status', 'shift_drive_minutes', 'shift_work_minutes',
+              'cycle_work_minutes')
+
+    def items(self, data: dict[str, dict]) -> list[dict]:
+        return list(data.values())
+
+    def columns(self, item: dict) -> tuple:
+        return (item.get('driverId'), item.get('truckName'), item.get('dutyStatus'), item.get('shiftDriveMinutes'),
+                item.get('shiftWorkMinutes'), item.get('cycleWorkMinutes'))
+
+    def assemble(self, items: list[dict]) -> dict[str, dict]:
+        return {item['driverId']: item for item in items}
+
+
+class TruckStore(SnapshotStore):
+    """
+    The truck list, in upstream order.
+    """
+    model = TruckSnapshot
+    fields = ('name', 'lat', 'lng', 'time_stamp')
+
+    def items(self, data: list[dict]) -> list[dict]:
+        return data
+
+    def columns(self, item: dict) -> tuple:
+        return item.get('name'), item.get('lat'), item.get('lng'), item.get('timeStamp')
+
+    def assemble(self, items: list[dict]) -> list[dict]:
+        return items
+
+
+driver_store = DriverStore()
+truck_store = TruckStore()
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    ``connection_created`` receiver: puts SQLite databases in write-ahead-log mode, so the poller's writes do
+    not block the web workers' reads, and syncs to disk at checkpoints rather than on every commit.
+    """
+    if connection.vendor == 'sqlite' and settings.SQLITE_WAL:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
@@ -0,0 +1,156 @@
+"""
+Streaming holds helpers for producing and consuming large JSON payloads incrementally.
+"""
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER_CHARACTERS = frozenset('0123456789.eE+-')
+
+
+def iter_json_array(items: Iterable[Any], dumps=json.dumps) -> Iterator[str]:
+    """
+    Encodes ``items`` as one JSON array, a chunk per item, so the full payload never sits in memory.
+    """
+    yield '['
+    first = True
+    for item in items:
+        if first:
+            first = False
+            yield dumps(item)
+        else:
+            yield ',' + dumps(item)
+    yield ']'
+
+
+def iter_ndjson(items: Iterable[Any], dumps=json.dumps, batch_size: int = 100) -> Iterator[str]:
+    """
+    Encodes ``items`` as newline-delimited JSON, yielding a chunk of up to ``batch_size`` lines at a time.
+    """
+    lines = []
+    for item in items:
+        lines.append(dumps(item))
+        if len(lines) >= batch_size:
+            lines.append('')
+            yield '\n'.join(lines)
+            lines = []
+    if lines:
+        lines.append('')
+        yield '\n'.join(lines)
+
+
+class _JsonReader:
+    # Decodes values one at a time from a stream of byte chunks, pulling chunks only as needed.
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        # Drop what has been consumed so the buffer stays about one chunk long.
+        if self._pos:
+            self._buffer, self._pos = self._buffer[self._pos:], 0
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                self._buffer += text
+                return True
+        self._buffer += self._decoder.decode(b'', final=True)
+        self._eof = True
+        return False
+
+    def _grow(self) -> bool:
+        # Pulls chunks until the undecoded text has doubled, so a value split over many chunks is decoded again
+        # a logarithmic number of times rather than once per chunk.
+        target = 2 * (len(self._buffer) - self._pos)
+        grew = False
+        while self._fill():
+            grew = True
+            if len(self._buffer) - self._pos >= target:
+                break
+        return grew
+
+    def peek(self) -> str:
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON input")
+
+    def expect(self, character: str):
+        if self.peek() != character:
+            raise ValueError(f"Expected {character!r} at JSON offset {self._pos}")
+        self._pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._grow():
+                    raise
+                continue
+            # A number cut at the end of the buffer ("12" of "12.5e3") decodes fine but may continue.
+            if (end == len(self._buffer) or self._buffer[end] in _NUMBER_CHARACTERS) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+
+def iter_json_object(chunks: Iterable[bytes], array_key: str) -> Iterator[tuple[str, Any]]:
+    """
+    Parses a JSON object from byte chunks as they arrive, yielding ``(key, value)`` for each member, except
+    that the array under ``array_key`` is yielded one ``(array_key, item)`` per element. Only the current
+    element is ever held in memory, whatever the size of the array.
+    """
+    reader = _JsonReader(chunks)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key == array_key and reader.peek() == '[':
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.expect(']')
+            else:
+                while True:
+                    yield key, reader.value()
+                    if reader.peek() == ']':
+                        reader.expect(']')
+                        break
+                    reader.expect(',')
+        else:
+            yield key, reader.value()
+
+        if reader.peek() == '}':
+            return
+        reader.expect(',')
+
+
+def iter_json_items(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Parses a top-level JSON array from byte chunks as they arrive, yielding its elements one at a time.
+    """
+    reader = _JsonReader(chunks)
+    reader.expect('[')
+    if reader.peek() == ']':
+        return
+
+    while True:
+        yield reader.value()
+        if reader.peek() == ']':
+            return
+        reader.expect(',')
@@ -1,3 +1,2024 @@
-from django.test import TestCase
+import asyncio
+import json
+import random
+import socket
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from datetime import datetime, timedelta, timezone
 
-# Create your tests here.
+import numpy as np
+import requests
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+
+from eld_app.alarms import ViolationAlarmScheduler, project_limits
+from eld_app.availability import MEASURES, DriveTimeIndex, drive_time_index, driver_availability
+from eld_app.batch import plan_driving_schedules, shutdown_executor
+from eld_app.cache import LRUCache, SnapshotCache
+
+from eld_app.cycle import CycleEngine, load_cycle_engines
+from eld_app.events import broadcaster, fleet_events_app
+from eld_app.history import cycle_history, duty_status_history, ingest_duty_status
+from eld_app.fleet_engine import FleetHosArrays, evaluate_fleet
+from eld_app.geo import EARTH_RADIUS_KM, TruckLocationIndex
+from eld_app.metrics import MetricsRegistry, registry, stage, timed
+from eld_app.models import DriverDutyStatus, DriverHosInformation, DutyStatusCursor, DutyStatusRecord, FleetEvent, \
+    DriverSnapshot
+from eld_app.poller import FleetPoller, driver_events
+from eld_app.prologs import DEFAULT_TOKEN_LIFETIME, AccessTokenManager, AsyncAccessTokenManager, AsyncProLogsClient, \
+    ProLogsClient
+from eld_app.renderers import FastJSONRenderer, dumps
+from eld_app.streaming import _JsonReader, iter_json_items
+from eld_app.responses import SegmentType
+from eld_app.store import TruckStore, driver_store, truck_store, upsert
+from eld_app.tracks import TrackStore, decode_column, encode_column, track_points, track_store
+from eld_app.planner import earliest_arrival, earliest_arrival_offset, iter_segments, rank_by_earliest_arrival
+from eld_app.signals import snapshot_refreshed
+from eld_app.utils import detect_violation, remaining_hos_minutes, plan_driving_schedule, schedule_memo, \
+    parse_and_verify_utc, trucks_snapshot, drivers_snapshot, decode_drivers, get_driver, prologs_client
+
+
+def make_roster(size, seed=0):
+    rng = random.Random(seed)
+
+    def maybe(value):
+        return None if rng.random() < 0.05 else value
+
+    return [
+        {
+            "driverId": f"driver-{i}",
+            "truckName": f"truck-{i}",
+            "dutyStatus": rng.choice(["D", "ON", "OFF", "SB"]),
+            "shiftDriveMinutes": maybe(round(rng.uniform(0, 720), rng.choice([0, 2]))),
+            "shiftWorkMinutes": maybe(round(rng.uniform(0, 900), rng.choice([0, 2]))),
+            "cycleWorkMinutes": maybe(rng.randint(0, 4500)),
+            "maxShiftDriveMinutes": maybe(rng.choice([600, 660])),
+            "maxShiftWorkMinutes": maybe(rng.choice([780, 840])),
+            "maxCycleWorkMinutes": maybe(rng.choice([3600, 4200])),
+        }
+        for i in range(size)
+    ]
+
+
+class FleetEngineTests(SimpleTestCase):
+
+    def test_matches_scalar_detect_violation(self):
+        roster = make_roster(2000)
+        drivers = [DriverHosInformation(**item) for item in roster]
+
+        evaluation = evaluate_fleet(FleetHosArrays.from_drivers(roster))
+
+        self.assertEqual(evaluation.to_violations(), [detect_violation(driver) for driver in drivers])
+        for index, driver in enumerate(drivers):
+            self.assertEqual(evaluation.remaining_for(index), remaining_hos_minutes(driver))
+
+    def test_models_and_raw_dicts_build_the_same_arrays(self):
+        roster = make_roster(200, seed=1)
+        from_dicts = FleetHosArrays.from_drivers(roster)
+        from_models = FleetHosArrays.from_drivers([DriverHosInformation(**item) for item in roster])
+
+        self.assertEqual(from_dicts.driver_ids, from_models.driver_ids)
+        self.assertEqual(from_dicts.limits.tolist(), from_models.limits.tolist())
+        self.assertEqual(str(from_dicts.used.tolist()), str(from_models.used.tolist()))
+
+    def test_select_filters(self):
+        roster = [
+            {"driverId": "over", "shiftDriveMinutes": 700, "shiftWorkMinutes": 0, "cycleWorkMinutes": 0},
+            {"driverId": "close", "shiftDriveMinutes": 630, "shiftWorkMinutes": 0, "cycleWorkMinutes": 0},
+            {"driverId": "fresh", "shiftDriveMinutes": 0, "shiftWorkMinutes": 0, "cycleWorkMinutes": 0},
+        ]
+        evaluation = evaluate_fleet(FleetHosArrays.from_drivers(roster))
+
+        self.assertEqual(evaluation.select(only_violators=True).tolist(), [0])
+        self.assertEqual(evaluation.select(within_minutes=30).tolist(), [0, 1])
+        self.assertEqual(evaluation.select().tolist(), [0, 1, 2])
+
+    def test_malformed_rows_are_left_out(self):
+        roster = make_roster(20, seed=3)
+        bad = [{**roster[4], "shiftDriveMinutes": "n/a"}, {**roster[9], "maxCycleWorkMinutes": {"hours": 70}}]
+        arrays = FleetHosArrays.from_drivers(roster[:4] + bad[:1] + roster[5:9] + bad[1:] + roster[10:])
+        expected = FleetHosArrays.from_drivers(roster[:4] + roster[5:9] + roster[10:])
+
+        self.assertEqual(arrays.driver_ids, expected.driver_ids)
+        self.assertEqual(arrays.limits.tolist(), expected.limits.tolist())
+        self.assertEqual(str(arrays.used.tolist()), str(expected.used.tolist()))
+
+
+class DecodeDriversTests(SimpleTestCase):
+
+    def test_bulk_decode_matches_building_each_model(self):
+        roster = make_roster(300, seed=5)
+        self.assertEqual(decode_drivers(roster), [DriverHosInformation(**item) for item in roster])
+
+    def test_populates_by_field_name_or_alias(self):
+        by_alias = {"driverId": "d1", "truckName": "t1", "shiftDriveMinutes": 90.5, "maxCycleWorkMinutes": 3600}
+        by_name = {"driver_id": "d1", "truck_name": "t1", "shift_drive_minutes": 90.5,
+                   "max_cycle_work_minutes": 3600}
+
+        driver = DriverHosInformation(**by_name)
+
+        self.assertEqual(driver, DriverHosInformation(**by_alias))
+        self.assertEqual(decode_drivers([by_alias, by_name]), [driver, driver])
+        self.assertEqual(driver.model_dump(by_alias=True, exclude_none=True), by_alias)
+
+
+def legacy_plan_driving_schedule(pickup: datetime, dropoff: datetime,
+                                 driver: DriverHosInformation):
+    # The loop-based planner as it was before the event-driven rewrite, kept verbatim as the reference.
+    # Constants
+    MAX_SHIFT_WORK_MINUTES = 840  # 14 hours
+    MAX_SHIFT_DRIVE_MINUTES = 660  # 11 hours
+    MAX_CYCLE_WORK_MINUTES = 4200  # 70 hours in 8 days
+
+    DRIVE_4_HOURS = timedelta(hours=4)
+
+    REST_30_MINUTES = timedelta(minutes=30)
+    REST_2_HOURS = timedelta(hours=2)
+    REST_7_HOURS = timedelta(hours=7)
+    REST_34_HOURS = timedelta(hours=34)
+
+    def pause_when_reach_dropoff_time(current_time, dropoff_time, duration):
+        if current_time - dropoff_time >= timedelta(minutes=duration) or (
+                current_time + timedelta(minutes=duration)) > dropoff_time:
+            return True
+        return False
+
+
+    shift_work_minutes = driver.shift_work_minutes
+    shift_drive_minutes = driver.shift_drive_minutes
+    cycle_work_minutes = driver.cycle_work_minutes
+
+    driving_segments = []
+    rest_periods = []
+
+    current_time = pickup
+    driving_minutes = 0
+
+    while current_time < dropoff:
+        if dropoff == current_time:
+            break
+
+        if cycle_work_minutes >= MAX_CYCLE_WORK_MINUTES:
+            if pause_when_reach_dropoff_time(current_time, dropoff, 34 * 60):
+                rest_start = current_time
+                rest_periods.append({
+                    "start": rest_start.isoformat(),
+                    "end": dropoff.isoformat(),
+                    "segment_type": "34-Hour Reset",
+                    "duration": abs((rest_start - dropoff).total_seconds() / 60)
+                })
+                current_time = dropoff
+
+                continue
+
+            rest_start = current_time
+            rest_end = rest_start + REST_34_HOURS
+            rest_periods.append({
+                "start": rest_start.isoformat(),
+                "end": rest_end.isoformat(),
+                "segment_type": "34-Hour Reset",
+                "duration": 34 * 60
+            })
+            cycle_work_minutes = 0
+            shift_drive_minutes = 0
+            driving_minutes = 0
+
+            current_time = rest_end
+
+            continue
+
+        drive_time = dropoff - current_time
+
+        if MAX_SHIFT_DRIVE_MINUTES <= (shift_drive_minutes + driving_minutes):
+            # DRIVER HAS REACHED THE MAXIMUM DRIVING TIME
+            # Rest for 7h
+
+            if pause_when_reach_dropoff_time(current_time, dropoff, 7 * 60):
+                rest_start = current_time
+                rest_periods.append({
+                    "start": rest_start.isoformat(),
+                    "end": dropoff.isoformat(),
+                    "segment_type": "7-Hour Break",
+                    "duration": abs((rest_start - dropoff).total_seconds() / 60)
+                })
+                current_time = dropoff
+
+                continue
+
+            rest_start = current_time
+            rest_end = rest_start + REST_7_HOURS
+
+            rest_periods.append({
+                "start": rest_start.isoformat(),
+                "end": rest_end.isoformat(),
+                "segment_type": "7-Hour Break",
+                "duration": 420
+            })
+
+            shift_drive_minutes = 0
+            cycle_work_minutes = cycle_work_minutes + 420
+            driving_minutes = 0
+
+            current_time = rest_end
+
+            continue
+
+        if MAX_SHIFT_DRIVE_MINUTES / 2 >= driving_minutes > 0:
+
+            if pause_when_reach_dropoff_time(current_time, dropoff, 240):
+                drive_start = current_time
+                driving_segments.append({
+                    "start": drive_start.isoformat(),
+                    "end": dropoff.isoformat(),
+                    "segment_type": "Driving",
+                    "duration": abs((drive_start - dropoff).total_seconds() / 60)
+                })
+                current_time = dropoff
+
+                continue
+
+            # SPLIT DRIVES TIMES TO GIVE DRIVER A REST
+            drive_start = current_time
+            drive_time = timedelta(minutes=MAX_SHIFT_DRIVE_MINUTES / 2)
+            drive_end = drive_start + drive_time
+
+            driving_segments.append({
+                "start": drive_start.isoformat(),
+                "end": drive_end.isoformat(),
+                "segment_type": "Driving",
+                "duration": drive_time.total_seconds() / 60
+            })
+
+            driving_minutes = driving_minutes + MAX_SHIFT_DRIVE_MINUTES / 2
+
+            if pause_when_reach_dropoff_time(current_time, dropoff, 2 * 60):
+                rest_start = current_time
+                rest_periods.append({
+                    "start": rest_start.isoformat(),
+                    "end": dropoff.isoformat(),
+                    "segment_type": "2-Hour Break",
+                    "duration": 120
+                })
+                current_time = dropoff
+
+                continue
+
+            # Rest for 2h
+            rest_start = drive_end
+            rest_end = rest_start + REST_2_HOURS
+
+            rest_periods.append({
+                "start": rest_start.isoformat(),
+                "end": rest_end.isoformat(),
+                "segment_type": "2-Hour Break",
+                "duration": 120
+            })
+
+            current_time = rest_end
+
+            shift_drive_minutes = shift_drive_minutes + driving_minutes
+            cycle_work_minutes = cycle_work_minutes + driving_minutes + 120
+
+            continue
+
+        if pause_when_reach_dropoff_time(current_time, dropoff, 240):  # pause when reach dropoff time
+            drive_start = current_time
+            driving_segments.append({
+                "start": drive_start.isoformat(),
+                "end": dropoff.isoformat(),
+                "segment_type": "Driving",
+                "duration": abs((drive_start - dropoff).total_seconds() / 60)
+            })
+            current_time = dropoff
+            continue
+
+        if shift_drive_minutes + 240 >= MAX_SHIFT_DRIVE_MINUTES:
+            # DRIVER HAS REACHED THE MAXIMUM DRIVING TIME
+            drive_start = current_time
+            drive_end = current_time + (
+                    timedelta(minutes=MAX_SHIFT_DRIVE_MINUTES) - timedelta(minutes=shift_drive_minutes))
+            driving_segments.append({
+                "start": drive_start.isoformat(),
+                "end": drive_end.isoformat(),
+                "segment_type": "Driving",
+                "duration": (drive_end - drive_start).total_seconds() / 60
+            })
+
+            driving_minutes = (drive_end - drive_start).total_seconds() / 60
+
+            shift_drive_minutes = shift_drive_minutes + driving_minutes
+            cycle_work_minutes = cycle_work_minutes + driving_minutes
+
+            current_time = drive_end
+
+            continue
+
+            # Drive for 4 hours
+        drive_start = current_time
+        drive_end = current_time + DRIVE_4_HOURS
+        driving_segments.append({
+            "start": drive_start.isoformat(),
+            "end": drive_end.isoformat(),
+            "segment_type": "Driving",
+            "duration": 240
+        })
+
+        driving_minutes = driving_minutes + 240
+
+        # Rest for 30 minutes
+        rest_start = drive_end
+        rest_end = rest_start + REST_30_MINUTES
+        rest_periods.append({
+            "start": rest_start.isoformat(),
+            "end": rest_end.isoformat(),
+            "segment_type": "30-Minute Break",
+            "duration": 30
+        })
+
+        current_time = rest_end
+
+        shift_drive_minutes = shift_drive_minutes + driving_minutes
+        cycle_work_minutes = cycle_work_minutes + driving_minutes + 30
+
+        continue
+
+    timeline = driving_segments + rest_periods
+    timeline.sort(key=lambda x: datetime.fromisoformat(x["start"]))
+
+    return {
+        "timeline": timeline,
+        "driving_segments": driving_segments,
+        "rest_periods": rest_periods,
+    }
+
+
+class ScheduleMemoTests(SimpleTestCase):
+
+    def setUp(self):
+        schedule_memo.clear()
+
+    def test_memo_hit_for_a_parsed_window(self):
+        # parse_and_verify_utc hands back dateutil's tzutc, which cannot be hashed.
+        pickup = parse_and_verify_utc("2024-01-01T08:00:00Z")
+        dropoff = parse_and_verify_utc("2024-01-03T08:00:00Z")
+        driver = DriverHosInformation(driverId="driver", shiftDriveMinutes=120, shiftWorkMinutes=200,
+                                      cycleWorkMinutes=3000)
+        hits = schedule_memo.stats()["hits"]
+
+        timeline = plan_driving_schedule(pickup, dropoff, driver)
+        self.assertIs(plan_driving_schedule(pickup, dropoff, driver), timeline)
+        self.assertEqual(schedule_memo.stats()["hits"], hits + 1)
+
+        # Any change to the HOS counters is a different plan.
+        other = DriverHosInformation(driverId="other", shiftDriveMinutes=121, shiftWorkMinutes=200,
+                                     cycleWorkMinutes=3000)
+        self.assertIsNot(plan_driving_schedule(pickup, dropoff, other), timeline)
+
+    def test_lru_eviction_and_ttl(self):
+        now = [0.0]
+        cache = LRUCache(maxsize=2, ttl=10, clock=lambda: now[0])
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+        now[0] = 9.9
+        self.assertEqual(cache.get("a"), 1)
+        now[0] = 10
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+        self.assertEqual(len(cache), 1)
+
+    def test_cleared_when_the_roster_refreshes(self):
+        pickup = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        driver = DriverHosInformation(driverId="driver", shiftDriveMinutes=0, shiftWorkMinutes=0,
+                                      cycleWorkMinutes=0)
+        plan_driving_schedule(pickup, pickup + timedelta(hours=20), driver)
+        self.assertEqual(len(schedule_memo), 1)
+
+        snapshot_refreshed.send(sender=SimpleTestCase, name='trucks', data=[])
+        self.assertEqual(len(schedule_memo), 1)
+        snapshot_refreshed.send(sender=SimpleTestCase, name='drivers', data={})
+        self.assertEqual(len(schedule_memo), 0)
+
+
+class PlanDrivingScheduleTests(SimpleTestCase):
+
+    def assertMatchesLegacy(self, pickup, dropoff, driver):
+        expected = legacy_plan_driving_schedule(pickup, dropoff, driver)
+        actual = plan_driving_schedule(pickup, dropoff, driver)
+        # Compare the JSON text so that 240 vs 240.0 style differences are caught too.
+        self.assertEqual(actual.to_json(), json.dumps(expected, separators=(',', ':')))
+        self.assertEqual(json.dumps(actual.to_dict()), json.dumps(expected))
+        timeline_only = {"timeline": expected["timeline"]}
+        self.assertEqual(actual.to_json(timeline_only=True), json.dumps(timeline_only, separators=(',', ':')))
+        self.assertEqual(actual.to_dict(timeline_only=True), timeline_only)
+
+    def test_matches_legacy_planner_on_random_trips(self):
+        rng = random.Random(8)
+        for _ in range(3000):
+            pickup = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(
+                minutes=rng.randint(0, 60 * 24 * 30), seconds=rng.choice([0, 0, rng.randint(0, 59)]),
+                microseconds=rng.choice([0, 0, 0, rng.randint(0, 999999)]))
+            dropoff = pickup + timedelta(minutes=rng.choice([
+                rng.randint(0, 600), rng.randint(0, 60 * 48), rng.randint(0, 60 * 24 * 21)
+            ]), seconds=rng.choice([0, rng.randint(0, 59)]))
+            driver = DriverHosInformation(
+                driverId="driver",
+                shiftDriveMinutes=rng.choice([0, rng.randint(0, 700), round(rng.uniform(0, 700), 3)]),
+                shiftWorkMinutes=rng.randint(0, 900),
+                cycleWorkMinutes=rng.choice([0, rng.randint(0, 4400), round(rng.uniform(3800, 4300), 2)]),
+            )
+            with self.subTest(pickup=pickup, dropoff=dropoff, driver=driver):
+                self.assertMatchesLegacy(pickup, dropoff, driver)
+
+    def test_boundary_windows(self):
+        pickup = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        driver = DriverHosInformation(driverId="driver", shiftDriveMinutes=0, shiftWorkMinutes=0,
+                                      cycleWorkMinutes=0)
+        for minutes in (0, 1, 239, 240, 241, 270, 329, 330, 450, 600, 660, 1080, 1380, 1800, 2040, 20160):
+            with self.subTest(minutes=minutes):
+                self.assertMatchesLegacy(pickup, pickup + timedelta(minutes=minutes), driver)
+
+    def test_timestamps_keep_the_pickup_time_zone(self):
+        driver = DriverHosInformation(driverId="driver", shiftDriveMinutes=30, shiftWorkMinutes=0,
+                                      cycleWorkMinutes=4000)
+        for tzinfo in (None, timezone(timedelta(hours=-5)), timezone(timedelta(hours=5, minutes=30))):
+            pickup = datetime(2024, 2, 28, 22, 15, 7, 250, tzinfo=tzinfo)
+            with self.subTest(tzinfo=tzinfo):
+                self.assertMatchesLegacy(pickup, pickup + timedelta(days=4, minutes=17), driver)
+
+    def test_memoizes_dateutil_parsed_windows(self):
+        driver = DriverHosInformation(driverId="driver", shiftDriveMinutes=10, shiftWorkMinutes=10,
+                                      cycleWorkMinutes=10)
+        pickup, dropoff = parse_and_verify_utc("2024-01-01T00:00:00Z"), parse_and_verify_utc("2024-01-03T00:00:00Z")
+        self.assertIs(plan_driving_schedule(pickup, dropoff, driver), plan_driving_schedule(pickup, dropoff, driver))
+
+    def test_dropoff_before_pickup_is_empty(self):
+        pickup = datetime(2024, 1, 2, tzinfo=timezone.utc)
+        driver = DriverHosInformation(driverId="driver", shiftDriveMinutes=10, shiftWorkMinutes=10,
+                                      cycleWorkMinutes=10)
+        self.assertEqual(plan_driving_schedule(pickup, pickup - timedelta(hours=1), driver).to_dict(),
+                         {"timeline": [], "driving_segments": [], "rest_periods": []})
+
+
+class FastJSONRendererTests(SimpleTestCase):
+
+    def test_matches_drf_renderer(self):
+        data = {
+            "trucks": make_roster(50),
+            "at": datetime(2024, 1, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+            "day": datetime(2024, 1, 1).date(),
+            "amount": Decimal("12.50"),
+            "name": "Jos\u00e9 \u2028 \U0001F69A",
+            "ids": (1, 2, 3),
+            "nothing": None,
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(json.loads(dumps(data)), json.loads(JSONRenderer().render(data)))
+
+        # Integers orjson cannot hold fall back to the stdlib encoder.
+        data["big"] = 2 ** 70
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class EarliestArrivalTests(SimpleTestCase):
+
+    def walk_arrival(self, driver, driving_minutes):
+        # Reference: walk the open-ended plan one segment at a time.
+        remaining = timedelta(minutes=driving_minutes) // timedelta(microseconds=1)
+        if remaining <= 0:
+            return 0
+        for segment_type, start, end, _ in iter_segments(driver.shift_drive_minutes, driver.cycle_work_minutes):
+            if segment_type == SegmentType.DRIVING:
+                if end - start >= remaining:
+                    return start + remaining
+                remaining -= end - start
+
+    def test_skipping_reset_periods_matches_walking_the_plan(self):
+        rng = random.Random(12)
+        for _ in range(500):
+            driver = DriverHosInformation(driverId="driver", shiftDriveMinutes=rng.randint(0, 700),
+                                          cycleWorkMinutes=rng.choice([0, rng.randint(0, 4400)]))
+            driving_minutes = rng.choice([rng.randint(0, 600), rng.randint(0, 60 * 200),
+                                          round(rng.uniform(0, 9000), 2)])
+            with self.subTest(driver=driver, driving_minutes=driving_minutes):
+                self.assertEqual(
+                    earliest_arrival_offset(driver.shift_drive_minutes, driver.cycle_work_minutes, driving_minutes),
+                    self.walk_arrival(driver, driving_minutes))
+
+    def test_schedule_drives_exactly_the_requested_minutes(self):
+        pickup = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        driver = DriverHosInformation(driverId="driver", shiftDriveMinutes=500, cycleWorkMinutes=3900)
+        for driving_minutes in (0, 100, 160, 161, 1000, 5000):
+            with self.subTest(driving_minutes=driving_minutes):
+                arrival, timeline = earliest_arrival(pickup, driving_minutes, driver)
+                self.assertAlmostEqual(timeline.driving_minutes(), driving_minutes)
+                self.assertEqual(timeline.end or pickup, arrival)
+
+    def test_ranks_drivers_by_arrival(self):
+        pickup = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        rested = DriverHosInformation(driverId="rested", shiftDriveMinutes=0, cycleWorkMinutes=0)
+        tired = DriverHosInformation(driverId="tired", shiftDriveMinutes=650, cycleWorkMinutes=1000)
+        out_of_cycle = DriverHosInformation(driverId="out-of-cycle", shiftDriveMinutes=0, cycleWorkMinutes=4200)
+
+        ranking = rank_by_earliest_arrival([out_of_cycle, tired, rested], pickup, 120)
+
+        self.assertEqual([driver.driver_id for driver, _ in ranking], ["rested", "tired", "out-of-cycle"])
+        self.assertEqual(ranking[0][1], pickup + timedelta(minutes=120))
+
+
+class DriveTimeIndexTests(SimpleTestCase):
+
+    def assertMatchesScan(self, index, roster):
+        entries = {item["driverId"]: driver_availability(DriverHosInformation(**item)) for item in roster.values()}
+        for measure in MEASURES:
+            for minutes in (-100, 0, 30, 240, 360, 600):
+                expected = sorted((entry[measure], driver_id) for driver_id, entry in entries.items()
+                                  if entry[measure] >= minutes)
+                actual = [driver_id for driver_id, _ in index.at_least(minutes, measure)]
+                self.assertEqual(actual, [driver_id for _, driver_id in reversed(expected)])
+
+    def test_incremental_updates_match_a_full_scan(self):
+        roster = {item["driverId"]: item for item in make_roster(500, seed=13)}
+        index = DriveTimeIndex()
+        index.update(roster)
+        self.assertMatchesScan(index, roster)
+
+        rng = random.Random(13)
+        for _ in range(5):
+            roster = dict(roster)
+            for driver_id in rng.sample(sorted(roster), 20):
+                roster[driver_id] = {**roster[driver_id], "shiftDriveMinutes": rng.randint(0, 700)}
+            for driver_id in rng.sample(sorted(roster), 3):
+                del roster[driver_id]
+            roster["new-" + str(rng.random())] = {"driverId": "new", "shiftDriveMinutes": 0}
+            roster = {driver_id: {**item, "driverId": driver_id} for driver_id, item in roster.items()}
+
+            recomputed = index.stats()["recomputed"]
+            index.update(roster)
+            self.assertLessEqual(index.stats()["recomputed"] - recomputed, 21)
+            self.assertMatchesScan(index, roster)
+
+    def test_limit_keeps_the_drivers_with_the_most_time(self):
+        roster = {
+            "a": {"driverId": "a", "shiftDriveMinutes": 600, "shiftWorkMinutes": 0, "cycleWorkMinutes": 0},
+            "b": {"driverId": "b", "shiftDriveMinutes": 0, "shiftWorkMinutes": 0, "cycleWorkMinutes": 0},
+            "c": {"driverId": "c", "shiftDriveMinutes": 300, "shiftWorkMinutes": 0, "cycleWorkMinutes": 0},
+        }
+        index = DriveTimeIndex()
+        index.update(roster)
+
+        self.assertEqual([driver_id for driver_id, _ in index.at_least(0, 'drive', limit=2)], ["b", "c"])
+        self.assertEqual([driver_id for driver_id, _ in index.at_least(361, 'drive')], ["b"])
+        self.assertEqual(index.get("c")["break"], 240)
+
+    def test_malformed_rows_keep_the_last_good_entry(self):
+        roster = {
+            "a": {"driverId": "a", "shiftDriveMinutes": 600, "shiftWorkMinutes": 0, "cycleWorkMinutes": 0},
+            "b": {"driverId": "b", "shiftDriveMinutes": 0, "shiftWorkMinutes": 0, "cycleWorkMinutes": 0},
+        }
+        index = DriveTimeIndex()
+        index.update(roster)
+
+        index.update({**roster, "a": {**roster["a"], "shiftDriveMinutes": "n/a"},
+                      "c": {"driverId": "c", "shiftDriveMinutes": 300, "cycleWorkMinutes": []}})
+        self.assertEqual(index.get("a")["drive"], 60)
+        self.assertIsNone(index.get("c"))
+        self.assertEqual(len(index), 2)
+
+        index.update({**roster, "a": {**roster["a"], "shiftDriveMinutes": 630}})
+        self.assertEqual(index.get("a")["drive"], 30)
+
+    def test_a_malformed_row_does_not_fail_the_roster_refresh(self):
+        roster = {
+            "a": {"driverId": "a", "shiftDriveMinutes": 600, "shiftWorkMinutes": 0, "cycleWorkMinutes": 0},
+            "bad": {"driverId": "bad", "shiftDriveMinutes": "n/a"},
+        }
+        drivers_snapshot._store(roster)
+        self.addCleanup(drivers_snapshot.invalidate)
+
+        self.assertEqual(drivers_snapshot.peek(), roster)
+        self.assertEqual(drive_time_index.get("a")["drive"], 60)
+        self.assertIsNone(drive_time_index.get("bad"))
+
+    def test_looks_drivers_up_by_truck(self):
+        roster = {
+            "a": {"driverId": "a", "truckName": "t1", "shiftDriveMinutes": 600},
+            "b": {"driverId": "b", "truckName": "t2", "shiftDriveMinutes": 0},
+        }
+        index = DriveTimeIndex()
+        index.update(roster)
+        self.assertEqual(index.for_truck("t1")[0], "a")
+
+        # Drivers swap trucks and one leaves the roster.
+        index.update({"a": {**roster["a"], "truckName": "t2"}})
+        self.assertEqual(index.for_truck("t2"), ("a", index.get("a")))
+        self.assertIsNone(index.for_truck("t1"))
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(h))
+
+
+class TruckLocationIndexTests(SimpleTestCase):
+
+    def make_trucks(self, count, seed=0):
+        rng = random.Random(seed)
+        trucks = [{"name": f"truck-{i}", "lat": rng.uniform(25, 49), "lng": rng.uniform(-124, -67)}
+                  for i in range(count)]
+        # Around the antimeridian and a pole too, where latitude/longitude boxes go wrong.
+        trucks += [{"name": f"edge-{i}", "lat": rng.uniform(-89.9, 89.9), "lng": rng.choice([-179.9, 179.9])}
+                   for i in range(count // 10)]
+        return trucks + [{"name": "unplaced", "lat": None, "lng": None}]
+
+    def test_matches_brute_force(self):
+        trucks = self.make_trucks(3000)
+        located = trucks[:-1]
+        lat = np.array([truck["lat"] for truck in located])
+        lng = np.array([truck["lng"] for truck in located])
+        index = TruckLocationIndex(leaf_size=8)
+        index.update(trucks)
+        self.assertEqual(len(index), len(located))
+
+        rng = random.Random(3)
+        for _ in range(100):
+            point = (rng.uniform(-90, 90), rng.choice([rng.uniform(-180, 180), 180, -180]))
+            distances = haversine_km(*point, lat, lng)
+            radius = rng.choice([0, 10, 250, 2000])
+            k = rng.choice([1, 7, 40])
+            with self.subTest(point=point, radius=radius, k=k):
+                expected = sorted(np.flatnonzero(distances <= radius), key=lambda i: (distances[i], i))
+                actual = index.within(*point, radius)
+                self.assertEqual([truck["name"] for truck, _ in actual], [located[i]["name"] for i in expected])
+
+                expected = np.argsort(distances, kind='stable')[:k]
+                actual = index.nearest(*point, k)
+                np.testing.assert_allclose([distance for _, distance in actual], distances[expected], atol=1e-6)
+
+    def test_nearest_view_joins_remaining_drive_time(self):
+        trucks_snapshot._store([
+            {"name": "near", "lat": 41.88, "lng": -87.63, "speed": 0, "timeStamp": "2024-01-01T00:00:00Z"},
+            {"name": "far", "lat": 34.05, "lng": -118.24, "speed": 55, "timeStamp": "2024-01-01T00:00:00Z"},
+        ])
+        drivers_snapshot._store({"d1": {"driverId": "d1", "truckName": "near", "shiftDriveMinutes": 60,
+                                        "shiftWorkMinutes": 60, "cycleWorkMinutes": 60}})
+        try:
+            response = self.client.get('/api/v1/trucks/nearest/', {'lat': 41.9, 'lng': -87.6, 'k': 5})
+            results = response.json()
+            self.assertEqual([truck["name"] for truck in results], ["near", "far"])
+            self.assertEqual(results[0]["driver_id"], "d1")
+            self.assertEqual(results[0]["remaining_minutes"]["drive"], 600)
+            self.assertIsNone(results[1]["remaining_minutes"])
+
+            response = self.client.get('/api/v1/trucks/within/', {'lat': 41.9, 'lng': -87.6, 'radius_km': 10})
+            self.assertEqual([truck["name"] for truck in response.json()], ["near"])
+            self.assertEqual(self.client.get('/api/v1/trucks/nearest/', {'lat': 91, 'lng': 0}).status_code, 400)
+        finally:
+            trucks_snapshot.invalidate()
+            drivers_snapshot.invalidate()
+
+
+@override_settings(SCHEDULE_BATCH_MIN_PARALLEL=1)
+class BatchPlannerTests(SimpleTestCase):
+
+    def setUp(self):
+        schedule_memo.clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutdown_executor()
+        super().tearDownClass()
+
+    def make_requests(self, count, seed=11):
+        rng = random.Random(seed)
+        requests = []
+        for _ in range(count):
+            pickup = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=rng.randint(0, 60 * 24 * 7))
+            driver = DriverHosInformation(driverId="driver", shiftDriveMinutes=rng.randint(0, 700),
+                                          shiftWorkMinutes=0, cycleWorkMinutes=rng.randint(0, 4400))
+            requests.append((driver, pickup, pickup + timedelta(minutes=rng.randint(0, 60 * 24 * 10))))
+        return requests
+
+    def test_pool_results_match_serial_planning_in_input_order(self):
+        requests = self.make_requests(200)
+        requests += requests[:20]
+
+        outcomes = plan_driving_schedules(requests, workers=2, chunksize=7)
+
+        self.assertEqual(len(outcomes), len(requests))
+        for (driver, pickup, dropoff), (timeline, error) in zip(requests, outcomes):
+            self.assertIsNone(error)
+            schedule_memo.clear()
+            self.assertEqual(timeline.to_json(), plan_driving_schedule(pickup, dropoff, driver).to_json())
+
+    def test_errors_stay_with_their_item(self):
+        requests = self.make_requests(3)
+        driver, pickup, dropoff = requests[1]
+        requests[1] = (driver, pickup, dropoff.replace(tzinfo=None))
+
+        outcomes = plan_driving_schedules(requests, workers=2)
+
+        self.assertIsNotNone(outcomes[0][0])
+        self.assertIsNone(outcomes[1][0])
+        self.assertIn("TypeError", outcomes[1][1])
+        self.assertIsNotNone(outcomes[2][0])
+
+    def test_view_reports_bad_items_in_place(self):
+        drivers_snapshot._store({"d1": {"driverId": "d1", "shiftDriveMinutes": 0, "shiftWorkMinutes": 0,
+                                        "cycleWorkMinutes": 0}})
+        self.addCleanup(drivers_snapshot.invalidate)
+        window = {"start": "2024-01-01T08:00:00Z", "end": "2024-01-01T12:00:00Z"}
+        items = [{"driver_id": "d1", **window}, {"driver_id": ["d1"], **window}, {"driver_id": {"id": "d1"}, **window},
+                 {"driver_id": "nobody", **window}, "d1"]
+
+        response = self.client.post('/api/v1/drivers/hos/batch/', {"items": items}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)["results"]
+        self.assertIn("suggested_schedule", results[0])
+        self.assertEqual([result.get("error") for result in results[1:]], [
+            "driver_id must be a string", "driver_id must be a string", "Driver not found", "Item must be an object"])
+        self.assertEqual(results[1]["driver_id"], ["d1"])
+
+    def test_view_keeps_a_malformed_driver_to_its_own_items(self):
+        drivers_snapshot._store({"d1": {"driverId": "d1", "shiftDriveMinutes": 0, "shiftWorkMinutes": 0,
+                                        "cycleWorkMinutes": 0},
+                                 "bad": {"driverId": "bad", "shiftDriveMinutes": "n/a"}})
+        self.addCleanup(drivers_snapshot.invalidate)
+        window = {"start": "2024-01-01T08:00:00Z", "end": "2024-01-01T12:00:00Z"}
+        items = [{"driver_id": "bad", **window}, {"driver_id": "d1", **window}, {"driver_id": "bad", **window}]
+
+        response = self.client.post('/api/v1/drivers/hos/batch/', {"items": items}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)["results"]
+        self.assertEqual([result.get("error") for result in results],
+                         ["Driver data is malformed", None, "Driver data is malformed"])
+        self.assertIn("suggested_schedule", results[1])
+
+
+class StubDutyStatusHandler(BaseHTTPRequestHandler):
+    # Serves a token and the pages in ``server.pages``, keyed by the requested lastTimestamp cursor.
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload):
+        body = json.dumps(payload, indent=1).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._send_json({"access_token": "token", "expires_in": 3600})
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        cursor = query.get('lastTimestamp', [None])[0]
+        self.server.requested.append(cursor)
+        self._send_json(self.server.pages[cursor])
+
+
+class DutyStatusHistoryTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubDutyStatusHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{cls.server.server_port}"
+        cls.prologs = ProLogsClient(base_url, f"{base_url}/token", max_retries=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.prologs.close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.pages = {}
+        self.server.requested = []
+
+    def open_stream(self, driver_id, cursor):
+        return self.prologs.iter_paginated(f"/drivers/{driver_id}/dutystatus", cursor=cursor, prefetch=3,
+                                          chunk_size=50, decode=lambda item: DriverDutyStatus(**item))
+
+    def serve(self, entries, page_size):
+        cursor = None
+        for offset in range(0, len(entries), page_size):
+            chunk = entries[offset:offset + page_size]
+            last = chunk[-1]["startTime"]
+            self.server.pages[cursor] = {"hasMore": offset + page_size < len(entries), "list": chunk,
+                                         "lastTimestamp": last}
+            cursor = last
+        self.server.pages[cursor] = {"list": [], "hasMore": False, "lastTimestamp": cursor}
+
+    def make_entries(self, start, count, step_minutes=90):
+        statuses = ["D", "ON", "OFF", "SB"]
+        return [
+            {"startTime": (start + timedelta(minutes=step_minutes * i)).isoformat().replace("+00:00", "Z"),
+             "dutyStatus": statuses[i % 4], "location": None}
+            for i in range(count)
+        ]
+
+    def test_streams_items_across_pages(self):
+        entries = self.make_entries(datetime(2024, 1, 1, tzinfo=timezone.utc), 25)
+        self.serve(entries, 10)
+
+        stream = self.open_stream("d1", None)
+        self.assertEqual([entry.startTime for entry in stream], [entry["startTime"] for entry in entries])
+        self.assertEqual(stream.cursor, entries[-1]["startTime"])
+        self.assertEqual(self.server.requested, [None, entries[9]["startTime"], entries[19]["startTime"]])
+
+    def test_ingests_pages_and_resumes_from_the_cursor(self):
+        entries = self.make_entries(datetime(2024, 1, 1, tzinfo=timezone.utc), 25)
+        self.serve(entries, 10)
+
+        self.assertEqual(ingest_duty_status("d1", self.open_stream, max_pages=2), 20)
+        self.assertEqual(DutyStatusRecord.objects.filter(driver_id="d1").count(), 20)
+        self.assertEqual(DutyStatusCursor.objects.get(driver_id="d1").last_timestamp, entries[19]["startTime"])
+
+        self.assertEqual(ingest_duty_status("d1", self.open_stream), 5)
+        self.assertEqual(DutyStatusRecord.objects.filter(driver_id="d1").count(), 25)
+        self.assertEqual(DutyStatusCursor.objects.get(driver_id="d1").last_timestamp, entries[-1]["startTime"])
+
+        self.assertEqual(ingest_duty_status("d1", self.open_stream), 0)
+
+    def test_reingesting_overlapping_entries_skips_duplicates(self):
+        entries = self.make_entries(datetime(2024, 1, 1, tzinfo=timezone.utc), 5)
+        self.serve(entries, 10)
+        ingest_duty_status("d1", self.open_stream)
+        DutyStatusCursor.objects.filter(driver_id="d1").update(last_timestamp=None)
+        ingest_duty_status("d1", self.open_stream)
+        self.assertEqual(DutyStatusRecord.objects.filter(driver_id="d1").count(), 5)
+
+    def test_range_queries_include_the_entry_in_effect(self):
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        entries = self.make_entries(start, 300)
+        self.serve(entries, 100)
+        ingest_duty_status("d1", self.open_stream)
+        self.server.pages = {}
+        self.serve(entries[:3], 100)
+        ingest_duty_status("d2", self.open_stream)
+
+        window = duty_status_history("d1", start + timedelta(minutes=100), start + timedelta(minutes=400))
+        self.assertEqual([record.start_time for record in window],
+                         [start + timedelta(minutes=minutes) for minutes in (90, 180, 270, 360)])
+
+        cycle = cycle_history("d1", start + timedelta(days=10))
+        self.assertEqual(cycle[0].start_time, start + timedelta(days=2))
+        self.assertTrue(all(record.driver_id == "d1" for record in cycle))
+        self.assertEqual(duty_status_history("d2", start - timedelta(days=1), start), [])
+
+
+def brute_force_window_on_duty(statuses, at, days):
+    # statuses: sorted (epoch seconds, status); each lasts until the next, the last until ``at``.
+    intervals = [(start, statuses[i + 1][0] if i + 1 < len(statuses) else at, status)
+                 for i, (start, status) in enumerate(statuses) if start < at]
+    intervals = [(start, min(end, at), status) for start, end, status in intervals]
+
+    restart = None
+    off_start = None
+    for start, end, status in intervals:
+        if status in ("D", "ON", "YM"):
+            off_start = None
+            continue
+        off_start = start if off_start is None else off_start
+        if end - off_start >= 34 * 3600:
+            restart = off_start + 34 * 3600
+
+    window_start = at - days * 86400
+    if restart is not None:
+        window_start = max(window_start, restart)
+    return sum(max(0, min(end, at) - max(start, window_start))
+               for start, end, status in intervals if status in ("D", "ON", "YM"))
+
+
+class TruckStreamTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubDutyStatusHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{cls.server.server_port}"
+        cls.prologs = ProLogsClient(base_url, f"{base_url}/token", max_retries=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.prologs.close()
+        super().tearDownClass()
+
+    def tearDown(self):
+        trucks_snapshot.invalidate()
+
+    def make_trucks(self, count):
+        return [
+            {"name": f"truck-{i}", "location": None, "lat": 30.5 + i / 1000, "lng": -97.25 - i / 1000,
+             "speed": i % 70, "timeStamp": "2024-01-01T00:00:00Z", "odometer": 1000 + i}
+            for i in range(count)
+        ]
+
+    def test_iter_json_items_across_chunk_boundaries(self):
+        trucks = self.make_trucks(20)
+        body = json.dumps(trucks, indent=1).encode()
+        for size in (1, 7, 64, len(body)):
+            chunks = [body[offset:offset + size] for offset in range(0, len(body), size)]
+            with self.subTest(size=size):
+                self.assertEqual(list(iter_json_items(chunks)), trucks)
+        self.assertEqual(list(iter_json_items([b' [ ', b'] '])), [])
+
+    def test_large_element_over_many_chunks_is_decoded_a_few_times(self):
+        class CountingDecoder(json.JSONDecoder):
+            calls = 0
+
+            def raw_decode(self, s, idx=0):
+                CountingDecoder.calls += 1
+                return super().raw_decode(s, idx)
+
+        element = {"name": "big", "history": self.make_trucks(300)}
+        body = json.dumps([element, 1.5e3]).encode()
+        reader = _JsonReader(body[offset:offset + 16] for offset in range(0, len(body), 16))
+        reader._json = CountingDecoder()
+
+        reader.expect('[')
+        self.assertEqual(reader.value(), element)
+        reader.expect(',')
+        self.assertEqual(reader.value(), 1.5e3)
+        reader.expect(']')
+        self.assertGreater(len(body) // 16, 2000)
+        self.assertLess(CountingDecoder.calls, 30)
+
+    def test_iter_items_streams_upstream_array(self):
+        trucks = self.make_trucks(500)
+        self.server.pages = {None: trucks}
+        self.server.requested = []
+        self.assertEqual(list(self.prologs.iter_items("/trucks/", chunk_size=100)), trucks)
+
+    def test_ndjson_with_field_projection(self):
+        trucks = self.make_trucks(250)
+        trucks_snapshot._store(trucks)
+
+        response = self.client.get('/api/v1/trucks/', {'format': 'ndjson', 'fields': 'name,lat,lng'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines],
+                         [{"name": truck["name"], "lat": truck["lat"], "lng": truck["lng"]} for truck in trucks])
+
+        response = self.client.get('/api/v1/trucks/', {'format': 'ndjson', 'fields': 'name,odometer'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_ndjson_and_json_return_the_same_trucks(self):
+        trucks = self.make_trucks(4)
+        del trucks[1]["timeStamp"]
+        del trucks[2]["lat"], trucks[2]["lng"]
+        del trucks[3]["speed"], trucks[3]["location"]
+        trucks_snapshot._store(trucks)
+
+        listed = self.client.get('/api/v1/trucks/', {'format': 'json'}).json()
+        response = self.client.get('/api/v1/trucks/', {'format': 'ndjson'})
+        streamed = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual([truck["name"] for truck in streamed], [truck["name"] for truck in listed])
+        self.assertEqual(streamed[2], {"name": "truck-2", "location": None, "lat": None, "lng": None, "speed": 2,
+                                       "timeStamp": "2024-01-01T00:00:00Z"})
+
+
+class CycleEngineTests(SimpleTestCase):
+
+    def random_log(self, rng, count):
+        now = 1_700_000_000
+        statuses = []
+        for _ in range(count):
+            now += rng.choice([rng.randint(1, 600) * 60, rng.randint(1, 40) * 3600])
+            statuses.append((now, rng.choice(["D", "ON", "OFF", "SB", "PC", "YM"])))
+        return statuses
+
+    def test_window_totals_match_brute_force(self):
+        rng = random.Random(16)
+        for _ in range(200):
+            statuses = self.random_log(rng, rng.randint(1, 60))
+            engine = CycleEngine()
+            for start, status in statuses:
+                engine.append(start, status)
+            for _ in range(5):
+                at = rng.uniform(statuses[0][0] - 3600, statuses[-1][0] + 3 * 86400)
+                # The brute force only considers the log up to ``at``, so compare where nothing follows it.
+                if at < statuses[-1][0]:
+                    continue
+                for days in (7, 8):
+                    with self.subTest(statuses=statuses, at=at, days=days):
+                        self.assertAlmostEqual(engine.window_on_duty(at, days),
+                                               brute_force_window_on_duty(statuses, at, days), places=3)
+
+    def test_rolling_scan_matches_point_queries(self):
+        rng = random.Random(17)
+        for _ in range(100):
+            statuses = self.random_log(rng, rng.randint(1, 80))
+            until = statuses[-1][0] + rng.randint(0, 3 * 86400)
+            incremental = CycleEngine()
+            prefix = []
+            for start, status in statuses:
+                incremental.append(start, status)
+                prefix.append((start, status))
+                at = start
+                with self.subTest(statuses=prefix):
+                    self.assertAlmostEqual(incremental.window_on_duty(at, 8),
+                                           brute_force_window_on_duty(prefix, at, 8), places=3)
+
+            for at, total in incremental.iter_rolling_on_duty(8, until):
+                truncated = [(start, status) for start, status in statuses if start <= at]
+                with self.subTest(statuses=statuses, at=at):
+                    self.assertAlmostEqual(total, brute_force_window_on_duty(truncated, at, 8), places=3)
+
+    def test_restart_clears_the_cycle(self):
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        engine = CycleEngine()
+        engine.extend([(start, "D"), (start + timedelta(hours=10), "OFF"), (start + timedelta(hours=44), "D")])
+
+        totals = engine.totals(start + timedelta(hours=46))
+        self.assertEqual(totals["70/8"]["on_duty_minutes"], 120)
+        self.assertEqual(totals["last_restart"], start + timedelta(hours=44))
+
+        totals = engine.totals(start + timedelta(hours=43))
+        self.assertEqual(totals["70/8"]["on_duty_minutes"], 600)
+        self.assertEqual(totals["off_duty_minutes"], 0)
+
+
+class CycleHistoryTests(TestCase):
+
+    def test_loads_engines_from_local_history(self):
+        rng = random.Random(18)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        at = start + timedelta(days=12)
+        for driver_id in ("d1", "d2", "d3"):
+            moment = start
+            records = []
+            while moment < at + timedelta(days=1):
+                records.append(DutyStatusRecord(driver_id=driver_id, start_time=moment,
+                                                duty_status=rng.choice(["D", "ON", "OFF", "SB"])))
+                moment += timedelta(minutes=rng.randint(30, 600))
+            DutyStatusRecord.objects.bulk_create(records)
+
+        engines = load_cycle_engines(None, at)
+
+        self.assertEqual(sorted(engines), ["d1", "d2", "d3"])
+        for driver_id, engine in engines.items():
+            expected = CycleEngine.from_records(cycle_history(driver_id, at))
+            reference = CycleEngine.from_records(DutyStatusRecord.objects.filter(driver_id=driver_id,
+                                                                                 start_time__lt=at))
+            with self.subTest(driver_id=driver_id):
+                self.assertEqual(engine.totals(at), expected.totals(at))
+                self.assertAlmostEqual(engine.totals(at)["60/7"]["on_duty_minutes"],
+                                       reference.totals(at)["60/7"]["on_duty_minutes"])
+
+    def test_off_duty_stretch_begun_before_the_window_counts_towards_a_restart(self):
+        at = datetime(2024, 1, 10, 12, tzinfo=timezone.utc)
+        window_start = at - timedelta(days=8)
+        DutyStatusRecord.objects.bulk_create([
+            DutyStatusRecord(driver_id="d1", start_time=window_start - timedelta(hours=30), duty_status="D"),
+            DutyStatusRecord(driver_id="d1", start_time=window_start - timedelta(hours=20), duty_status="OFF"),
+            DutyStatusRecord(driver_id="d1", start_time=window_start + timedelta(hours=20), duty_status="D"),
+            DutyStatusRecord(driver_id="d2", start_time=window_start - timedelta(hours=10), duty_status="SB"),
+        ])
+
+        engines = load_cycle_engines(None, at)
+
+        restart = window_start + timedelta(hours=14)
+        self.assertEqual(engines["d1"].totals(at)["last_restart"], restart)
+        self.assertEqual(engines["d1"].totals(at)["70/8"]["on_duty_minutes"],
+                         (at - restart).total_seconds() / 60 - 6 * 60)
+        self.assertEqual(engines["d2"].totals(at)["restart_complete_at"], window_start + timedelta(hours=24))
+        self.assertEqual(engines["d2"].totals(at)["off_duty_minutes"], (8 * 24 + 10) * 60)
+
+
+class TrackStoreTests(SimpleTestCase):
+    DAY = 86400
+    # 2024-01-01T00:00:00Z
+    EPOCH = 1704067200
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.now = float(self.EPOCH)
+        self.store = TrackStore(self.directory.name, raw_days=2, step=300, retention_days=5, flush_interval=600,
+                                chunk_size=50, clock=lambda: self.now)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def stamp(self, seconds):
+        return datetime.fromtimestamp(self.EPOCH + seconds, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def test_columns_round_trip_through_the_narrowest_type(self):
+        for values in ([5], [0, 1, -1, 100], [0, 300, -40000], [0, 2 ** 40, -(2 ** 40)]):
+            encoded = encode_column(np.array(values, dtype=np.int64))
+            decoded, end = decode_column(encoded, 0, len(values))
+            self.assertEqual(decoded.tolist(), values)
+            self.assertEqual(end, len(encoded))
+        self.assertEqual(len(encode_column(np.arange(0, 1000, 30))), 9 + 33)
+
+    def test_records_new_positions_and_answers_track_queries(self):
+        for minute in range(120):
+            self.now = self.EPOCH + minute * 60
+            # Truck a reports every minute; truck b only every other one, and repeats itself in between.
+            self.store.record([
+                {"name": "a", "lat": 41.0 + minute / 1000, "lng": -87.0, "speed": minute % 70,
+                 "timeStamp": self.stamp(minute * 60)},
+                {"name": "b", "lat": 30.0, "lng": -97.0, "timeStamp": self.stamp(minute // 2 * 120)},
+                {"name": "c", "lat": None, "lng": None, "timeStamp": self.stamp(0)},
+            ])
+        stats = self.store.stats()
+        self.assertEqual((stats["points"], stats["unchanged"], stats["skipped"]), (180, 60, 120))
+
+        track = self.store.track("a", self.EPOCH + 600, self.EPOCH + 1200)
+        points = track_points(track)
+        self.assertEqual(len(points), 11)
+        self.assertEqual(points[0], {"timeStamp": "2024-01-01T00:10:00Z", "lat": 41.01, "lng": -87.0, "speed": 10})
+        self.assertIsNone(track_points(self.store.track("b", self.EPOCH, self.EPOCH))[0]["speed"])
+        self.assertEqual(len(self.store.track("a", self.EPOCH, self.EPOCH + 7200, step=600)[0]), 12)
+
+        # Another process sees what was written out, but not the open buffers.
+        self.store.flush()
+        reader = TrackStore(self.directory.name, raw_days=2, step=300, retention_days=5)
+        self.assertEqual(len(reader.track("a", self.EPOCH, self.EPOCH + 7200)[0]), 120)
+        self.assertEqual(reader.track("a", self.EPOCH, self.EPOCH + 7200)[1].tolist(),
+                         self.store.track("a", self.EPOCH, self.EPOCH + 7200)[1].tolist())
+
+    def test_old_days_are_downsampled_then_deleted(self):
+        reader = TrackStore(self.directory.name, raw_days=2, step=300, retention_days=5)
+        for minute in range(0, 3 * 24 * 60, 1):
+            self.now = self.EPOCH + minute * 60
+            self.store.record([{"name": "a", "lat": 41.0, "lng": -87.0 + minute / 10000,
+                                "timeStamp": self.stamp(minute * 60)}])
+        self.store.flush()
+        self.assertEqual(len(reader.track("a", self.EPOCH, self.EPOCH + self.DAY - 1)[0]), 24 * 60)
+
+        self.store.maintain(self.EPOCH + 3 * self.DAY)
+        day_one = reader.track("a", self.EPOCH, self.EPOCH + self.DAY - 1)
+        self.assertEqual(len(day_one[0]), 24 * 12)
+        self.assertTrue((np.diff(day_one[0]) == 300).all())
+        self.assertEqual(len(reader.track("a", self.EPOCH + self.DAY, self.EPOCH + 3 * self.DAY)[0]), 2 * 24 * 60)
+        # Each day was rewritten into full chunks once over (by the hourly maintenance while recording for the
+        # first two), before the first was downsampled.
+        self.assertEqual(self.store.stats()["days_merged"], 3)
+        self.assertEqual(len(reader._chunks["a"]), 6 + 2 * 29)
+
+        self.store.maintain(self.EPOCH + 6 * self.DAY)
+        self.assertEqual(len(reader.track("a", self.EPOCH, self.EPOCH + self.DAY - 1)[0]), 0)
+        self.assertEqual(len(reader.track("a", self.EPOCH, self.EPOCH + 3 * self.DAY)[0]), 2 * 24 * 12)
+
+    def test_track_endpoint(self):
+        self.store.record([{"name": "truck 1", "lat": 41.5, "lng": -87.5, "speed": 55, "timeStamp": self.stamp(0)}])
+        directory, track_store.directory = track_store.directory, self.store.directory
+        self.store.flush()
+        try:
+            response = self.client.get('/api/v1/trucks/truck 1/track/',
+                                       {'start': self.stamp(0), 'end': self.stamp(60)})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["points"],
+                             [{"timeStamp": "2024-01-01T00:00:00Z", "lat": 41.5, "lng": -87.5, "speed": 55}])
+            response = self.client.get('/api/v1/trucks/truck 1/track/', {'start': self.stamp(60),
+                                                                         'end': self.stamp(0)})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(self.client.get('/api/v1/trucks/a/track/', {'step': 'x'}).status_code, 400)
+        finally:
+            track_store.directory = directory
+
+
+class SnapshotStoreTests(TestCase):
+
+    def test_save_replaces_the_stored_snapshot(self):
+        roster = {item["driverId"]: item for item in make_roster(300, seed=23)}
+        self.assertEqual(driver_store.save(roster, fetched_at=time.time() - 60), 300)
+
+        roster = dict(roster)
+        roster["driver-7"] = {**roster["driver-7"], "dutyStatus": "SB", "truckName": "truck-x"}
+        del roster["driver-8"]
+        roster["driver-new"] = {"driverId": "driver-new"}
+        driver_store.save(roster)
+
+        fetched_at, stored = driver_store.load(max_age=60)
+        self.assertAlmostEqual(fetched_at, time.time(), delta=5)
+        self.assertEqual(stored, roster)
+        self.assertEqual(list(stored), list(roster))
+        self.assertEqual(DriverSnapshot.objects.count(), 300)
+        self.assertEqual(DriverSnapshot.objects.get(truck_name="truck-x").driver_id, "driver-7")
+
+    def test_trucks_keep_order_and_skip_unnamed(self):
+        trucks = [{"name": "b", "lat": 1.0, "lng": 2.0}, {"name": None, "lat": 0.0},
+                  {"name": "a", "lat": 3.0, "lng": 4.0, "timeStamp": "2024-01-01T00:00:00Z"},
+                  {"name": "b", "lat": 5.0, "lng": 6.0}]
+        self.assertEqual(truck_store.save(trucks), 2)
+        self.assertEqual(truck_store.load(max_age=60)[1], [{"name": "b", "lat": 5.0, "lng": 6.0}, trucks[2]])
+
+    def test_old_snapshots_are_not_loaded(self):
+        truck_store.save([{"name": "a"}], fetched_at=time.time() - 120)
+        self.assertEqual(truck_store.load(max_age=60), (None, None))
+
+    def test_an_older_save_never_replaces_a_newer_snapshot(self):
+        now = time.time()
+        roster = {item["driverId"]: item for item in make_roster(6, seed=29)}
+        self.assertEqual(driver_store.save(roster, fetched_at=now), 6)
+
+        older = {driver_id: {**item, "dutyStatus": "OFF"} for driver_id, item in list(roster.items())[:5]}
+        self.assertEqual(driver_store.save(older, fetched_at=now - 5), 0)
+
+        fetched_at, stored = driver_store.load(max_age=60)
+        self.assertAlmostEqual(fetched_at, now, delta=0.001)
+        self.assertEqual(stored, roster)
+
+    def test_upsert_keeps_rows_newer_than_the_ones_written(self):
+        field = DriverSnapshot._meta.get_field('fetched_at')
+        now = datetime.now(timezone.utc)
+        DriverSnapshot.objects.create(driver_id="a", data={"driverId": "a", "dutyStatus": "D"}, position=0,
+                                      fetched_at=now)
+        rows = [("a", dumps({"driverId": "a", "dutyStatus": "OFF"}), 0, field.get_db_prep_save(
+            now - timedelta(seconds=5), connection))]
+
+        upsert(DriverSnapshot, ['driver_id', 'data', 'position', 'fetched_at'], rows, 'driver_id',
+               newer_field='fetched_at')
+
+        self.assertEqual(DriverSnapshot.objects.get(driver_id="a").data["dutyStatus"], "D")
+
+
+class RecordingTruckStore(TruckStore):
+    # A truck store noting which thread each save ran on.
+
+    def __init__(self):
+        self.threads = []
+
+    def save(self, data, fetched_at=None):
+        self.threads.append(threading.current_thread())
+        return super().save(data, fetched_at)
+
+
+class StoredSnapshotCacheTests(TransactionTestCase):
+
+    def test_cache_miss_is_served_from_the_store(self):
+        fetched = []
+
+        def fetch():
+            fetched.append(None)
+            return [{"name": "upstream"}]
+
+        store = RecordingTruckStore()
+        store.save([{"name": "stored"}], fetched_at=time.time() - 5)
+        snapshot = SnapshotCache('store-test', fetch, ttl=30, store=store, store_max_age=60)
+        try:
+            self.assertEqual(snapshot.get(), [{"name": "stored"}])
+            self.assertEqual(snapshot.get(), [{"name": "stored"}])
+            self.assertEqual(fetched, [])
+            self.assertEqual(snapshot.stats()["restores"], 1)
+
+            # Anything fetched upstream is saved for the next cold start.
+            snapshot.invalidate()
+            snapshot.store_max_age = 1
+            self.assertEqual(snapshot.get(), [{"name": "upstream"}])
+            # Saved on a thread of its own rather than the caller's.
+            snapshot._save_thread.join()
+            self.assertEqual(truck_store.load(max_age=60)[1], [{"name": "upstream"}])
+            self.assertEqual(len(store.threads), 2)
+            self.assertIsNot(store.threads[1], threading.current_thread())
+        finally:
+            snapshot.invalidate()
+
+
+    def test_only_put_saves_without_save_fetches(self):
+        snapshot = SnapshotCache('store-test', lambda: [{"name": "fetched"}], ttl=30, store=truck_store,
+                                 store_max_age=60, save_fetches=False)
+        try:
+            self.assertEqual(snapshot.get(), [{"name": "fetched"}])
+            self.assertIsNone(snapshot._save_thread)
+            self.assertEqual(truck_store.load(max_age=60), (None, None))
+
+            snapshot.put([{"name": "polled"}])
+            self.assertEqual(truck_store.load(max_age=60)[1], [{"name": "polled"}])
+        finally:
+            snapshot.invalidate()
+
+
+class FleetPollerTests(TestCase):
+
+    def test_publishes_only_changes_after_the_baseline(self):
+        drivers = {item["driverId"]: item for item in make_roster(50, seed=21)}
+        trucks = [{"name": f"truck-{i}", "lat": 30.0, "lng": -97.0 - i} for i in range(10)]
+        # No alarm leads, so only the diff is published.
+        poller = FleetPoller(lambda: drivers, lambda: trucks, update_cache=False,
+                             alarms=ViolationAlarmScheduler(leads=()))
+
+        self.assertEqual(poller.poll(), 0)
+
+        drivers = dict(drivers)
+        drivers["driver-3"] = {**drivers["driver-3"], "shiftDriveMinutes": 700, "maxShiftDriveMinutes": 660}
+        del drivers["driver-4"]
+        drivers["driver-new"] = {"driverId": "driver-new", "shiftDriveMinutes": 0}
+        trucks = trucks[1:] + [{**trucks[0], "lat": 30.5}]
+        self.assertEqual(poller.poll(), 4)
+
+        events = {(event.kind, event.key): event for event in FleetEvent.objects.all()}
+        self.assertEqual(set(events), {("driver", "driver-3"), ("driver", "driver-4"), ("driver", "driver-new"),
+                                       ("truck", "truck-0")})
+        self.assertEqual(events["driver", "driver-3"].action, "changed")
+        self.assertEqual(events["driver", "driver-3"].data["violations"][0]["violation"], "11-Hour Driving Limit")
+        self.assertEqual(events["driver", "driver-4"].action, "removed")
+        self.assertEqual(events["driver", "driver-new"].action, "added")
+        self.assertEqual(events["truck", "truck-0"].data["truck"]["lat"], 30.5)
+
+    def test_failed_fetch_keeps_the_baseline(self):
+        calls = []
+
+        def fetch_drivers():
+            calls.append(None)
+            if len(calls) == 2:
+                raise ConnectionError("upstream down")
+            return {"a": {"driverId": "a", "shiftDriveMinutes": len(calls)}}
+
+        poller = FleetPoller(fetch_drivers, lambda: [], update_cache=False)
+        self.assertEqual([poller.poll() for _ in range(3)], [0, 0, 1])
+
+    def test_malformed_drivers_are_skipped(self):
+        previous = {"a": {"driverId": "a", "shiftDriveMinutes": 10}, "b": {"driverId": "b", "shiftDriveMinutes": 10}}
+        current = {"a": {"driverId": "a", "shiftDriveMinutes": "n/a"}, "b": {"driverId": "b", "shiftDriveMinutes": 700},
+                   "c": {"driverId": "c", "shiftDriveMinutes": []}, "d": {"driverId": "d", "shiftDriveMinutes": 0}}
+
+        events = driver_events(previous, current)
+
+        self.assertEqual([(event.key, event.action) for event in events], [("d", "added"), ("b", "changed")])
+        self.assertEqual(events[1].data["violations"][0]["violation"], "11-Hour Driving Limit")
+
+        poller = FleetPoller(lambda: current, lambda: [], update_cache=False)
+        self.assertEqual(poller.poll(), 0)
+        self.assertEqual(poller.alarms.stats()["rescheduled"], 2)
+
+    def test_malformed_drivers_do_not_stop_a_poll_that_updates_the_cache(self):
+        self.addCleanup(drivers_snapshot.invalidate)
+        self.addCleanup(trucks_snapshot.invalidate)
+        roster = {"a": {"driverId": "a", "shiftDriveMinutes": 10},
+                  "bad": {"driverId": "bad", "shiftDriveMinutes": "n/a"}}
+        poller = FleetPoller(lambda: roster, lambda: [{"name": "t1"}], alarms=ViolationAlarmScheduler(leads=()))
+
+        self.assertEqual(poller.poll(), 0)
+        self.assertEqual(drivers_snapshot.peek(), roster)
+        self.assertEqual(drive_time_index.get("a")["drive"], 650)
+
+        roster = {**roster, "a": {"driverId": "a", "shiftDriveMinutes": 20}, "new": {"driverId": "new"}}
+        self.assertEqual(poller.poll(), 2)
+        self.assertEqual(drivers_snapshot.peek(), roster)
+        self.assertEqual(drive_time_index.get("a")["drive"], 640)
+
+    def test_poller_sleeps_until_the_next_alarm(self):
+        clock = [0.0]
+        wakes = []
+
+        def sleep(seconds):
+            clock[0] += seconds
+            wakes.append(clock[0])
+
+        roster = {"a": {"driverId": "a", "dutyStatus": "D", "shiftDriveMinutes": 650, "shiftWorkMinutes": 0,
+                        "cycleWorkMinutes": 0}}
+        poller = FleetPoller(lambda: roster, lambda: [], update_cache=False, clock=lambda: clock[0],
+                             alarms=ViolationAlarmScheduler(leads=(5, 0)))
+        with self.settings(FLEET_EVENTS_RETENTION=10 ** 9):
+            poller.run(3600, iterations=2, sleep=sleep)
+
+        # 10 minutes left at the first poll: warnings at 5 and 10 minutes, then the second poll an hour in.
+        self.assertEqual(wakes, [300, 600, 3600])
+        alerts = FleetEvent.objects.filter(kind='alert').order_by('id')
+        self.assertEqual([(event.action, event.data["limit"]) for event in alerts],
+                         [("warning", "drive"), ("limit", "drive")])
+
+
+class FleetEventStreamTests(TransactionTestCase):
+
+    def test_replays_missed_events_then_streams_new_ones(self):
+        FleetEvent.objects.bulk_create([FleetEvent(kind=kind, key=f"k{i}", action="changed", data={"i": i})
+                                        for i, kind in enumerate(["driver", "truck", "driver"])])
+        first_id = FleetEvent.objects.order_by('id').first().id
+        broadcaster.poll_interval = 0.01
+
+        async def stream():
+            sent, disconnect = [], asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {'type': 'http', 'method': 'GET', 'path': '/api/v1/fleet/events/',
+                     'query_string': b'kinds=driver', 'headers': [(b'last-event-id', str(first_id - 1).encode())]}
+            app = asyncio.ensure_future(fleet_events_app(scope, receive, send))
+            await asyncio.sleep(0.1)
+            await sync_to_async(FleetEvent.objects.create)(kind="driver", key="k3", action="added")
+            await asyncio.sleep(0.1)
+            disconnect.set()
+            await asyncio.wait_for(app, 1)
+            return sent
+
+        sent = asyncio.run(stream())
+        self.assertEqual(sent[0]['status'], 200)
+        body = b''.join(message.get('body', b'') for message in sent[1:]).decode()
+        ids = [int(line[4:]) for line in body.splitlines() if line.startswith('id: ')]
+        self.assertEqual(ids, [first_id, first_id + 2, first_id + 3])
+        self.assertIn('"key":"k3","action":"added"', body)
+
+
+class ViolationAlarmTests(SimpleTestCase):
+
+    def test_projects_limits_for_the_current_status(self):
+        driving = DriverHosInformation(driverId="a", dutyStatus="D", shiftDriveMinutes=600, shiftWorkMinutes=700,
+                                       cycleWorkMinutes=4000)
+        self.assertEqual(project_limits(driving, 0), {"drive": 3600, "shift": 8400, "cycle": 12000})
+        on_duty = driving.model_copy(update={"duty_status": "ON"})
+        self.assertEqual(project_limits(on_duty, 0), {"shift": 8400, "cycle": 12000})
+        off_duty = driving.model_copy(update={"duty_status": "OFF"})
+        self.assertEqual(project_limits(off_duty, 0), {})
+
+    def test_fires_each_warning_once_at_its_time(self):
+        roster = {"a": {"driverId": "a", "dutyStatus": "D", "shiftDriveMinutes": 620, "shiftWorkMinutes": 0,
+                        "cycleWorkMinutes": 0}}
+        scheduler = ViolationAlarmScheduler(leads=(60, 30, 0))
+        scheduler.update(roster, as_of=0)
+
+        # 40 minutes left: already inside the 60-minute window, so that warning fires straight away.
+        self.assertEqual([(alarm.limit, alarm.lead) for alarm in scheduler.pop_due(0)], [("drive", 60)])
+        self.assertEqual(scheduler.next_due(), 600)
+        self.assertEqual([(alarm.limit, alarm.lead) for alarm in scheduler.pop_due(600)], [("drive", 30)])
+
+        # A fresh roster reading 10 minutes later reschedules without repeating either warning.
+        roster = {"a": {**roster["a"], "shiftDriveMinutes": 630}}
+        scheduler.update(roster, as_of=600)
+        self.assertEqual(scheduler.next_due(), 2400)
+        self.assertEqual([(alarm.limit, alarm.lead) for alarm in scheduler.pop_due(2400)], [("drive", 0)])
+
+        # Going off duty clears the alarms; after a reset the warnings apply again.
+        scheduler.update({"a": {**roster["a"], "dutyStatus": "OFF"}}, as_of=3000)
+        self.assertIsNone(scheduler.next_due())
+        scheduler.update({"a": {**roster["a"], "shiftDriveMinutes": 0}}, as_of=40000)
+        self.assertEqual([alarm.lead for alarm in scheduler.pop_due(10 ** 6)
+                          if alarm.limit == "drive"], [60, 30, 0])
+
+    def test_malformed_rows_keep_the_last_good_state(self):
+        good = {"driverId": "a", "dutyStatus": "D", "shiftDriveMinutes": 600, "shiftWorkMinutes": 0,
+                "cycleWorkMinutes": 0}
+        scheduler = ViolationAlarmScheduler(leads=(0,))
+        scheduler.update({"a": good}, as_of=0)
+        self.assertEqual(scheduler.next_due(), 3600)
+
+        bad = {**good, "shiftDriveMinutes": "n/a"}
+        for _ in range(2):
+            scheduler.update({"a": bad}, as_of=60)
+            self.assertEqual(scheduler.next_due(), 3600)
+        self.assertEqual(scheduler.stats()["rescheduled"], 1)
+
+        scheduler.update({"a": {**good, "shiftDriveMinutes": 630}}, as_of=60)
+        self.assertEqual(scheduler.next_due(), 1860)
+
+        # A malformed newcomer does not hide that "a" left the roster.
+        scheduler.update({"b": {**bad, "driverId": "b"}}, as_of=120)
+        self.assertEqual(len(scheduler), 0)
+        self.assertIsNone(scheduler.next_due())
+
+    def test_matches_brute_force_over_a_simulated_day(self):
+        rng = random.Random(5)
+        roster = {item["driverId"]: item for item in make_roster(300, seed=5)}
+        scheduler = ViolationAlarmScheduler(leads=(60, 15, 0))
+        scheduler.update(roster, as_of=0)
+
+        expected = set()
+        for driver in decode_drivers(list(roster.values())):
+            remaining = remaining_hos_minutes(driver)
+            for limit, limit_at in project_limits(driver, 0).items():
+                for lead in (60, 15, 0):
+                    tighter = {60: 15, 15: 0}.get(lead)
+                    if tighter is None or limit_at - tighter * 60 > 0:
+                        expected.add((driver.driver_id, limit, lead, max(0, limit_at - lead * 60)))
+
+        fired = set()
+        now = 0
+        while scheduler.next_due() is not None:
+            now = scheduler.next_due() + rng.uniform(0, 5)
+            fired.update((alarm.driver_id, alarm.limit, alarm.lead, alarm.fire_at) for alarm in scheduler.pop_due(now))
+        self.assertEqual(fired, expected)
+
+        # Removed drivers leave nothing behind once the heap compacts.
+        scheduler.update({}, as_of=now)
+        self.assertEqual(scheduler.stats()["pending"], 0)
+        self.assertEqual(scheduler.stats()["drivers"], 0)
+
+
+class MetricsTests(SimpleTestCase):
+
+    def setUp(self):
+        registry.clear()
+
+    def tearDown(self):
+        registry.enabled = True
+        registry.clear()
+
+    def test_stages_are_timed_and_failures_counted(self):
+        @timed('test_function')
+        def double(value):
+            return value * 2
+
+        @timed('test_coroutine')
+        async def fail():
+            raise ValueError
+
+        self.assertEqual(double(2), 4)
+        with self.assertRaises(ValueError):
+            asyncio.run(fail())
+        with stage('test_block'):
+            time.sleep(0.01)
+
+        self.assertEqual(registry.value('eld_stage_seconds', ('test_function',))[0], 1)
+        self.assertEqual(registry.value('eld_stage_errors_total', ('test_coroutine',)), 1)
+        self.assertIsNone(registry.value('eld_stage_errors_total', ('test_function',)))
+        self.assertGreaterEqual(registry.value('eld_stage_seconds', ('test_block',))[1], 0.01)
+
+        registry.enabled = False
+        self.assertEqual(double(3), 6)
+        with stage('test_block'):
+            pass
+        self.assertEqual(registry.value('eld_stage_seconds', ('test_function',))[0], 1)
+        self.assertEqual(registry.value('eld_stage_seconds', ('test_block',))[0], 1)
+
+    def test_prometheus_exposition(self):
+        metrics = MetricsRegistry(buckets=(1, 0.1))
+        for seconds in (0.05, 0.1, 0.5, 5):
+            metrics.observe('eld_stage_seconds', ('plan',), seconds)
+        metrics.increment('eld_requests_total', ('a "b"', 'GET', 200), 3)
+
+        lines = metrics.render().splitlines()
+        self.assertIn('# TYPE eld_stage_seconds histogram', lines)
+        self.assertEqual([line for line in lines if line.startswith('eld_stage_seconds')], [
+            'eld_stage_seconds_bucket{stage="plan",le="0.1"} 2',
+            'eld_stage_seconds_bucket{stage="plan",le="1"} 3',
+            'eld_stage_seconds_bucket{stage="plan",le="+Inf"} 4',
+            'eld_stage_seconds_sum{stage="plan"} 5.65',
+            'eld_stage_seconds_count{stage="plan"} 4',
+        ])
+        self.assertIn('eld_requests_total{route="a \\"b\\"",method="GET",status="200"} 3', lines)
+
+    @override_settings(METRICS_SERVER_TIMING=True)
+    def test_request_stages_reach_server_timing_and_metrics(self):
+        drivers_snapshot._store({"d1": {"driverId": "d1", "dutyStatus": "D", "shiftDriveMinutes": 60,
+                                        "shiftWorkMinutes": 60, "cycleWorkMinutes": 60}})
+        try:
+            response = self.client.post('/api/v1/drivers/hos/d1/', {"start": "2024-01-01T00:00:00Z",
+                                                                    "end": "2024-01-02T00:00:00Z"},
+                                        content_type='application/json')
+        finally:
+            drivers_snapshot.invalidate()
+        self.assertEqual(response.status_code, 200)
+        timings = dict(entry.split(';dur=') for entry in response['Server-Timing'].split(', '))
+        self.assertEqual(list(timings), ['decode', 'detect_violation', 'plan', 'render', 'total'])
+        self.assertLessEqual(sum(float(timings[name]) for name in ('decode', 'plan', 'render')),
+                             float(timings['total']))
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertIn('eld_stage_seconds_count{stage="plan"} 1', text)
+        self.assertIn('eld_requests_total{route="driving-schedule",method="POST",status="200"} 1', text)
+
+    def test_middleware_steps_aside_when_disabled(self):
+        registry.enabled = False
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+        self.assertIsNone(registry.value('eld_request_seconds', ('metrics',)))
+
+
+class AccessTokenManagerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.fetched = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def fetch(self, expires_in=100):
+        self.fetched += 1
+        self.release.wait(5)
+        return {"access_token": f"token-{self.fetched}", "expires_in": expires_in}
+
+    def manager(self, fetch=None):
+        return AccessTokenManager(fetch or self.fetch, refresh_margin=60, clock=lambda: self.now)
+
+    def test_concurrent_callers_share_one_refresh(self):
+        manager = self.manager()
+        self.release.clear()
+        tokens = []
+        threads = [threading.Thread(target=lambda: tokens.append(manager.get_token())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(tokens, ["token-1"] * 8)
+        self.assertEqual(self.fetched, 1)
+
+    def test_refreshes_in_the_background_before_expiry(self):
+        manager = self.manager()
+        self.assertEqual(manager.get_token(), "token-1")
+        self.now = 49
+        self.assertEqual(manager.get_token(), "token-1")
+        self.assertEqual(self.fetched, 1)
+
+        # Past the refresh point (half of a 100 s lifetime here) the current token is still handed out
+        # while a new one is fetched.
+        self.release.clear()
+        self.now = 51
+        self.assertEqual(manager.get_token(), "token-1")
+        self.release.set()
+        for _ in range(100):
+            if manager.get_token() == "token-2":
+                break
+            time.sleep(0.01)
+        self.assertEqual(manager.get_token(), "token-2")
+        self.assertEqual(self.fetched, 2)
+
+    def test_missing_lifetime_falls_back_to_the_default(self):
+        manager = self.manager(lambda: self.fetch(expires_in=None))
+        self.assertEqual(manager.get_token(), "token-1")
+        self.now = DEFAULT_TOKEN_LIFETIME - 1
+        self.assertIsNotNone(manager.get_token())
+        self.assertIsNone(self.manager(lambda: None).get_token())
+
+    def test_async_refreshes_on_loops_in_different_threads(self):
+        async def fetch():
+            self.fetched += 1
+            await asyncio.sleep(0.1)
+            return {"access_token": "token", "expires_in": 100}
+
+        manager = AsyncAccessTokenManager(fetch, refresh_margin=60, clock=lambda: self.now)
+        results = []
+
+        def get_token():
+            try:
+                results.append(asyncio.run(manager.get_token()))
+            except Exception as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=get_token) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["token", "token"])
+        self.assertEqual(manager._tasks, {})
+
+
+class StubProLogsHandler(BaseHTTPRequestHandler):
+    # Hands out numbered tokens and answers GETs with the statuses queued in ``server.statuses`` (200 once
+    # they run out) and the body in ``server.bodies`` for the path, recording each GET's Authorization header.
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload, status_code=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.tokens += 1
+        self._send_json({"access_token": f"token-{self.server.tokens}", "expires_in": 3600})
+
+    def do_GET(self):
+        self.server.authorizations.append(self.headers.get('Authorization'))
+        status_code = self.server.statuses.pop(0) if self.server.statuses else 200
+        self._send_json(self.server.bodies.get(self.path, {"status": status_code}), status_code)
+
+
+class ProLogsClientTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubProLogsHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.tokens = 0
+        self.server.statuses = []
+        self.server.authorizations = []
+        self.server.bodies = {}
+        self.client = ProLogsClient(self.base_url, f"{self.base_url}/token", max_retries=2, backoff_factor=0,
+                                    backoff_jitter=0)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_retries_server_errors(self):
+        self.server.statuses = [503, 500]
+        self.assertEqual(self.client.get("/drivers/"), {"status": 200})
+        self.assertEqual(len(self.server.authorizations), 3)
+        stats = self.client.stats()
+        self.assertEqual((stats["requests"], stats["retries"], stats["errors"], stats["token_requests"]),
+                         (2, 2, 0, 1))
+        pool, = stats["pools"].values()
+        self.assertEqual(pool["connections_opened"], 1)
+
+    def test_gives_up_after_the_last_retry(self):
+        self.server.statuses = [502, 502, 502, 502]
+        self.assertEqual(self.client.get_response("/drivers/").status_code, 502)
+        self.assertEqual(len(self.server.authorizations), 3)
+        self.assertEqual(self.client.stats()["errors"], 1)
+
+    def test_refreshes_the_token_once_on_401(self):
+        self.server.statuses = [401]
+        self.assertEqual(self.client.get("/drivers/"), {"status": 200})
+        self.assertEqual(self.server.authorizations, ["Bearer token-1", "Bearer token-2"])
+
+        # A second 401 in a row is returned rather than retried again.
+        self.server.statuses = [401, 401]
+        self.assertEqual(self.client.get_response("/drivers/").status_code, 401)
+        self.assertEqual(self.server.authorizations[2:], ["Bearer token-2", "Bearer token-3"])
+        self.assertEqual(self.client.stats()["token_requests"], 3)
+
+    def test_connection_errors_are_retried_then_raised(self):
+        with socket.socket() as unused:
+            unused.bind(('127.0.0.1', 0))
+            port = unused.getsockname()[1]
+        client = ProLogsClient(f"http://127.0.0.1:{port}", f"{self.base_url}/token", max_retries=2,
+                               backoff_factor=0, backoff_jitter=0)
+        try:
+            with self.assertRaises(requests.exceptions.ConnectionError) as caught:
+                client.get("/drivers/")
+            self.assertIn("Max retries exceeded", str(caught.exception))
+            stats = client.stats()
+            self.assertEqual((stats["requests"], stats["errors"]), (2, 1))
+        finally:
+            client.close()
+
+    def test_async_client_retries_refreshes_and_closes_with_its_loop(self):
+        client = AsyncProLogsClient(self.base_url, f"{self.base_url}/token", max_retries=2, backoff_factor=0,
+                                    backoff_jitter=0)
+
+        async def get():
+            return await client.get("/drivers/"), client.client
+
+        self.server.statuses = [503, 401]
+        body, http = asyncio.run(get())
+        self.assertEqual(body, {"status": 200})
+        self.assertEqual(self.server.authorizations, ["Bearer token-1", "Bearer token-1", "Bearer token-2"])
+        self.assertEqual((client.stats()["retries"], client.stats()["token_requests"]), (1, 2))
+        # The loop's client was closed when asyncio.run() shut the loop down; the next loop gets its own.
+        self.assertTrue(http.is_closed)
+        self.assertEqual(client._clients, {})
+
+        body, second = asyncio.run(get())
+        self.assertIsNot(second, http)
+        self.assertTrue(second.is_closed)
+
+    def test_get_driver(self):
+        driver = {"driverId": "d1", "dutyStatus": "D", "shiftDriveMinutes": 60}
+        self.server.bodies = {
+            "/drivers/d1": driver,
+            "/drivers/d2": [{"driverId": "x"}, {**driver, "driverId": "d2"}],
+            "/drivers/d3": [{"driverId": "x"}],
+        }
+        drivers_snapshot.invalidate()
+        base_url, token_url = prologs_client.base_url, prologs_client.token_url
+        prologs_client.base_url, prologs_client.token_url = self.base_url, f"{self.base_url}/token"
+        prologs_client.token_manager.invalidate()
+        try:
+            self.assertEqual(get_driver("d1").shift_drive_minutes, 60)
+            # The per-driver endpoint sometimes answers with a list.
+            self.assertEqual(get_driver("d2").driver_id, "d2")
+            self.assertIsNone(get_driver("d3"))
+            self.server.statuses = [404]
+            self.assertIsNone(get_driver("d4"))
+        finally:
+            prologs_client.base_url, prologs_client.token_url = base_url, token_url
+            prologs_client.token_manager.invalidate()
+
+
+class SnapshotCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.fetches = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.error = None
+        self.snapshot = SnapshotCache(f'test-{self.id()}', self.fetch, ttl=30, stale_ttl=60, cache_alias='fleet')
+
+    def tearDown(self):
+        self.snapshot.invalidate()
+
+    def fetch(self):
+        self.fetches += 1
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return [self.fetches]
+
+    def wait_for(self, condition):
+        for _ in range(200):
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail("timed out")
+
+    def test_miss_then_fresh_hit(self):
+        self.assertEqual(self.snapshot.get(), [1])
+        self.assertEqual(self.snapshot.get(), [1])
+        stats = self.snapshot.stats()
+        self.assertEqual((stats["misses"], stats["hits"], stats["refreshes"]), (1, 1, 1))
+        self.assertEqual(self.snapshot.peek(), [1])
+
+    def test_stale_hit_refreshes_in_the_background(self):
+        self.snapshot._store(["old"], fetched_at=time.time() - 40)
+        self.assertIsNone(self.snapshot.peek())
+        self.release.clear()
+        self.assertEqual(self.snapshot.get(), ["old"])
+        # One refresh at a time: a second stale reader does not start another.
+        self.assertEqual(self.snapshot.get(), ["old"])
+        self.release.set()
+        self.wait_for(lambda: self.snapshot.peek() == [1])
+        self.assertEqual(self.fetches, 1)
+        self.assertEqual(self.snapshot.stats()["stale_hits"], 2)
+
+    def test_past_the_stale_window_is_a_miss(self):
+        self.snapshot._store(["old"], fetched_at=time.time() - 100)
+        self.assertEqual(self.snapshot.get(), [1])
+        self.assertEqual(self.snapshot.stats()["misses"], 1)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        self.release.clear()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.snapshot.get())) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        self.wait_for(lambda: self.snapshot.stats()["coalesced"] == 5)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results, [[1]] * 6)
+        self.assertEqual(self.fetches, 1)
+
+    def test_failed_refreshes_are_counted_and_retried(self):
+        self.error = ConnectionError("upstream down")
+        with self.assertRaises(ConnectionError):
+            self.snapshot.get()
+        self.assertEqual(self.snapshot.stats()["refresh_errors"], 1)
+
+        self.error = None
+        self.assertEqual(self.snapshot.get(), [2])
+        self.assertEqual(self.snapshot.stats()["refresh_errors"], 1)
+
+    def test_async_misses_share_one_fetch_and_stale_hits_refresh(self):
+        async def fetch_async():
+            self.fetches += 1
+            await asyncio.sleep(0.05)
+            return [self.fetches]
+
+        self.snapshot._fetch_async = fetch_async
+
+        async def gets():
+            first = await asyncio.gather(*[self.snapshot.aget() for _ in range(5)])
+            return first, await self.snapshot.aget()
+
+        self.assertEqual(asyncio.run(gets()), ([[1]] * 5, [1]))
+        stats = self.snapshot.stats()
+        self.assertEqual((self.fetches, stats["coalesced"], stats["hits"]), (1, 4, 1))
+
+        async def stale_get():
+            data = await self.snapshot.aget()
+            await asyncio.sleep(0.2)
+            return data
+
+        self.snapshot._store(["old"], fetched_at=time.time() - 40)
+        self.assertEqual(asyncio.run(stale_get()), ["old"])
+        self.assertEqual(self.snapshot.peek(), [2])
+
+    def test_async_misses_on_loops_in_different_threads(self):
+        async def fetch_async():
+            self.fetches += 1
+            await asyncio.sleep(0.1)
+            return ["fetched"]
+
+        self.snapshot._fetch_async = fetch_async
+        results = []
+
+        def aget():
+            try:
+                results.append(asyncio.run(self.snapshot.aget()))
+            except Exception as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=aget) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [["fetched"], ["fetched"]])
+        self.assertEqual(self.snapshot._async_flights, {})
+
+
+class AsyncViewTests(SimpleTestCase):
+
+    async def test_schedule_with_violations(self):
+        drivers_snapshot._store({"d1": {"driverId": "d1", "dutyStatus": "D", "shiftDriveMinutes": 700,
+                                        "shiftWorkMinutes": 60, "cycleWorkMinutes": 60}})
+        try:
+            response = await self.async_client.post('/api/v1/async/drivers/hos/d1/',
+                                                    {"start": "2024-01-01T00:00:00Z", "end": "2024-01-02T00:00:00Z"},
+                                                    content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            body = json.loads(response.content)
+            self.assertEqual(body["violations"][0]["violation"], "11-Hour Driving Limit")
+            self.assertTrue(body["suggested_schedule"]["timeline"])
+
+            response = await self.async_client.post('/api/v1/async/drivers/hos/d1/', b'{',
+                                                    content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        finally:
+            drivers_snapshot.invalidate()
+
+    async def test_truck_list(self):
+        trucks_snapshot._store([{"name": "t1", "lat": 41.0, "lng": -87.0}])
+        try:
+            response = await self.async_client.get('/api/v1/async/trucks/')
+            self.assertEqual(json.loads(response.content), [{"name": "t1", "lat": 41.0, "lng": -87.0}])
+        finally:
+            trucks_snapshot.invalidate()
+
+
+class FleetViolationsViewTests(SimpleTestCase):
+
+    def setUp(self):
+        drivers_snapshot._store({
+            "ok": {"driverId": "ok", "shiftDriveMinutes": 60, "shiftWorkMinutes": 60, "cycleWorkMinutes": 60},
+            "close": {"driverId": "close", "shiftDriveMinutes": 640, "shiftWorkMinutes": 700,
+                      "cycleWorkMinutes": 60},
+            "over": {"driverId": "over", "truckName": "t3", "dutyStatus": "D", "shiftDriveMinutes": 700,
+                     "shiftWorkMinutes": 700, "cycleWorkMinutes": 60},
+        })
+
+    def tearDown(self):
+        drivers_snapshot.invalidate()
+
+    def scan(self, **params):
+        response = self.client.get('/api/v1/drivers/violations/', params)
+        self.assertTrue(response.streaming)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_streams_every_driver(self):
+        results = self.scan()
+        self.assertEqual([result["driver_id"] for result in results], ["ok", "close", "over"])
+        self.assertEqual(results[2], {
+            "driver_id": "over", "truck_name": "t3", "duty_status": "D", "violations": 1,
+            "violations_data": [{"violation": "11-Hour Driving Limit",
+                                 "details": "Drove 700.0 minutes, exceeding the 660 minutes limit."}],
+            "remaining_minutes": {"drive": -40.0, "shift": 140.0, "cycle": 4140.0},
+        })
+
+    def test_filters(self):
+        self.assertEqual([result["driver_id"] for result in self.scan(only_violators='true')], ["over"])
+        self.assertEqual([result["driver_id"] for result in self.scan(within=30)], ["close", "over"])
+        self.assertEqual(self.scan(only_violators='1', within=-50), [])
+        response = self.client.get('/api/v1/drivers/violations/', {'within': 'soon'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_driver_is_skipped(self):
+        drivers_snapshot._store({**drivers_snapshot.peek(),
+                                 "bad": {"driverId": "bad", "shiftDriveMinutes": "n/a"}})
+        self.assertEqual([result["driver_id"] for result in self.scan()], ["ok", "close", "over"])
@@ -0,0 +1,438 @@
+"""
+Tracks holds the truck breadcrumb store: every truck position the poller sees, kept on disk in compact
+append-only segment files, with older days downsampled, and the track queries served from them.
+
+Positions are fixed-point integers (1e-5 degrees, about a metre) in columnar chunks of up to ``CHUNK_SIZE``
+points of one truck. Each column stores its first value and then the differences between consecutive
+points in the narrowest integer type that holds them, so a truck reporting every poll costs a few bytes a
+point rather than a database row. Chunks are appended to one segment file per day; readers index a segment
+by scanning its chunk headers once, and only the new bytes after that.
+"""
+import os
+import struct
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+from dateutil import parser
+from django.conf import settings
+
+# Fixed-point units per degree.
+SCALE = 100_000
+
+# Most points per chunk; a truck's open chunk is also written out every flush interval.
+CHUNK_SIZE = 1024
+
+# Stored for a truck that reported no speed.
+NO_SPEED = -1
+
+RAW = 'raw'
+
+_MAGIC = b'TRK1'
+# Magic, name length, points, payload bytes, first and last time (epoch seconds).
+_HEADER = struct.Struct('<4sHIIqq')
+# A column's first value and the type code of its deltas.
+_COLUMN = struct.Struct('<qB')
+_DTYPES = (np.int8, np.int16, np.int32, np.int64)
+_SEGMENT_SUFFIX = '.seg'
+
+
+def encode_column(values: np.ndarray) -> bytes:
+    deltas = np.diff(values)
+    code = 0
+    if len(deltas):
+        low, high = int(deltas.min()), int(deltas.max())
+        while not np.iinfo(_DTYPES[code]).min <= low <= high <= np.iinfo(_DTYPES[code]).max:
+            code += 1
+    return _COLUMN.pack(int(values[0]), code) + deltas.astype(_DTYPES[code]).tobytes()
+
+
+def decode_column(buffer, offset: int, count: int) -> tuple[np.ndarray, int]:
+    """
+    The column of ``count`` values starting at ``offset``, and the offset just past it.
+    """
+    first, code = _COLUMN.unpack_from(buffer, offset)
+    offset += _COLUMN.size
+    dtype = np.dtype(_DTYPES[code])
+    values = np.empty(count, dtype=np.int64)
+    values[0] = first
+    np.cumsum(np.frombuffer(buffer, dtype=dtype, count=count - 1, offset=offset), dtype=np.int64, out=values[1:])
+    values[1:] += first
+    return values, offset + dtype.itemsize * (count - 1)
+
+
+def encode_chunk(name: str, columns: tuple[np.ndarray, ...]) -> bytes:
+    """
+    One chunk record: ``columns`` are times, latitudes, longitudes and speeds, in time order.
+    """
+    encoded_name = name.encode()
+    times = columns[0]
+    payload = b''.join(encode_column(np.asarray(column, dtype=np.int64)) for column in columns)
+    return _HEADER.pack(_MAGIC, len(encoded_name), len(times), len(payload), int(times[0]),
+                        int(times[-1])) + encoded_name + payload
+
+
+def decode_chunk(buffer, offset: int = 0) -> tuple[str, tuple[np.ndarray, ...]]:
+    magic, name_length, count, _, _, _ = _HEADER.unpack_from(buffer, offset)
+    if magic != _MAGIC:
+        raise ValueError(f"Not a track chunk at offset {offset}")
+    offset += _HEADER.size
+    name = bytes(buffer[offset:offset + name_length]).decode()
+    offset += name_length
+    columns = []
+    for _ in range(4):
+        column, offset = decode_column(buffer, offset, count)
+        columns.append(column)
+    return name, tuple(columns)
+
+
+def empty_track() -> tuple[np.ndarray, ...]:
+    return tuple(np.empty(0, dtype=np.int64) for _ in range(4))
+
+
+def merge_tracks(parts: list[tuple[np.ndarray, ...]]) -> tuple[np.ndarray, ...]:
+    """
+    One track from pieces in any order, sorted by time; of several points at the same second, the last
+    piece's is kept.
+    """
+    if not parts:
+        return empty_track()
+    columns = [np.concatenate([part[index] for part in parts]) for index in range(4)]
+    # Reversed so np.unique, which keeps the first of equal times, keeps the latest piece's point.
+    columns = [column[::-1] for column in columns]
+    _, keep = np.unique(columns[0], return_index=True)
+    return tuple(column[keep] for column in columns)
+
+
+def downsample(track: tuple[np.ndarray, ...], step: int) -> tuple[np.ndarray, ...]:
+    """
+    The last point of every ``step``-second bucket of a time-ordered track.
+    """
+    times = track[0]
+    if step <= 1 or len(times) < 2:
+        return track
+    buckets = times // step
+    keep = np.flatnonzero(np.append(buckets[1:] != buckets[:-1], True))
+    return tuple(column[keep] for column in track)
+
+
+def track_points(track: tuple[np.ndarray, ...]) -> list[dict]:
+    times, lats, lngs, speeds = track
+    return [
+        {
+            "timeStamp": datetime.fromtimestamp(stamp, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "lat": lat,
+            "lng": lng,
+            "speed": None if speed == NO_SPEED else speed,
+        }
+        for stamp, lat, lng, speed in zip(times.tolist(), (lats / SCALE).tolist(), (lngs / SCALE).tolist(),
+                                          speeds.tolist())
+    ]
+
+
+def _parse_time(value) -> Optional[int]:
+    try:
+        parsed = parser.isoparse(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def _day(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+class TrackStore:
+    """
+    Append-only breadcrumbs for the whole fleet under ``directory``.
+
+    ``record`` takes the ``/trucks/`` list and buffers each truck's new position; a truck whose
+    ``timeStamp`` has not moved on since its last point is skipped. Points reach disk when a truck's chunk
+    fills or every ``flush_interval`` seconds, into ``raw/<day>.seg``. Once a day is over its segment is
+    rewritten with each truck's points in as few chunks as possible; once it is ``raw_days`` old, it is
+    rewritten again keeping one point per truck every ``step`` seconds, into ``<step>s/<day>.seg``. Segments
+    older than ``retention_days`` are deleted. This maintenance runs hourly from ``record``.
+
+    One process (the poller) writes. Any number may read: ``track`` picks up segments written, rewritten or
+    deleted since the last query before answering.
+    """
+
+    def __init__(self, directory, raw_days: float = 7, step: int = 300, retention_days: float = 180,
+                 flush_interval: float = 300, chunk_size: int = CHUNK_SIZE, clock: Callable[[], float] = time.time):
+        self.directory = Path(directory)
+        self.raw_days = raw_days
+        self.step = step
+        self.retention_days = retention_days
+        self.flush_interval = flush_interval
+        self.chunk_size = chunk_size
+        self._clock = clock
+        self._resolutions = (RAW, f'{step}s')
+
+        self._lock = threading.RLock()
+        self._buffers: dict[str, tuple[array, ...]] = {}
+        self._last_times: dict[str, int] = {}
+        self._last_flush = clock()
+        self._last_maintenance: Optional[float] = None
+        # Per truck, (first time, last time, segment, offset) of every chunk in the segments scanned so far.
+        self._chunks: dict[str, list[tuple[int, int, str, int]]] = {}
+        # Per segment, its inode and how far it has been scanned.
+        self._scanned: dict[str, tuple[int, int]] = {}
+        self._counts = {'points': 0, 'unchanged': 0, 'skipped': 0, 'chunks_written': 0, 'bytes_written': 0,
+                        'days_merged': 0, 'days_downsampled': 0, 'days_deleted': 0, 'queries': 0}
+
+    def record(self, trucks: list[dict]):
+        now = self._clock()
+        with self._lock:
+            full = []
+            for truck in trucks:
+                name, lat, lng = truck.get('name'), truck.get('lat'), truck.get('lng')
+                stamp = _parse_time(truck.get('timeStamp'))
+                if name is None or lat is None or lng is None or stamp is None \
+                        or not -90 <= lat <= 90 or not -180 <= lng <= 180:
+                    self._counts['skipped'] += 1
+                    continue
+                if stamp <= self._last_times.get(name, -1):
+                    self._counts['unchanged'] += 1
+                    continue
+
+                self._last_times[name] = stamp
+                buffer = self._buffers.get(name)
+                if buffer is None:
+                    buffer = self._buffers[name] = (array('q'), array('q'), array('q'), array('q'))
+                speed = truck.get('speed')
+                speed = int(speed) if isinstance(speed, (int, float)) else NO_SPEED
+                buffer[0].append(stamp)
+                buffer[1].append(round(lat * SCALE))
+                buffer[2].append(round(lng * SCALE))
+                buffer[3].append(speed)
+                self._counts['points'] += 1
+                if len(buffer[0]) >= self.chunk_size:
+                    full.append(name)
+
+            if now - self._last_flush >= self.flush_interval:
+                self.flush()
+            elif full:
+                self._write([chunk for name in full for chunk in self._seal(name)])
+
+        if self._last_maintenance is None or now - self._last_maintenance >= 3600:
+            self.maintain(now)
+
+    def flush(self):
+        """
+        Writes every truck's buffered points.
+        """
+        with self._lock:
+            self._write([chunk for name in list(self._buffers) for chunk in self._seal(name)])
+            self._last_flush = self._clock()
+
+    def maintain(self, now: Optional[float] = None):
+        """
+        Deletes days older than ``retention_days``, downsamples raw days older than ``raw_days``, and
+        rewrites other past raw days whose trucks' points are spread over more chunks than they need.
+        """
+        now = self._clock() if now is None else now
+        self._last_maintenance = now
+        raw_cutoff = _day(now - self.raw_days * 86400)
+        retention_cutoff = _day(now - self.retention_days * 86400)
+        today = _day(now)
+
+        for resolution in self._resolutions:
+            for path in sorted(self._segments(resolution)):
+                day = path.name[:-len(_SEGMENT_SUFFIX)]
+                try:
+                    if day < retention_cutoff:
+                        path.unlink()
+                        self._counts['days_deleted'] += 1
+                    elif resolution == RAW and day < raw_cutoff:
+                        target = self.directory / self._resolutions[1] / path.name
+                        self._rewrite_day([path, target], target, self.step)
+                        path.unlink()
+                        self._counts['days_downsampled'] += 1
+                    elif resolution == RAW and day < today and self._is_fragmented(path):
+                        self._rewrite_day([path], path)
+                        self._counts['days_merged'] += 1
+                except Exception as e:
+                    print(f"Error maintaining track segment {path}: {e}")
+
+    def track(self, name: str, start: float, end: float, step: Optional[int] = None) -> tuple[np.ndarray, ...]:
+        """
+        The truck's points from ``start`` to ``end`` (epoch seconds, inclusive) as time-ordered columns:
+        times, latitudes and longitudes (fixed-point) and speeds. With ``step``, one point per ``step``
+        seconds at most.
+        """
+        self._count('queries')
+        for attempt in range(2):
+            self.refresh()
+            with self._lock:
+                refs = [ref for ref in self._chunks.get(name, ()) if ref[1] >= start and ref[0] <= end]
+                buffer = self._buffers.get(name)
+                parts = [tuple(np.array(column, dtype=np.int64) for column in buffer)] if buffer else []
+            try:
+                parts = self._read(refs) + parts
+                break
+            except FileNotFoundError:
+                # Downsampled or deleted since the refresh; look again.
+                if attempt:
+                    raise
+
+        track = merge_tracks(parts)
+        within = (track[0] >= start) & (track[0] <= end)
+        track = tuple(column[within] for column in track)
+        return downsample(track, step) if step else track
+
+    def refresh(self):
+        """
+        Indexes chunks appended to, and forgets segments removed or rewritten, since the last refresh.
+        """
+        present = {}
+        for resolution in self._resolutions:
+            for path in self._segments(resolution):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                present[str(path)] = (stat.st_ino, stat.st_size)
+
+        with self._lock:
+            gone = {path for path, (inode, _) in self._scanned.items()
+                    if path not in present or present[path][0] != inode}
+            if gone:
+                for name, refs in self._chunks.items():
+                    refs[:] = [ref for ref in refs if ref[2] not in gone]
+                for path in gone:
+                    del self._scanned[path]
+
+            for path, (inode, size) in present.items():
+                scanned = self._scanned.get(path, (inode, 0))[1]
+                if size > scanned:
+                    self._scanned[path] = (inode, self._scan(path, scanned, size))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counts,
+                'buffered': sum(len(buffer[0]) for buffer in self._buffers.values()),
+                'trucks': len(self._chunks),
+                'segments': len(self._scanned),
+            }
+
+    def _segments(self, resolution: str) -> list[Path]:
+        directory = self.directory / resolution
+        if not directory.is_dir():
+            return []
+        return [path for path in directory.iterdir() if path.name.endswith(_SEGMENT_SUFFIX)]
+
+    def _seal(self, name: str) -> list[tuple[str, bytes]]:
+        track = tuple(np.array(column, dtype=np.int64) for column in self._buffers.pop(name))
+        # Split at midnight, so each day's segment holds only that day and can be downsampled or deleted whole.
+        days = track[0] // 86400
+        bounds = [0, *(np.flatnonzero(np.diff(days)) + 1).tolist(), len(days)]
+        return [(_day(track[0][lo]), encode_chunk(name, tuple(column[lo:hi] for column in track)))
+                for lo, hi in zip(bounds, bounds[1:])]
+
+    def _write(self, chunks: list[tuple[str, bytes]], resolution: str = RAW):
+        by_day: dict[str, list[bytes]] = {}
+        for day, chunk in chunks:
+            by_day.setdefault(day, []).append(chunk)
+
+        directory = self.directory / resolution
+        directory.mkdir(parents=True, exist_ok=True)
+        for day, records in by_day.items():
+            data = b''.join(records)
+            # One write per segment: a reader scanning meanwhile sees whole chunks or stops short of them.
+            with open(directory / f'{day}{_SEGMENT_SUFFIX}', 'ab') as segment:
+                segment.write(data)
+            self._counts['chunks_written'] += len(records)
+            self._counts['bytes_written'] += len(data)
+
+    def _scan(self, path: str, offset: int, size: int) -> int:
+        with open(path, 'rb') as segment:
+            segment.seek(offset)
+            while offset + _HEADER.size <= size:
+                header = segment.read(_HEADER.size)
+                magic, name_length, _, payload, first, last = _HEADER.unpack(header)
+                if magic != _MAGIC:
+                    print(f"Error reading track segment {path}: no chunk at offset {offset}")
+                    break
+                length = _HEADER.size + name_length + payload
+                if offset + length > size:
+                    break
+                name = segment.read(name_length).decode()
+                segment.seek(payload, os.SEEK_CUR)
+                self._chunks.setdefault(name, []).append((first, last, path, offset))
+                offset += length
+        return offset
+
+    def _read(self, refs: list[tuple[int, int, str, int]]) -> list[tuple[np.ndarray, ...]]:
+        parts = []
+        by_segment: dict[str, list[int]] = {}
+        for _, _, path, offset in refs:
+            by_segment.setdefault(path, []).append(offset)
+        for path, offsets in by_segment.items():
+            with open(path, 'rb') as segment:
+                for offset in sorted(offsets):
+                    segment.seek(offset)
+                    header = segment.read(_HEADER.size)
+                    _, name_length, _, payload, _, _ = _HEADER.unpack(header)
+                    parts.append(decode_chunk(header + segment.read(name_length + payload))[1])
+        return parts
+
+    def _is_fragmented(self, path: Path) -> bool:
+        # More chunks for some truck than its points need, as flushing an open chunk leaves behind.
+        points, chunks = {}, {}
+        size = path.stat().st_size
+        with open(path, 'rb') as segment:
+            offset = 0
+            while offset + _HEADER.size <= size:
+                _, name_length, count, payload, _, _ = _HEADER.unpack(segment.read(_HEADER.size))
+                name = segment.read(name_length)
+                segment.seek(payload, os.SEEK_CUR)
+                points[name] = points.get(name, 0) + count
+                chunks[name] = chunks.get(name, 0) + 1
+                offset += _HEADER.size + name_length + payload
+        return any(chunks[name] > -(-points[name] // self.chunk_size) for name in chunks)
+
+    def _rewrite_day(self, sources: list[Path], target: Path, step: Optional[int] = None):
+        """
+        Writes every truck's points from ``sources`` to ``target`` in as few chunks as they fit, one point
+        per ``step`` seconds if given.
+        """
+        tracks: dict[str, list] = {}
+        for source in sources:
+            if not source.exists():
+                continue
+            data = source.read_bytes()
+            offset = 0
+            while offset + _HEADER.size <= len(data):
+                _, name_length, _, payload, _, _ = _HEADER.unpack_from(data, offset)
+                name, columns = decode_chunk(data, offset)
+                tracks.setdefault(name, []).append(columns)
+                offset += _HEADER.size + name_length + payload
+
+        chunks = []
+        for name, parts in tracks.items():
+            track = merge_tracks(parts)
+            if step:
+                track = downsample(track, step)
+            for start in range(0, len(track[0]), self.chunk_size):
+                chunks.append(encode_chunk(name, tuple(column[start:start + self.chunk_size] for column in track)))
+
+        # Written beside the target and moved over it, so readers see the old day or the new one.
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temporary = target.with_name(target.name + '.tmp')
+        temporary.write_bytes(b''.join(chunks))
+        os.replace(temporary, target)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+
+track_store = TrackStore(settings.TRACKS_DIR, raw_days=settings.TRACKS_RAW_DAYS, step=settings.TRACKS_DOWNSAMPLE_STEP,
+                         retention_days=settings.TRACKS_RETENTION_DAYS, flush_interval=settings.TRACKS_FLUSH_INTERVAL)
@@ -1,12 +1,24 @@
 from django.urls import re_path
 from .views import TruckListView, DriversListView, DriverView, TrucksHOSViolationsView, DrivingScheduleView, \
-    DrivingScheduleWithViolations
+    DrivingScheduleWithViolations, StatsView, FleetViolationsView, BatchDrivingScheduleView, AvailableDriversView, \
+    CycleAuditView, TrucksWithinView, NearestTrucksView, TruckTrackView, truck_list_async, driving_schedule_with_violations_async
 
 urlpatterns = [
     re_path(r'^trucks/?$', TruckListView.as_view(), name='truck-list'),
+    re_path(r'^trucks/within/?$', TrucksWithinView.as_view(), name='trucks-within'),
+    re_path(r'^trucks/nearest/?$', NearestTrucksView.as_view(), name='trucks-nearest'),
+    re_path(r'^trucks/(?P<name>[^/]+)/track/?$', TruckTrackView.as_view(), name='truck-track'),
     #re_path(r'^drivers/?$', DriversListView.as_view(), name='drivers-list'),
     #re_path(r'^driver/(?P<id>\w+)/?$', DriverView.as_view(), name='driver'),
     #re_path(r'^drivers/violations/(?P<id>\w+)/?$', TrucksHOSViolationsView.as_view(), name='trucks-violations'),
     #re_path(r'^drivers/schedule/(?P<id>\w+)/?$', DrivingScheduleView.as_view(), name='driving-schedule'),
+    re_path(r'^drivers/hos/batch/?$', BatchDrivingScheduleView.as_view(), name='driving-schedule-batch'),
     re_path(r'^drivers/hos/(?P<id>\w+)/?$', DrivingScheduleWithViolations.as_view(), name='driving-schedule'),
+    re_path(r'^drivers/available/?$', AvailableDriversView.as_view(), name='available-drivers'),
+    re_path(r'^drivers/cycle/audit/?$', CycleAuditView.as_view(), name='cycle-audit'),
+    re_path(r'^drivers/violations/?$', FleetViolationsView.as_view(), name='fleet-violations'),
+    re_path(r'^stats/?$', StatsView.as_view(), name='stats'),
+    re_path(r'^async/trucks/?$', truck_list_async, name='truck-list-async'),
+    re_path(r'^async/drivers/hos/(?P<id>\w+)/?$', driving_schedule_with_violations_async,
+            name='driving-schedule-async'),
 ]
\ No newline at end of file
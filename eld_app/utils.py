@@ -1,114 +1,262 @@
-import json
-import os
+from typing import Iterator, Optional
 
-import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from pydantic import TypeAdapter, ValidationError
 
+from eld_app.cache import SnapshotCache, LRUCache
+from eld_app.metrics import timed
 from eld_app.models import TruckLocation, DriverHosInformation
-from eld_app.responses import TruckHOSViolations, DrivingSchedules, DrivingSegment
-from datetime import timedelta, datetime, timezone
+from eld_app.planner import plan_timeline
+from eld_app.prologs import ProLogsClient, AsyncProLogsClient
+from eld_app.responses import TruckHOSViolations, DrivingTimeline
+from eld_app.signals import snapshot_refreshed
+from eld_app.store import driver_store, truck_store
+from datetime import datetime, timezone
 
 from dateutil import parser
 
-PROLOGS_API_BASE_URL = "https://publicapi-stage.prologs.us/api/v1"
+PROLOGS_API_BASE_URL = settings.PROLOGS_API_BASE_URL
 
-PROLOGS_API_CONNECT_BASE_URL = "https://identity-stage.prologs.us/connect/token"
+PROLOGS_API_CONNECT_BASE_URL = settings.PROLOGS_API_CONNECT_BASE_URL
 
 
-def get_access_token(client_id, client_secret):
-    url = PROLOGS_API_CONNECT_BASE_URL
-    headers = {
-        'Content-Type': 'application/x-www-form-urlencoded'
-    }
-    data = {
-        'grant_type': 'client_credentials',
-        'client_id': client_id,
-        'client_secret': client_secret
-    }
+prologs_client = ProLogsClient(
+    PROLOGS_API_BASE_URL,
+    PROLOGS_API_CONNECT_BASE_URL,
+    pool_size=settings.PROLOGS_POOL_SIZE,
+    connect_timeout=settings.PROLOGS_CONNECT_TIMEOUT,
+    read_timeout=settings.PROLOGS_READ_TIMEOUT,
+    max_retries=settings.PROLOGS_MAX_RETRIES,
+    backoff_factor=settings.PROLOGS_BACKOFF_FACTOR,
+    backoff_jitter=settings.PROLOGS_BACKOFF_JITTER,
+    token_refresh_margin=settings.PROLOGS_TOKEN_REFRESH_MARGIN,
+)
 
-    try:
-        response = requests.post(url, headers=headers, data=data)
-        # response.raise_for_status()  # Raise an exception for 4xx or 5xx status codes
+token_manager = prologs_client.token_manager
+
+async_prologs_client = AsyncProLogsClient(
+    PROLOGS_API_BASE_URL,
+    PROLOGS_API_CONNECT_BASE_URL,
+    max_connections=settings.PROLOGS_ASYNC_MAX_CONNECTIONS,
+    max_keepalive=settings.PROLOGS_POOL_SIZE,
+    connect_timeout=settings.PROLOGS_CONNECT_TIMEOUT,
+    read_timeout=settings.PROLOGS_READ_TIMEOUT,
+    max_retries=settings.PROLOGS_MAX_RETRIES,
+    backoff_factor=settings.PROLOGS_BACKOFF_FACTOR,
+    backoff_jitter=settings.PROLOGS_BACKOFF_JITTER,
+    token_refresh_margin=settings.PROLOGS_TOKEN_REFRESH_MARGIN,
+)
 
-        result = response.json()  # .get('access_token')
-        return result["access_token"]
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error making request: {e}")
+def get_access_token(client_id, client_secret):
+    result = prologs_client.fetch_access_token(client_id, client_secret)
+    if result is None:
         return None
+    return result["access_token"]
 
 
+@timed('download_trucks')
 def get_truck_eld_data() -> list[TruckLocation]:
-    client_id, client_secret = os.getenv('PROLOGS_CLIENT_ID'), os.getenv('PROLOGS_API_KEY')
-    url = f"{PROLOGS_API_BASE_URL}/trucks/"
+    return prologs_client.get("/trucks/")
 
-    access_token = get_access_token(client_id, client_secret)
 
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
+@timed('download_drivers')
+def get_drivers_data() -> list[DriverHosInformation]:
+    return prologs_client.get("/drivers/")
 
-    response = requests.get(url, headers=headers).json()
 
-    return response
+@timed('download_driver')
+def get_driver_data(id: str) -> list[DriverHosInformation]:
+    response = prologs_client.get_response(f"/drivers/{id}")
+    if response.status_code == 404:
+        return None
+    return response.json()
 
 
-def get_drivers_data() -> list[DriverHosInformation]:
-    client_id, client_secret = os.getenv('PROLOGS_CLIENT_ID'), os.getenv('PROLOGS_API_KEY')
-    url = f"{PROLOGS_API_BASE_URL}/drivers/"
+@timed('download_trucks')
+async def get_truck_eld_data_async() -> list[TruckLocation]:
+    return await async_prologs_client.get("/trucks/")
 
-    access_token = get_access_token(client_id, client_secret)
 
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
+@timed('download_drivers')
+async def get_drivers_data_async() -> list[DriverHosInformation]:
+    return await async_prologs_client.get("/drivers/")
+
 
-    response = requests.get(url, headers=headers).json()
+@timed('download_driver')
+async def get_driver_data_async(id: str) -> list[DriverHosInformation]:
+    response = await async_prologs_client.get_response(f"/drivers/{id}")
+    if response.status_code == 404:
+        return None
+    return response.json()
 
-    return response
 
+drivers_adapter = TypeAdapter(list[DriverHosInformation])
 
-def get_driver_data(id: str) -> list[DriverHosInformation]:
-    client_id, client_secret = os.getenv('PROLOGS_CLIENT_ID'), os.getenv('PROLOGS_API_KEY')
-    url = f"{PROLOGS_API_BASE_URL}/drivers/{id}"
 
-    access_token = get_access_token(client_id, client_secret)
+@timed('decode')
+def decode_drivers(drivers: list[dict]) -> list[DriverHosInformation]:
+    # One validate_python call keeps the whole loop inside pydantic-core instead of building a model per row
+    # from Python; model_construct() is slower still, as it maps aliases and defaults in Python.
+    return drivers_adapter.validate_python(drivers)
 
-    print(access_token)
 
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
+def decode_drivers_or_none(drivers: list[dict]) -> list[Optional[DriverHosInformation]]:
+    """
+    Like ``decode_drivers``, but a malformed row is reported and comes back as ``None`` instead of failing
+    the whole batch. Rows are only decoded one by one once the bulk decode has failed.
+    """
+    try:
+        return decode_drivers(drivers)
+    except ValidationError:
+        pass
+
+    decoded = []
+    for item in drivers:
+        try:
+            decoded.append(DriverHosInformation.model_validate(item))
+        except ValidationError as e:
+            print(f"Skipping malformed driver {item.get('driverId')!r}: {e}")
+            decoded.append(None)
+    return decoded
+
+
+def index_drivers(drivers: list[dict]) -> dict[str, dict]:
+    return {item['driverId']: item for item in drivers if item.get('driverId') is not None}
+
+
+def get_drivers_index() -> dict[str, dict]:
+    return index_drivers(get_drivers_data())
+
+
+async def get_drivers_index_async() -> dict[str, dict]:
+    return index_drivers(await get_drivers_data_async())
+
+
+trucks_snapshot = SnapshotCache('trucks', get_truck_eld_data, ttl=settings.FLEET_CACHE_TTL,
+                                stale_ttl=settings.FLEET_CACHE_STALE_TTL, cache_alias='fleet',
+                                fetch_async=get_truck_eld_data_async, store=truck_store,
+                                store_max_age=settings.FLEET_STORE_MAX_AGE,
+                                save_fetches=settings.FLEET_STORE_SAVE_FETCHES)
+
+drivers_snapshot = SnapshotCache('drivers', get_drivers_index, ttl=settings.FLEET_CACHE_TTL,
+                                 stale_ttl=settings.FLEET_CACHE_STALE_TTL, cache_alias='fleet',
+                                 fetch_async=get_drivers_index_async, store=driver_store,
+                                 store_max_age=settings.FLEET_STORE_MAX_AGE,
+                                save_fetches=settings.FLEET_STORE_SAVE_FETCHES)
+
+
+def get_cached_truck_eld_data() -> list[TruckLocation]:
+    return trucks_snapshot.get()
+
+
+def get_cached_drivers_data() -> list[DriverHosInformation]:
+    return list(drivers_snapshot.get().values())
+
+
+def get_cached_drivers_index() -> dict[str, dict]:
+    return drivers_snapshot.get()
 
-    response = requests.get(url, headers=headers).json()
 
-    return response
+def stream_truck_locations() -> Iterator[TruckLocation]:
+    """
+    Yields the fleet's truck locations one at a time: from the snapshot while it is fresh, otherwise parsed
+    off the upstream response as it downloads, so the full list is never held for this call.
+    """
+    trucks = trucks_snapshot.peek()
+    for item in trucks if trucks is not None else prologs_client.iter_items("/trucks/"):
+        try:
+            yield TruckLocation(**item)
+        except ValidationError as e:
+            print(f"Skipping malformed truck location {item.get('name')!r}: {e}")
 
 
+async def get_cached_truck_eld_data_async() -> list[TruckLocation]:
+    return await trucks_snapshot.aget()
+
+
+async def get_cached_drivers_data_async() -> list[DriverHosInformation]:
+    return list((await drivers_snapshot.aget()).values())
+
+
+@timed('decode')
+def _build_driver(driver, driver_id: str) -> Optional[DriverHosInformation]:
+    # Tolerate the per-driver endpoint answering with a one-element list instead of an object.
+    if isinstance(driver, list):
+        driver = next((item for item in driver if item.get('driverId') == driver_id), None)
+
+    if not driver or driver.get('driverId') is None:
+        return None
+
+    return DriverHosInformation(**driver)
+
+
+def _snapshot_driver(driver_id: str) -> Optional[dict]:
+    # A fresh roster snapshot answers without going upstream.
+    index = drivers_snapshot.peek()
+    return index.get(driver_id) if index is not None else None
+
+
+def get_driver(driver_id: str) -> Optional[DriverHosInformation]:
+    driver = _snapshot_driver(driver_id)
+    if driver is None:
+        driver = get_driver_data(driver_id)
+    return _build_driver(driver, driver_id)
+
+
+async def get_driver_async(driver_id: str) -> Optional[DriverHosInformation]:
+    # The cache backend may block (the file backend reads from disk), so the snapshot is read off the loop.
+    driver = await sync_to_async(_snapshot_driver, thread_sensitive=False)(driver_id)
+    if driver is None:
+        driver = await get_driver_data_async(driver_id)
+    return _build_driver(driver, driver_id)
+
+
+# Federal property-carrying limits, used when ProLogs does not send a driver's own maxima.
+MAX_SHIFT_DRIVE_MINUTES = 11 * 60
+MAX_SHIFT_WORK_MINUTES = 14 * 60
+MAX_CYCLE_WORK_MINUTES = 70 * 60
+
+
+def hos_limits(driver_data: DriverHosInformation) -> tuple[int, int, int]:
+    def limit(value, default):
+        return default if value is None else value
+
+    return (
+        limit(driver_data.max_shift_drive_minutes, MAX_SHIFT_DRIVE_MINUTES),
+        limit(driver_data.max_shift_work_minutes, MAX_SHIFT_WORK_MINUTES),
+        limit(driver_data.max_cycle_work_minutes, MAX_CYCLE_WORK_MINUTES),
+    )
+
+
+@timed('detect_violation')
 def detect_violation(driver_data: DriverHosInformation) -> TruckHOSViolations:
     # To understand the logic of the violations, you can check to the following link:
     # https://www.fmcsa.dot.gov/regulations/hours-service/summary-hours-service-regulations
 
     violations = []
+    max_drive, max_shift, max_cycle = hos_limits(driver_data)
 
     # Check for 11-Hour Driving Limit Violation
-    if driver_data.shift_drive_minutes > 11 * 60:
+    if (driver_data.shift_drive_minutes or 0) > max_drive:
         violations.append({
             'violation': '11-Hour Driving Limit',
-            'details': f'Drove {driver_data.shift_drive_minutes} minutes, exceeding the 660 minutes limit.'
+            'details': f'Drove {driver_data.shift_drive_minutes} minutes, exceeding the {max_drive} minutes limit.'
         })
 
     # Check for 14-Hour Limit Violation
-    if driver_data.shift_work_minutes > 14 * 60:
+    if (driver_data.shift_work_minutes or 0) > max_shift:
         violations.append({
             'violation': '14-Hour Limit',
-            'details': f'Worked {driver_data.shift_work_minutes} minutes, exceeding the 840 minutes limit.'
+            'details': f'Worked {driver_data.shift_work_minutes} minutes, exceeding the {max_shift} minutes limit.'
         })
 
     # Check for 70-Hour Limit Violation
-    if driver_data.cycle_work_minutes > 70 * 60:
+    if (driver_data.cycle_work_minutes or 0) > max_cycle:
         violations.append({
             'violation': '70-Hour Limit',
-            'details': f'Worked {driver_data.cycle_work_minutes} minutes in the cycle, exceeding the 4200 minutes limit.'
+            'details': f'Worked {driver_data.cycle_work_minutes} minutes in the cycle, exceeding the {max_cycle} minutes limit.'
         })
 
     return TruckHOSViolations(
@@ -118,233 +266,46 @@ def detect_violation(driver_data: DriverHosInformation) -> TruckHOSViolations:
     )
 
 
-def plan_driving_schedule(pickup: datetime, dropoff: datetime,
-                          driver: DriverHosInformation):
-    # Constants
-    MAX_SHIFT_WORK_MINUTES = 840  # 14 hours
-    MAX_SHIFT_DRIVE_MINUTES = 660  # 11 hours
-    MAX_CYCLE_WORK_MINUTES = 4200  # 70 hours in 8 days
-
-    DRIVE_4_HOURS = timedelta(hours=4)
-
-    REST_30_MINUTES = timedelta(minutes=30)
-    REST_2_HOURS = timedelta(hours=2)
-    REST_7_HOURS = timedelta(hours=7)
-    REST_34_HOURS = timedelta(hours=34)
-
-    def pause_when_reach_dropoff_time(current_time, dropoff_time, duration):
-        if current_time - dropoff_time >= timedelta(minutes=duration) or (
-                current_time + timedelta(minutes=duration)) > dropoff_time:
-            return True
-        return False
-
-
-    shift_work_minutes = driver.shift_work_minutes
-    shift_drive_minutes = driver.shift_drive_minutes
-    cycle_work_minutes = driver.cycle_work_minutes
-
-    driving_segments = []
-    rest_periods = []
-
-    current_time = pickup
-    driving_minutes = 0
-
-    while current_time < dropoff:
-        if dropoff == current_time:
-            break
-
-        if cycle_work_minutes >= MAX_CYCLE_WORK_MINUTES:
-            if pause_when_reach_dropoff_time(current_time, dropoff, 34 * 60):
-                rest_start = current_time
-                rest_periods.append({
-                    "start": rest_start.isoformat(),
-                    "end": dropoff.isoformat(),
-                    "segment_type": "34-Hour Reset",
-                    "duration": abs((rest_start - dropoff).total_seconds() / 60)
-                })
-                current_time = dropoff
-
-                continue
-
-            rest_start = current_time
-            rest_end = rest_start + REST_34_HOURS
-            rest_periods.append({
-                "start": rest_start.isoformat(),
-                "end": rest_end.isoformat(),
-                "segment_type": "34-Hour Reset",
-                "duration": 34 * 60
-            })
-            cycle_work_minutes = 0
-            shift_drive_minutes = 0
-            driving_minutes = 0
-
-            current_time = rest_end
-
-            continue
-
-        drive_time = dropoff - current_time
-
-        if MAX_SHIFT_DRIVE_MINUTES <= (shift_drive_minutes + driving_minutes):
-            # DRIVER HAS REACHED THE MAXIMUM DRIVING TIME
-            # Rest for 7h
-
-            if pause_when_reach_dropoff_time(current_time, dropoff, 7 * 60):
-                rest_start = current_time
-                rest_periods.append({
-                    "start": rest_start.isoformat(),
-                    "end": dropoff.isoformat(),
-                    "segment_type": "7-Hour Break",
-                    "duration": abs((rest_start - dropoff).total_seconds() / 60)
-                })
-                current_time = dropoff
-
-                continue
-
-            rest_start = current_time
-            rest_end = rest_start + REST_7_HOURS
-
-            rest_periods.append({
-                "start": rest_start.isoformat(),
-                "end": rest_end.isoformat(),
-                "segment_type": "7-Hour Break",
-                "duration": 420
-            })
-
-            shift_drive_minutes = 0
-            cycle_work_minutes = cycle_work_minutes + 420
-            driving_minutes = 0
-
-            current_time = rest_end
-
-            continue
-
-        if MAX_SHIFT_DRIVE_MINUTES / 2 >= driving_minutes > 0:
-
-            if pause_when_reach_dropoff_time(current_time, dropoff, 240):
-                drive_start = current_time
-                driving_segments.append({
-                    "start": drive_start.isoformat(),
-                    "end": dropoff.isoformat(),
-                    "segment_type": "Driving",
-                    "duration": abs((drive_start - dropoff).total_seconds() / 60)
-                })
-                current_time = dropoff
-
-                continue
-
-            # SPLIT DRIVES TIMES TO GIVE DRIVER A REST
-            drive_start = current_time
-            drive_time = timedelta(minutes=MAX_SHIFT_DRIVE_MINUTES / 2)
-            drive_end = drive_start + drive_time
-
-            driving_segments.append({
-                "start": drive_start.isoformat(),
-                "end": drive_end.isoformat(),
-                "segment_type": "Driving",
-                "duration": drive_time.total_seconds() / 60
-            })
-
-            driving_minutes = driving_minutes + MAX_SHIFT_DRIVE_MINUTES / 2
-
-            if pause_when_reach_dropoff_time(current_time, dropoff, 2 * 60):
-                rest_start = current_time
-                rest_periods.append({
-                    "start": rest_start.isoformat(),
-                    "end": dropoff.isoformat(),
-                    "segment_type": "2-Hour Break",
-                    "duration": 120
-                })
-                current_time = dropoff
-
-                continue
-
-            # Rest for 2h
-            rest_start = drive_end
-            rest_end = rest_start + REST_2_HOURS
-
-            rest_periods.append({
-                "start": rest_start.isoformat(),
-                "end": rest_end.isoformat(),
-                "segment_type": "2-Hour Break",
-                "duration": 120
-            })
-
-            current_time = rest_end
-
-            shift_drive_minutes = shift_drive_minutes + driving_minutes
-            cycle_work_minutes = cycle_work_minutes + driving_minutes + 120
-
-            continue
-
-        if pause_when_reach_dropoff_time(current_time, dropoff, 240):  # pause when reach dropoff time
-            drive_start = current_time
-            driving_segments.append({
-                "start": drive_start.isoformat(),
-                "end": dropoff.isoformat(),
-                "segment_type": "Driving",
-                "duration": abs((drive_start - dropoff).total_seconds() / 60)
-            })
-            current_time = dropoff
-            continue
-
-        if shift_drive_minutes + 240 >= MAX_SHIFT_DRIVE_MINUTES:
-            # DRIVER HAS REACHED THE MAXIMUM DRIVING TIME
-            drive_start = current_time
-            drive_end = current_time + (
-                    timedelta(minutes=MAX_SHIFT_DRIVE_MINUTES) - timedelta(minutes=shift_drive_minutes))
-            driving_segments.append({
-                "start": drive_start.isoformat(),
-                "end": drive_end.isoformat(),
-                "segment_type": "Driving",
-                "duration": (drive_end - drive_start).total_seconds() / 60
-            })
-
-            driving_minutes = (drive_end - drive_start).total_seconds() / 60
-
-            shift_drive_minutes = shift_drive_minutes + driving_minutes
-            cycle_work_minutes = cycle_work_minutes + driving_minutes
-
-            current_time = drive_end
-
-            continue
-
-            # Drive for 4 hours
-        drive_start = current_time
-        drive_end = current_time + DRIVE_4_HOURS
-        driving_segments.append({
-            "start": drive_start.isoformat(),
-            "end": drive_end.isoformat(),
-            "segment_type": "Driving",
-            "duration": 240
-        })
+def remaining_hos_minutes(driver_data: DriverHosInformation) -> dict[str, float]:
+    # Negative values mean the limit has already been exceeded by that many minutes.
+    max_drive, max_shift, max_cycle = hos_limits(driver_data)
+    return {
+        'drive': max_drive - (driver_data.shift_drive_minutes or 0),
+        'shift': max_shift - (driver_data.shift_work_minutes or 0),
+        'cycle': max_cycle - (driver_data.cycle_work_minutes or 0),
+    }
 
-        driving_minutes = driving_minutes + 240
 
-        # Rest for 30 minutes
-        rest_start = drive_end
-        rest_end = rest_start + REST_30_MINUTES
-        rest_periods.append({
-            "start": rest_start.isoformat(),
-            "end": rest_end.isoformat(),
-            "segment_type": "30-Minute Break",
-            "duration": 30
-        })
+schedule_memo = LRUCache(maxsize=settings.SCHEDULE_MEMO_SIZE, ttl=settings.SCHEDULE_MEMO_TTL)
 
-        current_time = rest_end
 
-        shift_drive_minutes = shift_drive_minutes + driving_minutes
-        cycle_work_minutes = cycle_work_minutes + driving_minutes + 30
+def _clear_schedule_memo(sender, name, **kwargs):
+    if name == 'drivers':
+        schedule_memo.clear()
 
-        continue
 
-    timeline = driving_segments + rest_periods
-    timeline.sort(key=lambda x: datetime.fromisoformat(x["start"]))
+snapshot_refreshed.connect(_clear_schedule_memo)
 
-    return {
-        "timeline": timeline,
-        "driving_segments": driving_segments,
-        "rest_periods": rest_periods,
-    }
+
+def schedule_memo_key(pickup: datetime, dropoff: datetime, driver: DriverHosInformation) -> tuple:
+    # Everything the plan depends on. The pickup's UTC offset is included because it shows in the
+    # timestamps; the tzinfo itself is not used as some (dateutil's tzutc) are unhashable.
+    return (
+        driver.shift_work_minutes, driver.shift_drive_minutes, driver.cycle_work_minutes, *hos_limits(driver),
+        pickup, pickup.utcoffset(), dropoff,
+    )
+
+
+@timed('plan')
+def plan_driving_schedule(pickup: datetime, dropoff: datetime,
+                          driver: DriverHosInformation) -> DrivingTimeline:
+    # Memoized timelines are shared between callers, so treat the result as read-only.
+    key = schedule_memo_key(pickup, dropoff, driver)
+    timeline = schedule_memo.get(key)
+    if timeline is None:
+        timeline = plan_timeline(pickup, dropoff, driver)
+        schedule_memo.put(key, timeline)
+    return timeline
 
 
 def parse_and_verify_utc(date_str):
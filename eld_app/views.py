@@ -1,26 +1,84 @@
-from django.http import JsonResponse
+import json
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, HttpResponseNotAllowed, StreamingHttpResponse
 from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-
-from eld_app.models import DriverHosInformation
-from eld_app.utils import get_truck_eld_data, get_drivers_data, get_driver_data, detect_violation, parse_and_verify_utc, \
-    plan_driving_schedule
+from rest_framework.settings import api_settings
+
+from eld_app.availability import MEASURES, available_drivers, drive_time_index
+from eld_app.batch import plan_driving_schedules
+from eld_app.cycle import audit_cycle_minutes
+from eld_app.fleet_engine import scan_fleet_violations
+from eld_app.geo import nearest_trucks, trucks_within, truck_location_index
+from eld_app.metrics import stage
+from eld_app.models import DriverHosInformation, TruckLocation
+from eld_app.renderers import NDJSONRenderer, dumps
+from eld_app.streaming import iter_json_array, iter_ndjson
+from eld_app.store import driver_store, truck_store
+from eld_app.tracks import track_points, track_store
+from eld_app.utils import get_cached_truck_eld_data, get_cached_drivers_data, get_driver_data, get_driver, \
+    detect_violation, parse_and_verify_utc, plan_driving_schedule, trucks_snapshot, drivers_snapshot, prologs_client, \
+    get_cached_truck_eld_data_async, get_driver_async, async_prologs_client, schedule_memo, get_cached_drivers_index, \
+    decode_drivers_or_none, stream_truck_locations
 
 
 # Create your views here.
 
 class TruckListView(APIView):
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
 
     def get(self, request):
-        trucks = get_truck_eld_data()
+        if request.accepted_renderer.format == NDJSONRenderer.format:
+            return self.stream_ndjson(request)
+
+        trucks = get_cached_truck_eld_data()
         return Response(trucks, status=status.HTTP_200_OK)
 
+    def stream_ndjson(self, request):
+        # ?format=ndjson: one TruckLocation per line, written as each is decoded; ?fields= keeps only those keys.
+        fields = request.query_params.get('fields')
+        include = None
+        if fields:
+            include = {name.strip() for name in fields.split(',') if name.strip()}
+            unknown = include - TruckLocation.model_fields.keys()
+            if unknown:
+                return Response({"error": f"Unknown fields: {', '.join(sorted(unknown))}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        lines = iter_ndjson(stream_truck_locations(), dumps=lambda truck: truck.model_dump_json(include=include))
+        return StreamingHttpResponse(lines, content_type=NDJSONRenderer.media_type)
+
+
+class StatsView(APIView):
+
+    def get(self, request):
+        return Response({
+            "cache": {
+                "trucks": trucks_snapshot.stats(),
+                "drivers": drivers_snapshot.stats(),
+            },
+            "store_age": {
+                "trucks": truck_store.age(),
+                "drivers": driver_store.age(),
+            },
+            "schedule_memo": schedule_memo.stats(),
+            "drive_time_index": drive_time_index.stats(),
+            "truck_location_index": truck_location_index.stats(),
+            "tracks": track_store.stats(),
+            "prologs": prologs_client.stats(),
+            "prologs_async": async_prologs_client.stats(),
+        }, status=status.HTTP_200_OK)
+
 
 class DriversListView(APIView):
     def get(self, request):
-        drivers = get_drivers_data()
+        drivers = get_cached_drivers_data()
         return Response(drivers, status=status.HTTP_200_OK)
 
 
@@ -30,6 +88,8 @@ class DriverView(APIView):
         if driver_id is None:
             return Response({"error": "Driver ID is required"}, status=status.HTTP_400_BAD_REQUEST)
         drivers = get_driver_data(id=driver_id)
+        if drivers is None:
+            return Response({"error": "Driver not found"}, status=status.HTTP_404_NOT_FOUND)
         return Response(drivers, status=status.HTTP_200_OK)
 
 
@@ -38,103 +98,362 @@ class TrucksHOSViolationsView(APIView):
         driver_id = kwargs.get('id')
         if driver_id is None:
             return Response({"error": "Driver ID is required"}, status=status.HTTP_400_BAD_REQUEST)
-        drivers = get_drivers_data()
-        driver = next((item for item in drivers if item['driverId'] == driver_id), None)
-        driver = DriverHosInformation(**driver)
+        driver = get_driver(driver_id)
+        if driver is None:
+            return Response({"error": "Driver not found"}, status=status.HTTP_404_NOT_FOUND)
         result = detect_violation(driver)
         return Response(result.__dict__, status=status.HTTP_200_OK)
 
 
-class DrivingScheduleView(APIView):
-    def post(self, request, *args, **kwargs):
-        driver_id = kwargs.get('id')
-        if driver_id is None:
-            return Response({"error": "Driver ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+class FleetViolationsView(APIView):
 
-        body_data = request.data
-        start = body_data.get('start')
-        end = body_data.get('end')
+    def get(self, request):
+        only_violators = request.query_params.get('only_violators', '').lower() in ('1', 'true', 'yes')
 
-        if not start or not end:
-            return Response({"error": "Start and end dates are required"}, status=status.HTTP_400_BAD_REQUEST)
+        within_minutes = request.query_params.get('within')
+        if within_minutes is not None:
+            try:
+                within_minutes = float(within_minutes)
+            except ValueError:
+                return Response({"error": "within must be a number of minutes"}, status=status.HTTP_400_BAD_REQUEST)
 
-        start_date = parse_and_verify_utc(start)
-        end_date = parse_and_verify_utc(end)
+        drivers = get_cached_drivers_data()
+        results = scan_fleet_violations(drivers, only_violators=only_violators, within_minutes=within_minutes)
+        return StreamingHttpResponse(iter_json_array(results, dumps=dumps), content_type='application/json')
 
-        if not start_date or not end_date:
-            return Response({"error": "Invalid or non-UTC dates provided"}, status=status.HTTP_400_BAD_REQUEST)
 
-        drivers = get_drivers_data()
-        driver = next((item for item in drivers if item['driverId'] == driver_id), None)
-        driver = DriverHosInformation(**driver)
+class AvailableDriversView(APIView):
 
-        result = plan_driving_schedule(start_date, end_date, driver)
-        return Response(result, status=status.HTTP_200_OK)
+    def get(self, request):
+        measure = request.query_params.get('measure', 'available')
+        if measure not in MEASURES:
+            return Response({"error": f"measure must be one of {', '.join(MEASURES)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            minutes = float(request.query_params.get('min_minutes', 0))
+            limit = request.query_params.get('limit')
+            limit = int(limit) if limit is not None else None
+        except ValueError:
+            return Response({"error": "min_minutes and limit must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        drivers = get_cached_drivers_index()
+        results = []
+        for driver_id, remaining in available_drivers(drivers, minutes, measure, limit):
+            # The index may already hold a newer roster than ours if another request refreshed it meanwhile.
+            driver = drivers.get(driver_id, {})
+            results.append({
+                "driver_id": driver_id,
+                "truck_name": driver.get('truckName'),
+                "duty_status": driver.get('dutyStatus'),
+                "remaining_minutes": remaining,
+            })
+        return Response(results, status=status.HTTP_200_OK)
+
+
+def parse_point(query_params):
+    try:
+        lat, lng = float(query_params['lat']), float(query_params['lng'])
+    except (KeyError, ValueError):
+        return None, None, "lat and lng are required and must be numbers"
+    if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+        return None, None, "lat must be within [-90, 90] and lng within [-180, 180]"
+    return lat, lng, None
+
+
+def located_trucks_json(located: list[tuple[dict, float]]) -> list[dict]:
+    # Each truck with its distance, and its driver's remaining HOS minutes when the roster assigns one.
+    drive_time_index.update(get_cached_drivers_index())
+    results = []
+    for truck, distance in located:
+        driver = drive_time_index.for_truck(truck.get('name'))
+        results.append({
+            "name": truck.get('name'),
+            "lat": truck.get('lat'),
+            "lng": truck.get('lng'),
+            "speed": truck.get('speed'),
+            "timeStamp": truck.get('timeStamp'),
+            "distance_km": distance,
+            "driver_id": driver[0] if driver else None,
+            "remaining_minutes": driver[1] if driver else None,
+        })
+    return results
+
+
+class TrucksWithinView(APIView):
 
+    def get(self, request):
+        lat, lng, error = parse_point(request.query_params)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
 
-class DrivingScheduleWithViolations(APIView):
+        try:
+            radius_km = float(request.query_params.get('radius_km', 50))
+            limit = request.query_params.get('limit')
+            limit = int(limit) if limit is not None else None
+        except ValueError:
+            return Response({"error": "radius_km and limit must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+        if radius_km < 0 or limit is not None and limit < 0:
+            return Response({"error": "radius_km and limit must not be negative"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        located = trucks_within(get_cached_truck_eld_data(), lat, lng, radius_km, limit)
+        return Response(located_trucks_json(located), status=status.HTTP_200_OK)
+
+
+class NearestTrucksView(APIView):
+
+    def get(self, request):
+        lat, lng, error = parse_point(request.query_params)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            k = int(request.query_params.get('k', 10))
+        except ValueError:
+            return Response({"error": "k must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < k <= settings.NEAREST_TRUCKS_MAX_K:
+            return Response({"error": f"k must be between 1 and {settings.NEAREST_TRUCKS_MAX_K}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        located = nearest_trucks(get_cached_truck_eld_data(), lat, lng, k)
+        return Response(located_trucks_json(located), status=status.HTTP_200_OK)
+
+
+def parse_track_window(query_params):
+    end = query_params.get('end')
+    end = datetime.now(timezone.utc) if end is None else parse_and_verify_utc(end)
+    start = query_params.get('start')
+    if start is not None:
+        start = parse_and_verify_utc(start)
+    elif end is not None:
+        start = end - timedelta(days=1)
+    if start is None or end is None:
+        return None, None, None, "Invalid or non-UTC date provided"
+    if start > end:
+        return None, None, None, "start must not be after end"
+
+    try:
+        step = int(query_params.get('step', 0))
+    except ValueError:
+        step = -1
+    if step < 0:
+        return None, None, None, "step must be a whole number of seconds"
+    return start, end, step, None
+
+
+class TruckTrackView(APIView):
+
+    def get(self, request, name):
+        start, end, step, error = parse_track_window(request.query_params)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        track = track_store.track(name, start.timestamp(), end.timestamp(), step=step)
+        return Response({
+            "name": name,
+            "start": start,
+            "end": end,
+            "points": track_points(track),
+        }, status=status.HTTP_200_OK)
+
+
+class CycleAuditView(APIView):
+
+    def get(self, request):
+        at = request.query_params.get('at')
+        if at is None:
+            at = datetime.now(timezone.utc)
+        else:
+            at = parse_and_verify_utc(at)
+            if at is None:
+                return Response({"error": "Invalid or non-UTC date provided"}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = audit_cycle_minutes(get_cached_drivers_index(), at)
+        encode = partial(dumps, default=DjangoJSONEncoder().default)
+        return StreamingHttpResponse(iter_json_array(results, dumps=encode), content_type='application/json')
+
+
+NO_VIOLATION_STATUSES = {
+    "OFF": "No violation due to driver being off duty",
+    "SB": "No violation due to driver being in the sleeper berth",
+    "PC": "No violation due to driver being in the personal conveyance",
+    "YM": "No violation due to driver being in the yard move",
+}
+
+
+def parse_schedule_window(body_data):
+    start = body_data.get('start')
+    end = body_data.get('end')
+
+    if not start or not end:
+        return None, None, "Start and end dates are required"
+
+    start_date = parse_and_verify_utc(start)
+    end_date = parse_and_verify_utc(end)
+
+    if not start_date or not end_date:
+        return None, None, "Invalid or non-UTC dates provided"
+
+    return start_date, end_date, None
+
+
+def schedule_with_violations_json(driver: DriverHosInformation, start_date, end_date,
+                                  timeline_only: bool = False) -> str:
+    if driver.duty_status in NO_VIOLATION_STATUSES:
+        return json.dumps({
+            "violations": [
+                {
+                    "violation": NO_VIOLATION_STATUSES[driver.duty_status],
+                }
+            ]
+        }, separators=(',', ':'))
+
+    violations = detect_violation(driver)
+    schedule = plan_driving_schedule(start_date, end_date, driver)
+
+    # The schedule renders itself, so splice its JSON in rather than building dicts for every segment.
+    with stage('render'):
+        violations_json = json.dumps(violations.__dict__["violations_data"], separators=(',', ':'))
+        return f'{{"violations":{violations_json},"suggested_schedule":{schedule.to_json(timeline_only)}}}'
+
+
+def wants_timeline_only(query_params) -> bool:
+    # ?timeline_only=true drops driving_segments/rest_periods, which repeat the timeline's segments.
+    return query_params.get('timeline_only', '').lower() in ('1', 'true', 'yes')
+
+
+def json_response(content: str, status_code=status.HTTP_200_OK) -> HttpResponse:
+    return HttpResponse(content, status=status_code, content_type='application/json')
+
+
+class DrivingScheduleView(APIView):
     def post(self, request, *args, **kwargs):
         driver_id = kwargs.get('id')
         if driver_id is None:
             return Response({"error": "Driver ID is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        body_data = request.data
-        start = body_data.get('start')
-        end = body_data.get('end')
-
-        if not start or not end:
-            return Response({"error": "Start and end dates are required"}, status=status.HTTP_400_BAD_REQUEST)
+        start_date, end_date, error = parse_schedule_window(request.data)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
 
-        start_date = parse_and_verify_utc(start)
-        end_date = parse_and_verify_utc(end)
-
-        if not start_date or not end_date:
-            return Response({"error": "Invalid or non-UTC dates provided"}, status=status.HTTP_400_BAD_REQUEST)
-
-        drivers = get_drivers_data()
-        driver = next((item for item in drivers if item['driverId'] == driver_id), None)
+        driver = get_driver(driver_id)
         if driver is None:
             return Response({"error": "Driver not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        driver = DriverHosInformation(**driver)
+        result = plan_driving_schedule(start_date, end_date, driver)
+        return json_response(result.to_json(wants_timeline_only(request.query_params)))
 
-        if driver.duty_status == "OFF":
-            return Response({
-                "violations": [
-                    {
-                        "violation": "No violation due to driver being off duty",
-                    }
-                ]
-            })
 
-        if driver.duty_status == "SB":
-            return Response({
-                "violations": [
-                    {
-                        "violation": "No violation due to driver being in the sleeper berth",
-                    }
-                ]
-            })
+class DrivingScheduleWithViolations(APIView):
+    def post(self, request, *args, **kwargs):
+        driver_id = kwargs.get('id')
+        if driver_id is None:
+            return Response({"error": "Driver ID is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if driver.duty_status == "PC":
-            return Response({
-                "violations": [
-                    {
-                        "violation": "No violation due to driver being in the personal conveyance",
-                    }
-                ]
-            })
+        start_date, end_date, error = parse_schedule_window(request.data)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
 
-        if driver.duty_status == "YM":
-            return Response({
-                "violations": [
-                    {
-                        "violation": "No violation due to driver being in the yard move",
-                    }
-                ]
-            })
+        driver = get_driver(driver_id)
+        if driver is None:
+            return Response({"error": "Driver not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        violations = detect_violation(driver)
-        schedule = plan_driving_schedule(start_date, end_date, driver)
+        return json_response(schedule_with_violations_json(driver, start_date, end_date,
+                                                           wants_timeline_only(request.query_params)))
 
-        return Response({"violations": violations.__dict__["violations_data"], "suggested_schedule": schedule}, status=status.HTTP_200_OK)
+
+class BatchDrivingScheduleView(APIView):
+    def post(self, request, *args, **kwargs):
+        items = request.data.get('items') if isinstance(request.data, dict) else None
+        if not isinstance(items, list):
+            return Response({"error": "items must be a list of {driver_id, start, end}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.SCHEDULE_BATCH_MAX_ITEMS:
+            return Response({"error": f"At most {settings.SCHEDULE_BATCH_MAX_ITEMS} items per batch"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        drivers = get_cached_drivers_index()
+        errors = {}
+        windows = []
+        positions = []
+
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors[index] = "Item must be an object"
+                continue
+
+            start_date, end_date, error = parse_schedule_window(item)
+            if error:
+                errors[index] = error
+                continue
+
+            driver_id = item.get('driver_id')
+            if not isinstance(driver_id, str):
+                errors[index] = "driver_id must be a string"
+                continue
+            if driver_id not in drivers:
+                errors[index] = "Driver not found"
+                continue
+
+            windows.append((driver_id, start_date, end_date))
+            positions.append(index)
+
+        driver_ids = list(dict.fromkeys(driver_id for driver_id, _, _ in windows))
+        parsed_drivers = dict(zip(driver_ids, decode_drivers_or_none([drivers[driver_id] for driver_id in driver_ids])))
+        requests, planned = [], []
+        for index, (driver_id, start_date, end_date) in zip(positions, windows):
+            driver = parsed_drivers[driver_id]
+            if driver is None:
+                errors[index] = "Driver data is malformed"
+                continue
+            requests.append((driver, start_date, end_date))
+            planned.append(index)
+        outcomes = dict(zip(planned, plan_driving_schedules(requests)))
+        timeline_only = wants_timeline_only(request.query_params)
+
+        def render_outcome(index, item):
+            driver_id = json.dumps(item.get('driver_id') if isinstance(item, dict) else None)
+            timeline, error = outcomes.get(index, (None, errors.get(index)))
+            if error is not None:
+                return f'{{"driver_id":{driver_id},"error":{json.dumps(error)}}}'
+            return f'{{"driver_id":{driver_id},"suggested_schedule":{timeline.to_json(timeline_only)}}}'
+
+        results = ','.join(render_outcome(index, item) for index, item in enumerate(items))
+        return json_response(f'{{"results":[{results}]}}')
+
+
+# Async views for the ASGI app. Django 3.2 has no async class-based views (and DRF none at all), so these
+# are plain function views that do their upstream I/O on the shared httpx pool instead of a worker thread.
+
+async def truck_list_async(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    trucks = await get_cached_truck_eld_data_async()
+    return JsonResponse(trucks, safe=False, status=status.HTTP_200_OK)
+
+
+async def driving_schedule_with_violations_async(request, id=None):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    try:
+        body_data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({"error": "Malformed JSON body"}, status=status.HTTP_400_BAD_REQUEST)
+
+    start_date, end_date, error = parse_schedule_window(body_data)
+    if error:
+        return JsonResponse({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+    driver = await get_driver_async(id)
+    if driver is None:
+        return JsonResponse({"error": "Driver not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    return json_response(schedule_with_violations_json(driver, start_date, end_date, wants_timeline_only(request.GET)))
+
+
+# csrf_exempt() in Django 3.2 wraps the view in a sync function, which would hide the coroutine.
+truck_list_async.csrf_exempt = True
+driving_schedule_with_violations_async.csrf_exempt = True